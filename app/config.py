@@ -18,13 +18,121 @@ class Settings:
     api_base_url: str
     api_token: str
     ai_model: str = "@cf/meta/llama-4-scout-17b-16e-instruct"
+    # Where the Telegram Bot API and Google Translate live. Only changed to
+    # point the bot at local stand-ins (see loadtest/).
+    telegram_api_url: str = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+    translate_base_url: str = os.getenv("TRANSLATE_BASE_URL", "")
     health_port: int = int(os.getenv("PORT", "8000"))
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # "text" or "json" (one object per line), and per-logger sampling of
+    # INFO-and-below records as JSON, e.g. {"uvicorn.access": 0.1} (see
+    # app.logging_config).
+    log_format: str = os.getenv("LOG_FORMAT", "text").lower()
+    log_sampling: str = os.getenv("LOG_SAMPLING", "")
 
     # Feature toggles - handy for turning things off without editing code
     stickers_enabled: bool = os.getenv("STICKERS_ENABLED", "true").lower() == "true"
     reactions_enabled: bool = os.getenv("REACTIONS_ENABLED", "true").lower() == "true"
 
+    # Concurrency - updates from different chats run in parallel, updates
+    # within one chat are always handled in order (see app.services.dispatcher).
+    # Kept well above ADMISSION_MAX_ACTIVE + ADMISSION_MAX_QUEUE so that the
+    # admission queue, not the dispatcher, decides what waits and what is shed.
+    update_concurrency: int = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+    max_pending_updates: int = int(os.getenv("MAX_PENDING_UPDATES", "256"))
+
+    # Overload protection (see app.services.admission). SHED_REPLY decides
+    # what a shed group message gets instead: "none", "text" or "sticker"
+    # (the latter sends BUSY_STICKER_ID).
+    admission_max_active: int = int(os.getenv("ADMISSION_MAX_ACTIVE", "8"))
+    admission_max_queue: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    admission_max_wait_seconds: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "15"))
+    shed_reply: str = os.getenv("SHED_REPLY", "none").lower()
+    busy_sticker_id: str = os.getenv("BUSY_STICKER_ID", "")
+
+    # Merge a user's rapid-fire messages into one turn (see
+    # app.services.debounce). 0 answers every message on its own.
+    debounce_seconds: float = float(os.getenv("DEBOUNCE_SECONDS", "0"))
+
+    # Total time budget for answering one message, from when it arrives.
+    # Upstream timeouts are shortened to fit; 0 disables the budget.
+    update_deadline_seconds: float = float(os.getenv("UPDATE_DEADLINE_SECONDS", "45"))
+
+    # Fair sharing of AI/translation call slots across chats (see
+    # app.services.fair_scheduler). Weights are relative shares under load.
+    fair_capacity: int = int(os.getenv("FAIR_CAPACITY", "8"))
+    fair_per_user_limit: int = int(os.getenv("FAIR_PER_USER_LIMIT", "2"))
+    fair_private_weight: float = float(os.getenv("FAIR_PRIVATE_WEIGHT", "4"))
+    fair_group_weight: float = float(os.getenv("FAIR_GROUP_WEIGHT", "1"))
+    fair_starvation_seconds: float = float(os.getenv("FAIR_STARVATION_SECONDS", "10"))
+
+    # How updates reach the bot: "polling" (getUpdates long-polling) or
+    # "webhook" (Telegram POSTs them to the health API - see app.health.api)
+    update_mode: str = os.getenv("UPDATE_MODE", "polling").lower()
+    webhook_url: str = os.getenv("WEBHOOK_URL", "")
+    webhook_secret: str = os.getenv("WEBHOOK_SECRET", "")
+
+    # Per-chat trigger keywords replacing TRIGGER_KEYWORDS, as JSON:
+    # {"-1001234567890": ["selene", "queen"]} (see app.handlers.filters).
+    chat_trigger_keywords: str = os.getenv("CHAT_TRIGGER_KEYWORDS", "")
+
+    # A dependency (AI, translator, Telegram) that hasn't been called for
+    # this long gets one cheap probe call so /health stays current
+    # (see app.services.health). 0 disables probing.
+    health_probe_idle_seconds: float = float(os.getenv("HEALTH_PROBE_IDLE_SECONDS", "300"))
+
+    # Worker processes to spread updates over, sharded by chat id (see
+    # app.services.worker_pool). 1 handles everything in this process.
+    # Admission, fair-scheduling and concurrency limits apply per worker.
+    workers: int = int(os.getenv("WORKERS", "1"))
+
+    # Hand updates out through a shared queue so several nodes can process
+    # them while only the elected leader polls Telegram (see
+    # app.services.work_queue). WORK_QUEUE is "" (off), "sqlite" or
+    # "redis"; WORK_QUEUE_URL is the SQLite file or the Redis URL.
+    work_queue: str = os.getenv("WORK_QUEUE", "").lower()
+    work_queue_url: str = os.getenv("WORK_QUEUE_URL", "data/work_queue.db")
+    work_queue_visibility_seconds: float = float(os.getenv("WORK_QUEUE_VISIBILITY_SECONDS", "120"))
+    work_queue_max_attempts: int = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+    # Defaults to <hostname>-<pid>.
+    node_id: str = os.getenv("NODE_ID", "")
+
+    # Journal received updates to this file and replay unfinished ones on
+    # startup instead of dropping them (see app.services.journal). Empty
+    # disables it. Entries older than JOURNAL_MAX_AGE_SECONDS are skipped.
+    journal_path: str = os.getenv("JOURNAL_PATH", "")
+    journal_max_age_seconds: float = float(os.getenv("JOURNAL_MAX_AGE_SECONDS", "600"))
+    journal_fsync_interval_seconds: float = float(os.getenv("JOURNAL_FSYNC_INTERVAL_SECONDS", "0.2"))
+
+    # Per-turn tracing (see app.services.tracing): the fraction of turns
+    # traced, how slow a turn must be to be logged (0 = never), and an
+    # optional OTLP/HTTP collector to export traces to.
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    trace_slow_log_seconds: float = float(os.getenv("TRACE_SLOW_LOG_SECONDS", "15"))
+    trace_otlp_endpoint: str = os.getenv("TRACE_OTLP_ENDPOINT", "")
+
+    # Report the event loop being blocked for longer than this, with the
+    # stack of whatever blocked it (see app.services.watchdog). 0 = off.
+    loop_watchdog_seconds: float = float(os.getenv("LOOP_WATCHDOG_SECONDS", "0"))
+
+    # Bearer token for the /admin endpoints of the health API (see
+    # app.health.admin). Empty disables them.
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+
+    # Record incoming messages, anonymized, to this gzipped JSON-lines file
+    # for replaying later (see app.services.capture). Empty disables it.
+    # CAPTURE_SALT keys the id hashing; CAPTURE_REDACT_TEXT masks the text.
+    capture_path: str = os.getenv("CAPTURE_PATH", "")
+    capture_salt: str = os.getenv("CAPTURE_SALT", "")
+    capture_redact_text: bool = os.getenv("CAPTURE_REDACT_TEXT", "false").lower() == "true"
+
+    # Inject latency and failures into the AI, translator and Telegram
+    # calls, for testing timeouts and retries (see app.services.faults).
+    # JSON of dependency -> rule; empty (the default) injects nothing.
+    # FAULT_SEED makes the injected faults repeatable.
+    fault_injection: str = os.getenv("FAULT_INJECTION", "")
+    fault_seed: str = os.getenv("FAULT_SEED", "")
+
     def validate(self) -> None:
         missing = [
             name
@@ -41,6 +149,44 @@ class Settings:
                 "Copy .env.example to .env and fill them in."
             )
 
+        if self.update_mode not in ("polling", "webhook"):
+            raise ValueError(f"UPDATE_MODE must be 'polling' or 'webhook', got {self.update_mode!r}")
+        if self.update_mode == "webhook" and not (self.webhook_url and self.webhook_secret):
+            raise ValueError("UPDATE_MODE=webhook requires both WEBHOOK_URL and WEBHOOK_SECRET to be set.")
+        if self.chat_trigger_keywords:
+            from app.handlers.filters import parse_chat_keywords
+
+            parse_chat_keywords(self.chat_trigger_keywords)
+        if self.log_format not in ("text", "json"):
+            raise ValueError(f"LOG_FORMAT must be 'text' or 'json', got {self.log_format!r}")
+        if self.log_sampling:
+            from app.logging_config import parse_sampling
+
+            parse_sampling(self.log_sampling)
+        if self.workers < 1:
+            raise ValueError(f"WORKERS must be at least 1, got {self.workers}")
+        if self.work_queue not in ("", "sqlite", "redis"):
+            raise ValueError(f"WORK_QUEUE must be empty, 'sqlite' or 'redis', got {self.work_queue!r}")
+        if self.work_queue and (self.update_mode != "polling" or self.workers > 1):
+            raise ValueError("WORK_QUEUE needs UPDATE_MODE=polling and WORKERS=1 (the leader does the polling).")
+        if self.journal_path and (self.workers > 1 or self.work_queue):
+            raise ValueError("JOURNAL_PATH only works with WORKERS=1 and without WORK_QUEUE (which is durable already).")
+        if self.debounce_seconds > 0 and (self.journal_path or self.work_queue):
+            # Both count an update done once its handler returns, which for
+            # a debounced message is before its turn has been answered.
+            raise ValueError("DEBOUNCE_SECONDS can't be used with JOURNAL_PATH or WORK_QUEUE.")
+        if self.capture_path and self.workers > 1:
+            raise ValueError("CAPTURE_PATH only works with WORKERS=1 (workers would write the same file).")
+        if not 0 <= self.trace_sample_rate <= 1:
+            raise ValueError(f"TRACE_SAMPLE_RATE must be between 0 and 1, got {self.trace_sample_rate}")
+        if self.fault_injection:
+            from app.services.faults import parse_fault_rules
+
+            try:
+                parse_fault_rules(self.fault_injection)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"Invalid FAULT_INJECTION: {exc}") from exc
+
 
 settings = Settings(
     bot_token=os.getenv("BOT_TOKEN", ""),
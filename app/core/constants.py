@@ -7,9 +7,18 @@ MESSAGE_HISTORY_TIME_LIMIT_SECONDS = 3600  # 1 hour
 
 FALLBACK_REPLY = "Oops! Sorry what did u say? \U0001F61C"
 ERROR_REPLY = "Oops! Something went wrong. \U0001F605"
+# Canned answer for group messages shed under load (SHED_REPLY=text).
+BUSY_REPLY = "So many of you at once! Give me a moment, love \U0001F605"
 
 # How long a sticker pack's contents are cached before we re-fetch it from Telegram.
 STICKER_PACK_CACHE_SECONDS = 3600
+# Past that, the old contents are still served (while a refresh runs in
+# the background) for up to this long.
+STICKER_PACK_STALE_SECONDS = 24 * 3600
+# A pack that failed to load isn't asked for again for this long.
+STICKER_PACK_NEGATIVE_CACHE_SECONDS = 300
+# Least recently used packs are forgotten beyond this many.
+STICKER_PACK_CACHE_MAX_PACKS = 500
 
 # The only emojis the bot is allowed to react with. Deliberately small and
 # high-signal - these are meant to be used sparingly, only when the AI
@@ -32,3 +41,98 @@ REACTION_EMOJIS = (
 # See app.core.instruction.Instruction.reaction_directive().
 REACTION_TAG_PREFIX = "REACT:"
 REACTION_NONE_TOKEN = "NONE"
+
+# How many recent update ids the dispatcher remembers for exact duplicate
+# suppression (see app.services.dispatcher).
+UPDATE_DEDUPE_WINDOW = 10_000
+
+# Updates one chat may have waiting behind its current one; newer ones
+# past this are dropped rather than queued (see app.services.dispatcher).
+UPDATE_CHAT_QUEUE_MAX = 100
+
+# Route on the health API that Telegram POSTs updates to in webhook mode,
+# and the header it uses to echo back our secret token.
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Telegram's documented flood limits, enforced by app.services.outbound.
+TELEGRAM_GLOBAL_MESSAGES_PER_SECOND = 30
+TELEGRAM_PRIVATE_MESSAGES_PER_SECOND = 1
+TELEGRAM_GROUP_MESSAGES_PER_MINUTE = 20
+# Short bursts a single chat may send before its own limit kicks in.
+OUTBOUND_CHAT_BURST = 3
+# Reactions still queued after this long are dropped rather than sent late,
+# and none are queued at all while this many replies are waiting.
+OUTBOUND_REACTION_MAX_WAIT_SECONDS = 3
+OUTBOUND_PRESSURE_DEPTH = 20
+# How many times a reply is retried after a RetryAfter before giving up.
+OUTBOUND_MAX_RETRIES = 3
+
+# Per-stage time limits for answering one message (see
+# MessageProcessor._build_pipeline). The AI stage allows for AIClient's own
+# retries (3 attempts x 30s plus backoff); the send stage includes time
+# spent queued behind Telegram's flood limits.
+TRANSLATION_STAGE_TIMEOUT_SECONDS = 20
+# One translator HTTP call; also cut short by the turn's remaining budget.
+TRANSLATION_CALL_TIMEOUT_SECONDS = 10
+AI_STAGE_TIMEOUT_SECONDS = 100
+SEND_STAGE_TIMEOUT_SECONDS = 60
+# Even with the turn's time budget spent, sending (usually the fallback
+# reply by then) still gets at least this long.
+SEND_MIN_TIMEOUT_SECONDS = 10
+REACTION_STAGE_TIMEOUT_SECONDS = 10
+
+# Work queue between nodes (see app.services.work_queue). The leader holds
+# its lease this long without renewing; idle consumers check for new work
+# this often; finished updates are remembered this long for deduplication.
+WORK_QUEUE_LEASE_SECONDS = 30
+WORK_QUEUE_POLL_INTERVAL_SECONDS = 0.5
+WORK_QUEUE_RETENTION_SECONDS = 3600
+
+# The update journal (see app.services.journal) is rewritten down to its
+# unfinished entries once it grows past this size.
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+# Passive dependency health (see app.services.health): judged over the
+# last HEALTH_WINDOW_SIZE calls to each dependency. Idle dependencies are
+# looked at every HEALTH_PROBE_CHECK_SECONDS.
+HEALTH_WINDOW_SIZE = 100
+HEALTH_DEGRADED_ERROR_RATE = 0.2
+HEALTH_UNHEALTHY_ERROR_RATE = 0.5
+HEALTH_UNHEALTHY_CONSECUTIVE_FAILURES = 5
+HEALTH_PROBE_CHECK_SECONDS = 30
+
+# Tracing (see app.services.tracing): how many of the slowest traces are
+# kept for /debug/slow, and how finished traces are batched to an OTLP
+# collector - at most TRACE_EXPORT_QUEUE_SIZE wait, the rest are dropped.
+TRACE_SLOW_KEEP = 20
+TRACE_EXPORT_QUEUE_SIZE = 1000
+TRACE_EXPORT_BATCH_SIZE = 50
+TRACE_EXPORT_INTERVAL_SECONDS = 5
+TRACE_EXPORT_TIMEOUT_SECONDS = 5
+
+# Event loop watchdog (see app.services.watchdog): heartbeat interval, at
+# most one logged stall per WATCHDOG_LOG_INTERVAL_SECONDS, and how many of
+# the innermost frames of the blocked stack are kept.
+WATCHDOG_HEARTBEAT_SECONDS = 0.1
+WATCHDOG_LOG_INTERVAL_SECONDS = 60
+WATCHDOG_STACK_DEPTH = 15
+
+# On-demand CPU profiling (see app.services.profiler): every thread's
+# stack is sampled this often, for at most PROFILE_MAX_SECONDS per run.
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.01
+PROFILE_MAX_SECONDS = 60
+
+# Memory introspection (see app.services.memory): size estimates walk at
+# most this many objects per store; tracemalloc keeps this many frames.
+MEMORY_SIZEOF_MAX_OBJECTS = 200_000
+TRACEMALLOC_FRAMES = 1
+
+# Log records waiting for the writer thread (see app.logging_config);
+# past this many, new ones are dropped instead of blocking the caller.
+LOG_QUEUE_SIZE = 10_000
+
+# Traffic capture (see app.services.capture): buffered records are
+# written this often; past CAPTURE_BUFFER_MAX waiting, new ones are dropped.
+CAPTURE_FLUSH_SECONDS = 1.0
+CAPTURE_BUFFER_MAX = 10_000
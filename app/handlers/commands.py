@@ -4,6 +4,8 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from app.services.outbound import get_outbound_scheduler
+
 logger = logging.getLogger(__name__)
 
 START_MESSAGE = "Hey \U0001F618\U0001F602"
@@ -18,10 +20,10 @@ HELP_MESSAGE = (
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=START_MESSAGE)
+    await get_outbound_scheduler().send_message(context.bot, update.effective_chat.id, text=START_MESSAGE)
     logger.info("Start command sent to %s", update.effective_chat.id)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=HELP_MESSAGE)
+    await get_outbound_scheduler().send_message(context.bot, update.effective_chat.id, text=HELP_MESSAGE)
     logger.info("Help command sent to %s", update.effective_chat.id)
@@ -0,0 +1,156 @@
+"""python-telegram-bot filters that decide, before any handler runs,
+whether a group message or a sticker concerns the bot at all.
+
+In a big group almost every message is noise. Checking for triggers
+inside the handler meant a coroutine, a lowercased copy of the text and
+one substring scan per keyword for each of them - and substring matching
+meant "fun" also fired on "funeral". Stickers were worse: the handler ran
+for every sticker in every chat just to find out it didn't care.
+
+Now the checks are PTB filters, evaluated synchronously while PTB picks a
+handler, so an irrelevant update never reaches a handler coroutine. The
+update processor (app.services.dispatcher) runs the same checks once more,
+cheaply, through `is_for_bot` before it queues an update, so group noise
+is finished on arrival and never waits behind its chat:
+
+- `REPLY_TO_BOT`: the message replies to one of the bot's messages.
+- `MENTIONS_BOT`: the text contains @<bot username>.
+- `TRIGGER_WORDS`: the text contains a trigger keyword as a whole word
+  (or phrase). All keywords of a chat are compiled into one regex.
+
+Trigger keywords default to TRIGGER_KEYWORDS and can be replaced per chat
+with CHAT_TRIGGER_KEYWORDS, a JSON object of chat id -> keyword list.
+"""
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+from telegram import Message
+from telegram.constants import ChatType
+from telegram.ext import filters
+
+from app.config import settings
+from app.core.constants import TRIGGER_KEYWORDS
+
+
+class TriggerMatcher:
+    """Whole-word, case-insensitive match against a set of keywords."""
+
+    def __init__(self, keywords: Iterable[str]) -> None:
+        self.keywords = sorted({keyword.strip().lower() for keyword in keywords if keyword.strip()})
+        self._pattern = self._compile(self.keywords)
+
+    @staticmethod
+    def _compile(keywords: Iterable[str]) -> Optional[Pattern[str]]:
+        # Longest first so "how are you" wins over a shorter overlapping
+        # keyword; whitespace inside a phrase matches any run of it.
+        alternatives = [r"\s+".join(map(re.escape, k.split())) for k in sorted(keywords, key=len, reverse=True)]
+        if not alternatives:
+            return None
+        return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)", re.IGNORECASE)
+
+    def matches(self, text: str) -> bool:
+        return self._pattern is not None and self._pattern.search(text) is not None
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of every keyword match in `text`."""
+        return [match.span() for match in self._pattern.finditer(text)] if self._pattern is not None else []
+
+
+def parse_chat_keywords(raw: str) -> Dict[int, TriggerMatcher]:
+    """Parse CHAT_TRIGGER_KEYWORDS ('{"-100123": ["selene", "queen"]}')."""
+    if not raw.strip():
+        return {}
+    config = json.loads(raw)
+    if not isinstance(config, dict) or not all(isinstance(v, list) for v in config.values()):
+        raise ValueError("CHAT_TRIGGER_KEYWORDS must be a JSON object of chat id -> list of keywords")
+    return {int(chat_id): TriggerMatcher(keywords) for chat_id, keywords in config.items()}
+
+
+class TriggerMatchers:
+    """The default matcher plus per-chat overrides."""
+
+    def __init__(self, default: Iterable[str], per_chat: Optional[Dict[int, TriggerMatcher]] = None) -> None:
+        self.default = TriggerMatcher(default)
+        self._per_chat = per_chat or {}
+
+    def for_chat(self, chat_id: int) -> TriggerMatcher:
+        return self._per_chat.get(chat_id, self.default)
+
+    def matches(self, chat_id: int, text: str) -> bool:
+        return self.for_chat(chat_id).matches(text)
+
+
+_matchers: Optional[TriggerMatchers] = None
+
+
+def get_trigger_matchers() -> TriggerMatchers:
+    """Return the process-wide trigger matchers, built from settings."""
+    global _matchers
+    if _matchers is None:
+        _matchers = TriggerMatchers(TRIGGER_KEYWORDS, parse_chat_keywords(settings.chat_trigger_keywords))
+    return _matchers
+
+
+def is_reply_to_bot(message: Message) -> bool:
+    replied = message.reply_to_message
+    return bool(replied and replied.from_user and replied.from_user.id == message.get_bot().id)
+
+
+def mentions_bot(message: Message) -> bool:
+    username = message.get_bot().username
+    return bool(message.text and username and f"@{username.lower()}" in message.text.lower())
+
+
+def has_trigger_word(message: Message) -> bool:
+    return bool(message.text) and get_trigger_matchers().matches(message.chat.id, message.text)
+
+
+def is_for_bot(update: object) -> bool:
+    """False only for a group message every handler passes over: not a
+    command, not addressed to the bot, no trigger word, or a sticker that
+    isn't a reply to the bot. Anything else is left to the handlers, so
+    this can't turn away an update one of them would have taken.
+
+    Cheapest checks first. PTB still runs its handlers' filters on what
+    gets through, so this stays a pre-filter rather than a second pass
+    over every handler."""
+    message = getattr(update, "message", None)
+    if message is None or message.chat.type not in (ChatType.GROUP, ChatType.SUPERGROUP):
+        return True
+    if is_reply_to_bot(message):
+        return True
+    if not message.text:
+        return False
+    return message.text.startswith("/") or mentions_bot(message) or has_trigger_word(message)
+
+
+class _ReplyToBot(filters.MessageFilter):
+    __slots__ = ()
+
+    def filter(self, message: Message) -> bool:
+        return is_reply_to_bot(message)
+
+
+class _MentionsBot(filters.MessageFilter):
+    __slots__ = ()
+
+    def filter(self, message: Message) -> bool:
+        return mentions_bot(message)
+
+
+class _TriggerWords(filters.MessageFilter):
+    __slots__ = ()
+
+    def filter(self, message: Message) -> bool:
+        return has_trigger_word(message)
+
+
+REPLY_TO_BOT = _ReplyToBot(name="REPLY_TO_BOT")
+MENTIONS_BOT = _MentionsBot(name="MENTIONS_BOT")
+TRIGGER_WORDS = _TriggerWords(name="TRIGGER_WORDS")
+
+# Group text the bot should answer: addressed to it, or a trigger word.
+GROUP_TEXT_FOR_BOT = filters.TEXT & filters.ChatType.GROUPS & (REPLY_TO_BOT | MENTIONS_BOT | TRIGGER_WORDS)
+# Stickers the bot answers: any in a DM, in groups only replies to the bot.
+STICKER_FOR_BOT = filters.Sticker.ALL & (filters.ChatType.PRIVATE | (filters.ChatType.GROUPS & REPLY_TO_BOT))
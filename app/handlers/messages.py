@@ -1,16 +1,38 @@
 """Text message handling: history tracking, translation, AI reply, reactions."""
+import asyncio
 import logging
-from typing import Optional, TypedDict
+from typing import Dict, NamedTuple, Optional, Tuple, TypedDict
 
-from telegram import ReactionTypeEmoji, Update
+from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from app.config import settings
-from app.core.constants import ERROR_REPLY, TRIGGER_KEYWORDS
+from app.core.constants import (
+    AI_STAGE_TIMEOUT_SECONDS,
+    BUSY_REPLY,
+    ERROR_REPLY,
+    FALLBACK_REPLY,
+    REACTION_STAGE_TIMEOUT_SECONDS,
+    SEND_MIN_TIMEOUT_SECONDS,
+    SEND_STAGE_TIMEOUT_SECONDS,
+    TRANSLATION_STAGE_TIMEOUT_SECONDS,
+)
+from app.handlers.filters import has_trigger_word, is_reply_to_bot, mentions_bot
+from app.logging_config import log_context
+from app.services.admission import Priority, get_admission_controller
 from app.services.ai_client import get_ai_client
+from app.services.call_accounting import track_upstream_calls
+from app.services.deadline import Deadline
+from app.services.debounce import Batch, Debouncer
+from app.services.dispatcher import ChatOrderedUpdateProcessor, update_received_at
+from app.services.fair_scheduler import FlowKey, get_fair_scheduler
 from app.services.history import MessageHistory
+from app.services.memory import get_memory_registry
+from app.services.outbound import get_outbound_scheduler
+from app.services.pipeline import ErrorPolicy, Pipeline, Results, Stage
 from app.services.reaction import extract_reaction
+from app.services.tracing import get_tracer, span
 from app.services.translator import TranslationService
 
 logger = logging.getLogger(__name__)
@@ -24,51 +46,136 @@ class UserInfo(TypedDict):
     message_id: int
 
 
+class PendingMessage(NamedTuple):
+    """One incoming text message waiting to be answered."""
+
+    update: Update
+    context: ContextTypes.DEFAULT_TYPE
+    chat_type: str
+    priority: Priority
+    deadline: Optional[Deadline]
+
+
 class MessageProcessor:
     """Coordinates history, translation, the AI client, and reactions for
-    every incoming text message."""
+    every incoming text message.
+
+    Updates may be processed concurrently (ordering and duplicate
+    suppression live in app.services.dispatcher), so the blocking
+    translator and AI calls are pushed to worker threads rather than run
+    on the event loop, where they would stall every other chat. Those
+    calls share a fixed number of slots handed out fairly across chats
+    (see app.services.fair_scheduler).
+
+    Answering a turn is a declared pipeline of stages (see
+    `_build_pipeline` and app.services.pipeline): stages that don't need
+    each other's results run concurrently, and each has its own timeout,
+    error policy and timing record.
+
+    With DEBOUNCE_SECONDS > 0, quick bursts from the same user in the same
+    chat are merged into a single turn and answered once, threaded to the
+    last message of the burst (see app.services.debounce).
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, dispatcher: Optional[ChatOrderedUpdateProcessor] = None) -> None:
+        self.dispatcher = dispatcher
         self.history = MessageHistory()
+        get_memory_registry().register(
+            "message_history", self.history.size, root=self.history.store, flush=self.history.clear
+        )
         self.translator = TranslationService()
         self.ai_client = get_ai_client()
-        self._last_update_id: Optional[int] = None
+        self.admission = get_admission_controller()
+        self.scheduler = get_fair_scheduler()
+        self.outbound = get_outbound_scheduler()
+        self.pipeline = self._build_pipeline()
+        self.debouncer: Optional[Debouncer[PendingMessage]] = (
+            Debouncer(settings.debounce_seconds, self._run_debounced) if settings.debounce_seconds > 0 else None
+        )
 
     def should_respond_in_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """Decide whether a group message should get the full AI treatment."""
-        if not update.message or not update.message.text:
-            return False
-
-        text = update.message.text.lower()
-        bot_username = context.bot.username
-
-        return (
-            any(keyword in text for keyword in TRIGGER_KEYWORDS)
-            or f"@{bot_username}" in text
-            or bool(
-                update.message.reply_to_message
-                and update.message.reply_to_message.from_user
-                and update.message.reply_to_message.from_user.id == context.bot.id
-            )
-        )
+        return self.group_priority(update, context) is not None
+
+    def group_priority(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Priority]:
+        """Classify a group message for admission control, or None if the
+        bot shouldn't respond to it at all. Being addressed directly (a
+        reply or an @mention) outranks a keyword showing up in passing.
+
+        Messages that match none of these normally never get here - the
+        same checks run earlier as PTB filters (app.handlers.filters)."""
+        message = update.message
+        if not message or not message.text:
+            return None
+
+        if is_reply_to_bot(message) or mentions_bot(message):
+            return Priority.GROUP_REPLY
+        if has_trigger_word(message):
+            return Priority.GROUP_KEYWORD
+        return None
 
     async def process_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, chat_type: str) -> None:
-        if not self._is_new_update(update) or not update.message or not update.message.text:
+        if not update.message or not update.message.text:
+            return
+
+        priority = Priority.PRIVATE if chat_type == "private" else self.group_priority(update, context)
+        if priority is None:
             return
 
-        user_info = self._extract_user_info(update)
-        logger.debug("Processing message from %s in %s", user_info["name"], chat_type)
+        deadline = None
+        if settings.update_deadline_seconds > 0:
+            deadline = Deadline.after(settings.update_deadline_seconds, update_received_at())
+        pending = PendingMessage(update, context, chat_type, priority, deadline)
+        if self.debouncer is not None:
+            self.debouncer.submit((update.effective_chat.id, update.message.from_user.id), pending)
+            return
+
+        await self._process_batch(Batch([pending]))
+
+    async def _run_debounced(self, batch: Batch[PendingMessage]) -> None:
+        # The burst's updates were finished when they were collected; the
+        # turn still waits its chat's turn and for a running slot.
+        if self.dispatcher is None:
+            await self._process_batch(batch)
+        else:
+            await self.dispatcher.run_in_chat(batch.items[-1].update, self._process_batch(batch))
+
+    async def _process_batch(self, batch: Batch[PendingMessage]) -> None:
+        """Answer one turn: a single message, or a debounced burst of them."""
+        last = batch.items[-1]
+        priority = max(item.priority for item in batch.items)
+
+        update_id, chat_id = last.update.update_id, last.update.effective_chat.id
+        with log_context(update_id=update_id, chat_id=chat_id), get_tracer().start_trace(
+            "turn", update_id=update_id, chat_id=chat_id, chat_type=last.chat_type, messages=len(batch.items)
+        ), track_upstream_calls():
+            await self._answer_batch(batch, last, priority)
+
+    async def _answer_batch(self, batch: Batch[PendingMessage], last: PendingMessage, priority: Priority) -> None:
+        with span("admission_wait", priority=priority.name.lower()):
+            admitted = await self.admission.acquire(priority)
+        if not admitted:
+            await self._send_shed_reply(last.update, last.context, last.chat_type)
+            return
 
         try:
-            await self._reply(update, context, user_info)
-        except Exception as exc:
-            logger.error("Error processing message: %s", exc)
-            await self._send_error(update, context)
+            for item in batch.items:
+                self.history.add_message(item.update.message.from_user.id, item.update.message.text)
 
-        self._last_update_id = update.update_id
+            user_info = self._extract_user_info(last.update)
+            if len(batch.items) > 1:
+                user_info["message"] = "\n".join(item.update.message.text for item in batch.items)
+            logger.debug(
+                "Processing %d message(s) from %s in %s", len(batch.items), user_info["name"], last.chat_type
+            )
 
-    def _is_new_update(self, update: Update) -> bool:
-        return not (self._last_update_id and update.update_id <= self._last_update_id)
+            try:
+                await self._reply(last.update, last.context, user_info, batch, last.deadline)
+            except Exception as exc:
+                logger.error("Error processing message: %s", exc)
+                await self._send_error(last.update, last.context)
+        finally:
+            self.admission.release()
 
     def _extract_user_info(self, update: Update) -> UserInfo:
         user = update.message.from_user
@@ -90,12 +197,11 @@ class MessageProcessor:
         working in production.
         """
         try:
-            await context.bot.set_message_reaction(
-                chat_id=update.effective_chat.id,
-                message_id=update.message.message_id,
-                reaction=[ReactionTypeEmoji(emoji)],
+            sent = await self.outbound.set_reaction(
+                context.bot, update.effective_chat.id, update.message.message_id, emoji
             )
-            logger.info("Reacted with %s to message %s", emoji, update.message.message_id)
+            if sent is not None:
+                logger.info("Reacted with %s to message %s", emoji, update.message.message_id)
         except BadRequest as exc:
             # Can fail for reasons that don't matter to the user (message
             # too old, chat doesn't allow reactions, etc) - but we still
@@ -104,35 +210,149 @@ class MessageProcessor:
         except Exception as exc:
             logger.warning("Unexpected error setting reaction: %s", exc)
 
-    async def _reply(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_info: UserInfo) -> None:
-        self.history.add_message(user_info["id"], user_info["message"])
+    def _build_pipeline(self) -> Pipeline:
+        """Declare the stages of answering one turn and what each needs.
 
-        history_text = self.history.get_history(user_info["id"])
-        translated_history, history_lang = self.translator.to_english(history_text)
-        translated_message, _ = self.translator.to_english(user_info["message"])
+        Both translations only need raw text, so they run side by side;
+        the reaction only needs the AI's answer, so it is set while the
+        reply is still being back-translated and sent.
+        """
+        return Pipeline(
+            [
+                Stage("history", self._stage_history),
+                Stage(
+                    "translate_history",
+                    self._stage_translate_history,
+                    depends_on=("history",),
+                    timeout=TRANSLATION_STAGE_TIMEOUT_SECONDS,
+                    on_error=ErrorPolicy.FALLBACK,
+                    fallback=self._untranslated_history,
+                ),
+                Stage(
+                    "translate_message",
+                    self._stage_translate_message,
+                    timeout=TRANSLATION_STAGE_TIMEOUT_SECONDS,
+                    on_error=ErrorPolicy.FALLBACK,
+                    fallback=lambda r: r["user_info"]["message"],
+                ),
+                Stage(
+                    "ai",
+                    self._stage_ai,
+                    depends_on=("translate_history", "translate_message"),
+                    timeout=AI_STAGE_TIMEOUT_SECONDS,
+                    on_error=ErrorPolicy.FALLBACK,
+                    fallback=lambda r: FALLBACK_REPLY,
+                ),
+                Stage("parse_reaction", self._stage_parse_reaction, depends_on=("ai",)),
+                Stage(
+                    "back_translate",
+                    self._stage_back_translate,
+                    depends_on=("parse_reaction", "translate_history"),
+                    timeout=TRANSLATION_STAGE_TIMEOUT_SECONDS,
+                    on_error=ErrorPolicy.FALLBACK,
+                    fallback=lambda r: r["parse_reaction"][0],
+                ),
+                Stage(
+                    "send",
+                    self._stage_send,
+                    depends_on=("back_translate",),
+                    timeout=SEND_STAGE_TIMEOUT_SECONDS,
+                    min_timeout=SEND_MIN_TIMEOUT_SECONDS,
+                ),
+                Stage(
+                    "react",
+                    self._stage_react,
+                    depends_on=("parse_reaction",),
+                    timeout=REACTION_STAGE_TIMEOUT_SECONDS,
+                    on_error=ErrorPolicy.IGNORE,
+                ),
+            ]
+        )
 
-        final_message = self._build_prompt_message(update, user_info, translated_message)
-        prompt = f"Our Last Chat(used for to remember): {translated_history}\n\nMy new Message: {final_message}"
+    async def _reply(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        user_info: UserInfo,
+        batch: Batch[PendingMessage],
+        deadline: Optional[Deadline] = None,
+    ) -> None:
+        await self.pipeline.run(
+            {
+                "update": update,
+                "context": context,
+                "user_info": user_info,
+                "batch": batch,
+                "flow": self._flow_key(update, user_info),
+                "deadline": deadline,
+            },
+            deadline,
+        )
+
+    async def _stage_history(self, r: Results) -> str:
+        return self.history.get_history(r["user_info"]["id"])
+
+    async def _stage_translate_history(self, r: Results) -> Tuple[str, str]:
+        return await self.scheduler.run(r["flow"], self.translator.to_english, r["history"], r["deadline"])
+
+    async def _untranslated_history(self, r: Results) -> Tuple[str, str]:
+        # Detection is CPU work too; keep it off the event loop.
+        return r["history"], await asyncio.to_thread(self.translator.detect_language_code, r["history"])
 
-        ai_reply = self.ai_client.get_response(prompt)
+    async def _stage_translate_message(self, r: Results) -> str:
+        translated_message, _ = await self.scheduler.run(
+            r["flow"], self.translator.to_english, r["user_info"]["message"], r["deadline"]
+        )
+        return translated_message
+
+    async def _stage_ai(self, r: Results) -> str:
+        translated_history, _ = r["translate_history"]
+        final_message = self._build_prompt_message(r["update"], r["user_info"], r["translate_message"])
+        prompt = f"Our Last Chat(used for to remember): {translated_history}\n\nMy new Message: {final_message}"
+        return await self.scheduler.run(r["flow"], self.ai_client.get_response, prompt, r["deadline"])
 
+    async def _stage_parse_reaction(self, r: Results) -> Tuple[str, Optional[str]]:
         # The AI appends a hidden "REACT: <emoji-or-NONE>" control line to
         # its own reply (see Instruction.reaction_directive) - pull that off
         # before translating so it's never shown to the user and never run
         # through the translator.
-        clean_reply, reaction_emoji = extract_reaction(ai_reply)
+        return extract_reaction(r["ai"])
 
-        reply_text = self.translator.from_english(clean_reply, history_lang)
+    async def _stage_back_translate(self, r: Results) -> str:
+        clean_reply, _ = r["parse_reaction"]
+        _, history_lang = r["translate_history"]
+        return await self.scheduler.run(
+            r["flow"], self.translator.from_english, clean_reply, history_lang, r["deadline"]
+        )
 
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=reply_text,
-            reply_to_message_id=user_info["message_id"],
+    async def _stage_send(self, r: Results) -> None:
+        update = r["update"]
+        await self.outbound.send_message(
+            r["context"].bot,
+            update.effective_chat.id,
+            text=r["back_translate"],
+            reply_to_message_id=r["user_info"]["message_id"],
+            **self._send_timeouts(r["deadline"]),
         )
         logger.info("Sent response to %s", update.effective_chat.id)
 
+    async def _stage_react(self, r: Results) -> None:
+        _, reaction_emoji = r["parse_reaction"]
         if settings.reactions_enabled and reaction_emoji:
-            await self._apply_reaction(update, context, reaction_emoji)
+            await self._apply_reaction(r["update"], r["context"], reaction_emoji)
+
+    @staticmethod
+    def _send_timeouts(deadline: Optional[Deadline]) -> Dict[str, float]:
+        """PTB per-request timeouts that fit the turn's remaining budget,
+        never below SEND_MIN_TIMEOUT_SECONDS so the reply still goes out."""
+        if deadline is None:
+            return {}
+        timeout = max(deadline.clamp(SEND_STAGE_TIMEOUT_SECONDS), SEND_MIN_TIMEOUT_SECONDS)
+        return {"read_timeout": timeout, "write_timeout": timeout, "connect_timeout": timeout}
+
+    def _flow_key(self, update: Update, user_info: UserInfo) -> FlowKey:
+        weight = settings.fair_private_weight if update.effective_chat.type == "private" else settings.fair_group_weight
+        return FlowKey(chat_id=update.effective_chat.id, user_id=user_info["id"], weight=weight)
 
     def _build_prompt_message(self, update: Update, user_info: UserInfo, translated_message: str) -> str:
         message = f"User {user_info['name']} (@{user_info['username']}, ID: {user_info['id']}): {translated_message}"
@@ -145,8 +365,34 @@ class MessageProcessor:
         return message
 
     async def _send_error(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
+        await self.outbound.send_message(
+            context.bot,
+            update.effective_chat.id,
             text=ERROR_REPLY,
             reply_to_message_id=update.message.message_id,
         )
+
+    async def _send_shed_reply(self, update: Update, context: ContextTypes.DEFAULT_TYPE, chat_type: str) -> None:
+        """Cheap stand-in answer for a group message shed under load - no
+        history, translation or AI call involved. Private chats are only
+        shed in extreme overload, and get nothing rather than a canned line."""
+        if chat_type == "private" or settings.shed_reply == "none":
+            return
+
+        try:
+            if settings.shed_reply == "sticker" and settings.busy_sticker_id:
+                await self.outbound.send_sticker(
+                    context.bot,
+                    update.effective_chat.id,
+                    sticker=settings.busy_sticker_id,
+                    reply_to_message_id=update.message.message_id,
+                )
+            elif settings.shed_reply == "text":
+                await self.outbound.send_message(
+                    context.bot,
+                    update.effective_chat.id,
+                    text=BUSY_REPLY,
+                    reply_to_message_id=update.message.message_id,
+                )
+        except Exception as exc:
+            logger.warning("Could not send shed reply: %s", exc)
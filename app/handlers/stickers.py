@@ -5,6 +5,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from app.services.outbound import get_outbound_scheduler
 from app.services.stickers import get_sticker_service
 
 logger = logging.getLogger(__name__)
@@ -19,17 +20,8 @@ async def sticker_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if not message or not message.sticker:
         return
 
-    # Only respond in private chats (DMs) or if the sticker is a reply to the bot
-    chat_type = message.chat.type
-    if chat_type == "private":
-        pass
-    elif chat_type in ("group", "supergroup"):
-        replied = message.reply_to_message
-        if not (replied and replied.from_user and replied.from_user.id == context.bot.id):
-            return
-    else:
-        return
-
+    # Only DMs and group replies to the bot get here - see
+    # app.handlers.filters.STICKER_FOR_BOT.
     sticker = message.sticker
     set_name = sticker.set_name
 
@@ -42,16 +34,19 @@ async def sticker_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         context.bot, set_name, exclude_file_id=sticker.file_id
     )
 
+    outbound = get_outbound_scheduler()
     if not reply_file_id:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
+        await outbound.send_message(
+            context.bot,
+            update.effective_chat.id,
             text=_NO_PACK_FALLBACK,
             reply_to_message_id=message.message_id,
         )
         return
 
-    await context.bot.send_sticker(
-        chat_id=update.effective_chat.id,
+    await outbound.send_sticker(
+        context.bot,
+        update.effective_chat.id,
         sticker=reply_file_id,
         reply_to_message_id=message.message_id,
     )
@@ -0,0 +1,130 @@
+"""Admin endpoints on the health API, for looking inside the live process:
+CPU profiles, memory held by in-process stores, and switching fault
+injection into upstream calls on and off.
+
+Every route here needs `Authorization: Bearer <ADMIN_TOKEN>`. With
+ADMIN_TOKEN unset they all answer 404, as if they didn't exist.
+"""
+import asyncio
+import hmac
+from typing import Any, Dict
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.core.constants import PROFILE_MAX_SECONDS
+from app.services.faults import DEPENDENCIES, FaultRule, get_fault_injector
+from app.services.memory import get_memory_registry, process_memory, set_tracemalloc, top_allocations
+from app.services.profiler import ProfilerBusy, get_profiler
+
+
+def require_admin(request: Request) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404)
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+@router.post("/profile", summary="Sample the Live Process")
+async def profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    format: str = Query("collapsed", pattern="^(collapsed|top)$"),
+):
+    """Sample every thread's stack for `seconds`. `collapsed` returns
+    flame-graph input; `top` a JSON summary of the hottest functions."""
+    profiler = get_profiler()
+    if profiler.busy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        # Sampled from a worker thread, so this event loop keeps running
+        # (and shows up in the profile) meanwhile.
+        result = await asyncio.to_thread(profiler.profile, seconds)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    headers = {"X-Profile-Samples": str(result.samples), "X-Profile-Seconds": f"{result.duration:.2f}"}
+    if format == "top":
+        return {
+            "samples": result.samples,
+            "seconds": round(result.duration, 2),
+            "interval_seconds": result.interval,
+            "functions": result.top_functions(),
+        }
+    return PlainTextResponse(result.collapsed(), headers=headers)
+
+
+@router.get("/memory", summary="Memory and In-Process Stores")
+async def memory(sizes: bool = True, top: int = Query(0, ge=0, le=100)):
+    """Entry counts (and with `sizes`, approximate bytes) of every
+    registered store, process RSS and GC stats, and - while tracemalloc
+    is on - the `top` allocating source lines."""
+
+    def report() -> dict:
+        return {
+            "process": process_memory(),
+            "stores": get_memory_registry().report(sizes),
+            "top_allocations": top_allocations(top) if top else [],
+        }
+
+    # Walking the stores can take a while; keep it off the event loop.
+    return await asyncio.to_thread(report)
+
+
+@router.post("/memory/tracemalloc", summary="Start or Stop tracemalloc")
+async def tracemalloc_switch(enabled: bool):
+    set_tracemalloc(enabled)
+    return {"tracemalloc": enabled}
+
+
+@router.post("/memory/stores/{name}/flush", summary="Empty One Store")
+async def flush_store(name: str):
+    try:
+        get_memory_registry().flush(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No store named {name!r}")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"flushed": name}
+
+
+@router.get("/faults", summary="Injected Faults")
+async def faults():
+    """The fault injection rules in force, and how many faults of each
+    kind have been injected so far."""
+    injector = get_fault_injector()
+    return {"rules": injector.rules(), "injected": injector.stats()}
+
+
+@router.put("/faults/{dependency}", summary="Inject Faults into One Dependency")
+async def set_fault_rule(dependency: str, rule: Dict[str, Any] = Body(...)):
+    """Replace `dependency`'s rule (a FAULT_INJECTION rule object); an
+    empty object leaves only the defaults, which inject nothing."""
+    if dependency not in DEPENDENCIES:
+        raise HTTPException(status_code=404, detail=f"No dependency named {dependency!r}")
+    try:
+        parsed = FaultRule.from_dict(rule)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    get_fault_injector().set_rule(dependency, parsed)
+    return {"rules": get_fault_injector().rules()}
+
+
+@router.delete("/faults", summary="Stop All Fault Injection")
+async def clear_faults():
+    injector = get_fault_injector()
+    for dependency in DEPENDENCIES:
+        injector.set_rule(dependency, None)
+    return {"rules": injector.rules()}
+
+
+@router.delete("/faults/{dependency}", summary="Stop Injecting Faults into One Dependency")
+async def clear_fault_rule(dependency: str):
+    if dependency not in DEPENDENCIES:
+        raise HTTPException(status_code=404, detail=f"No dependency named {dependency!r}")
+    get_fault_injector().set_rule(dependency, None)
+    return {"rules": get_fault_injector().rules()}
@@ -1,13 +1,30 @@
-"""Health check endpoints for deployment monitoring."""
+"""Health check endpoints for deployment monitoring, plus the Telegram
+webhook route used when UPDATE_MODE=webhook."""
+import asyncio
+import hmac
 import logging
 import time
+from typing import Optional
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.responses import Response as FastAPIResponse
+from telegram import Update
+from telegram.ext import Application
 
 from app.config import settings
-from app.core.constants import TRIGGER_KEYWORDS
-from app.services.ai_client import get_ai_client
+from app.core.constants import TRIGGER_KEYWORDS, WEBHOOK_PATH, WEBHOOK_SECRET_HEADER
+from app.health.admin import router as admin_router
+from app.services.admission import get_admission_controller
+from app.services.fair_scheduler import get_fair_scheduler
+from app.services.health import AI, TELEGRAM, TRANSLATOR, get_health_registry
+from app.services.metrics import REGISTRY
+from app.services.outbound import get_outbound_scheduler
+from app.services.stickers import get_sticker_service
+from app.services.tracing import get_tracer
+from app.services.watchdog import get_loop_watchdog
+from app.services.work_queue import WorkQueue
+from app.services.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +35,35 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
 )
+app.include_router(admin_router)
+
+# The bot's Application, set by app.main when running in webhook mode so
+# the webhook route can feed updates into it on this same event loop.
+_telegram_app: Optional[Application] = None
+
+# The worker pool when WORKERS > 1, so /health can report on each worker.
+_worker_pool: Optional[WorkerPool] = None
+
+# The shared work queue when WORK_QUEUE is set.
+_work_queue: Optional[WorkQueue] = None
+
+
+def attach_telegram_application(application: Optional[Application]) -> None:
+    """Route webhook updates into `application` (None detaches)."""
+    global _telegram_app
+    _telegram_app = application
+
+
+def attach_worker_pool(pool: Optional[WorkerPool]) -> None:
+    """Report `pool`'s workers in /health (None detaches)."""
+    global _worker_pool
+    _worker_pool = pool
+
+
+def attach_work_queue(queue: Optional[WorkQueue]) -> None:
+    """Report `queue` in /health (None detaches)."""
+    global _work_queue
+    _work_queue = queue
 
 
 def _no_cache_headers(extra: dict) -> dict:
@@ -59,14 +105,14 @@ async def root(request: Request):
 @app.get("/health", summary="Detailed Health Check")
 @app.head("/health", summary="Detailed Health Check HEAD")
 async def health_check(request: Request):
-    try:
-        service_status = "healthy" if get_ai_client().health_check() else "degraded"
-    except Exception as exc:
-        logger.error("Health check failed: %s", exc)
-        service_status = "unhealthy"
+    # Passive: derived from recent real calls (see app.services.health),
+    # never from a live call made here.
+    dependencies = get_health_registry().snapshot()
+    service_status = dependencies[AI]["status"]
 
     config_status = "healthy" if all([settings.bot_token, settings.api_base_url, settings.api_token]) else "unhealthy"
-    overall_status = "healthy" if service_status == "healthy" and config_status == "healthy" else "degraded"
+    unhealthy = [name for name, dependency in dependencies.items() if dependency["status"] == "unhealthy"]
+    overall_status = "healthy" if not unhealthy and config_status == "healthy" else "degraded"
 
     if request.method == "HEAD":
         status_code = 200 if overall_status == "healthy" else 503
@@ -91,9 +137,12 @@ async def health_check(request: Request):
         "bot_type": "telegram",
         "services": {
             "ai_api": service_status,
+            "translator": dependencies[TRANSLATOR]["status"],
+            "telegram": dependencies[TELEGRAM]["status"],
             "configuration": config_status,
-            "telegram_polling": "active",
+            "telegram_updates": settings.update_mode,
         },
+        "dependencies": dependencies,
         "features": {
             "language_detection": "active",
             "translation": "active",
@@ -102,9 +151,96 @@ async def health_check(request: Request):
             "emoji_reactions": "active" if settings.reactions_enabled else "disabled",
             "personality": "Princess Selene",
         },
+        "admission": get_admission_controller().stats(),
+        "fair_scheduler": get_fair_scheduler().stats(),
+        "outbound": get_outbound_scheduler().stats(),
+        "workers": _worker_pool.stats() if _worker_pool is not None else [],
+        "work_queue": await _queue_stats(),
+        "event_loop": _watchdog_stats(),
     }
 
 
+def _watchdog_stats() -> Optional[dict]:
+    watchdog = get_loop_watchdog()
+    return watchdog.stats() if watchdog is not None else None
+
+
+async def _queue_stats() -> Optional[dict]:
+    if _work_queue is None:
+        return None
+    try:
+        # A SQLite query or a few Redis round trips; not on the event loop
+        # that is also handling the bot's updates.
+        return await asyncio.to_thread(_work_queue.stats)
+    except Exception as exc:
+        logger.error("Work queue stats failed: %s", exc)
+        return {"error": str(exc)}
+
+
+@app.get("/metrics", summary="Prometheus Metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/slow", summary="Slowest Recent Turns")
+async def slowest_turns():
+    """The slowest traced turns, slowest first, each with a per-step
+    breakdown of where its time went (see app.services.tracing)."""
+    tracer = get_tracer()
+    return {**tracer.stats(), "traces": tracer.slowest()}
+
+
+def _register_metrics() -> None:
+    # Read at scrape time from the stats these services already keep.
+    REGISTRY.callback(
+        "selene_admission_active",
+        "Updates admitted into the message pipeline",
+        lambda: get_admission_controller().stats()["active"],
+    )
+    REGISTRY.callback(
+        "selene_admission_queued",
+        "Updates waiting for admission, by priority",
+        lambda: get_admission_controller().stats()["queued"],
+        ["priority"],
+    )
+    REGISTRY.callback(
+        "selene_admission_shed",
+        "Updates shed under overload, by priority",
+        lambda: get_admission_controller().stats()["shed"],
+        ["priority"],
+        kind="counter",
+    )
+    REGISTRY.callback(
+        "selene_fair_scheduler_in_service",
+        "AI and translation calls holding a fair-scheduler slot",
+        lambda: get_fair_scheduler().in_service,
+    )
+    REGISTRY.callback(
+        "selene_fair_scheduler_queued",
+        "AI and translation calls waiting for a fair-scheduler slot",
+        lambda: get_fair_scheduler().queued,
+    )
+    REGISTRY.callback(
+        "selene_fair_scheduler_starved",
+        "AI and translation calls that waited longer than FAIR_STARVATION_SECONDS for a slot",
+        lambda: get_fair_scheduler().starved_total,
+        kind="counter",
+    )
+    REGISTRY.callback("selene_outbound_queued", "Telegram calls waiting to be sent", lambda: get_outbound_scheduler().stats()["queued"])
+    REGISTRY.callback("selene_outbound_in_flight", "Telegram calls being sent", lambda: get_outbound_scheduler().stats()["in_flight"])
+    REGISTRY.callback(
+        "selene_sticker_cache_events",
+        "Sticker pack cache hits, misses, fetches, failures and evictions",
+        lambda: {event: count for event, count in get_sticker_service().stats().items() if event not in ("packs", "fetching")},
+        ["event"],
+        kind="counter",
+    )
+    REGISTRY.callback("selene_sticker_cache_packs", "Sticker packs cached", lambda: get_sticker_service().stats()["packs"])
+
+
+_register_metrics()
+
+
 @app.head("/ping", summary="Simple Ping Check")
 async def ping_check():
     return FastAPIResponse(
@@ -138,3 +274,33 @@ async def bot_status():
         },
         "version": "2.0.0",
     }
+
+
+@app.post(WEBHOOK_PATH, summary="Telegram Webhook", include_in_schema=False)
+async def telegram_webhook(request: Request):
+    """Receive one update from Telegram and queue it for the bot.
+
+    Answers as soon as the update is queued - the reply is sent later,
+    through the normal Bot API - so Telegram never waits on the AI.
+    """
+    received_secret = request.headers.get(WEBHOOK_SECRET_HEADER, "")
+    if not settings.webhook_secret or not hmac.compare_digest(received_secret, settings.webhook_secret):
+        logger.warning("Rejected webhook call with a missing or wrong secret token")
+        return JSONResponse(status_code=403, content={"ok": False})
+
+    application = _telegram_app
+    if application is None:
+        # Not ready yet (or running in polling mode) - a non-2xx makes
+        # Telegram retry the update later instead of losing it.
+        return JSONResponse(status_code=503, content={"ok": False})
+
+    try:
+        update = Update.de_json(await request.json(), application.bot)
+    except Exception as exc:
+        # Acknowledge anyway, so Telegram doesn't keep redelivering
+        # something we will never be able to parse.
+        logger.warning("Ignoring malformed webhook payload: %s", exc)
+        return {"ok": False}
+
+    await application.update_queue.put(update)
+    return {"ok": True}
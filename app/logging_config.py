@@ -0,0 +1,243 @@
+"""Logging that never makes the event loop wait on stdout.
+
+`logging.basicConfig` with a StreamHandler wrote every record straight to
+stdout from whichever thread logged it - usually the event loop. When the
+container's log driver is slow, every "Sent response" then stalls every
+chat.
+
+Here loggers only put records on a bounded in-memory queue (a
+`QueueHandler`); a `QueueListener` thread formats and writes them. If the
+writer falls that far behind, new records are dropped and counted rather
+than blocking the bot.
+
+Each record carries the update id and chat id it was logged for, and the
+durations of the pipeline stages and the upstream calls made so far
+(see app.services.call_accounting), taken from a context variable
+(`log_context`) that follows the update through its tasks and worker
+threads. LOG_FORMAT=json writes one JSON object per line with those as
+fields; the default text format appends them in brackets.
+
+LOG_SAMPLING (JSON, logger name -> rate) keeps only that fraction of a
+noisy logger's INFO-and-below records, e.g. {"uvicorn.access": 0.1}. It
+applies to child loggers too; warnings and errors are never sampled.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional
+
+from app.core.constants import LOG_QUEUE_SIZE
+from app.services.metrics import REGISTRY
+
+_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("selene_log_context", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s%(context)s"
+
+
+class LogContext:
+    """Context manager behind `log_context`."""
+
+    __slots__ = ("_fields", "_token")
+
+    def __init__(self, **fields: Any) -> None:
+        self._fields = fields
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> Dict[str, Any]:
+        outer = _context.get()
+        fields = {**outer, **self._fields} if outer else dict(self._fields)
+        self._token = _context.set(fields)
+        return fields
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _context.reset(self._token)
+
+
+def log_context(**fields: Any) -> LogContext:
+    """`with log_context(update_id=..., chat_id=...):` - fields added to
+    every record logged inside, on top of any outer context's."""
+    return LogContext(**fields)
+
+
+def record_stage_timing(stage: str, seconds: float) -> None:
+    """Attach a finished stage's duration to the current context, so later
+    lines of the same update show it. The context dict is shared with the
+    update's other tasks, so they all see it."""
+    fields = _context.get()
+    if fields is not None:
+        fields.setdefault("stages", {})[stage] = round(seconds, 3)
+
+
+def add_log_context(**fields: Any) -> None:
+    """Add fields to the current context in place, so the update's other
+    tasks see them too - unlike `log_context`, which only covers its own
+    block."""
+    current = _context.get()
+    if current is not None:
+        current.update(fields)
+
+
+def parse_sampling(raw: str) -> Dict[str, float]:
+    """Parse LOG_SAMPLING ('{"uvicorn.access": 0.1}')."""
+    if not raw.strip():
+        return {}
+    config = json.loads(raw)
+    if not isinstance(config, dict) or not all(
+        isinstance(rate, (int, float)) and 0 <= rate <= 1 for rate in config.values()
+    ):
+        raise ValueError("LOG_SAMPLING must be a JSON object of logger name -> rate between 0 and 1")
+    return {name: float(rate) for name, rate in config.items()}
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current log context onto the record. Runs in the
+    logging thread, before the record crosses to the listener."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.log_context = _snapshot(_context.get())
+        return True
+
+
+def _snapshot(fields: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # Nested dicts (stage timings, call counts) keep changing after the
+    # record is queued, so the listener gets copies; empty ones are left
+    # out.
+    if not fields:
+        return {}
+    return {
+        key: dict(value) if isinstance(value, dict) else value
+        for key, value in fields.items()
+        if value or not isinstance(value, dict)
+    }
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+        self._cache: Dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._cache.get(record.name)
+        if rate is None:
+            rate = self._cache[record.name] = self._rate_for(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+    def _rate_for(self, name: str) -> float:
+        # The most specific configured ancestor wins.
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops (and counts) records instead of blocking when the queue is
+    full."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The base class formats the traceback into the message, which
+        # would leave JSON output nothing to put in its "exception" field.
+        # Resolve the message and render the traceback now (exc_info's
+        # frames shouldn't outlive the call), but keep them apart.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "log_context", None)
+        record.context = f" [{_format_fields(fields)}]" if fields else ""
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "log_context", {}),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _format_fields(fields: Dict[str, Any]) -> str:
+    parts = []
+    for key, value in fields.items():
+        if isinstance(value, dict):
+            value = ",".join(f"{k}:{v}" for k, v in value.items())
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+def configure_logging(level: str, log_format: str = "text", sampling: str = "") -> logging.handlers.QueueListener:
+    """Route every log record through a queue to a listener thread that
+    writes to stdout. Replaces any handlers already on the root logger."""
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    sampler = SamplingFilter(parse_sampling(sampling))
+    handler.addFilter(sampler)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    # Write out whatever is still queued when the process exits.
+    atexit.register(listener.stop)
+
+    REGISTRY.callback(
+        "selene_log_records_dropped",
+        "Log records not written: sampled out, or the log queue was full",
+        lambda: {"sampled": sampler.dropped, "queue_full": handler.dropped},
+        ["reason"],
+        kind="counter",
+    )
+    return listener
@@ -1,83 +1,363 @@
 """Application entrypoint: builds the Telegram bot, registers handlers, and
-runs the health-check API alongside it."""
+runs the health-check API alongside it.
+
+Two ways of receiving updates, picked with UPDATE_MODE:
+
+- polling (default): PTB long-polls getUpdates, and the health API runs
+  in its own uvicorn thread.
+- webhook: one uvicorn server on one event loop serves both the health
+  API and the Telegram webhook route, feeding updates straight into the
+  bot's Application - no getUpdates round trip and no second server.
+
+Either way, WORKERS > 1 turns this process into a thin front that only
+forwards updates to worker processes, sharded by chat id (see
+app.services.worker_pool). SIGHUP rolling-restarts the workers.
+
+WORK_QUEUE instead makes this one node of many sharing a queue (see
+app.services.work_queue): the elected leader polls Telegram into the
+queue, and every node handles updates from it.
+"""
+import asyncio
 import logging
+import signal
 import sys
 import threading
+import time
+from typing import Any, Optional
 
+import requests
 import uvicorn
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, TypeHandler, filters
 
 from app.config import settings
+from app.core.constants import TELEGRAM_GLOBAL_MESSAGES_PER_SECOND, WEBHOOK_PATH
 from app.handlers.commands import help_command, start_command
+from app.handlers.filters import GROUP_TEXT_FOR_BOT, STICKER_FOR_BOT, is_for_bot
 from app.handlers.messages import MessageProcessor
 from app.handlers.stickers import sticker_handler
 from app.health.api import app as health_app
-
-logging.basicConfig(
-    level=getattr(logging, settings.log_level.upper(), logging.INFO),
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
+from app.health.api import attach_telegram_application, attach_work_queue, attach_worker_pool
+from app.logging_config import configure_logging
+from app.services.ai_client import get_ai_client
+from app.services.call_accounting import CountingRequest
+from app.services.capture import get_traffic_recorder
+from app.services.dispatcher import ChatOrderedUpdateProcessor
+from app.services.health import AI, TELEGRAM, TRANSLATOR, get_health_registry
+from app.services.journal import JournaledUpdateQueue, UpdateJournal
+from app.services.metrics import REGISTRY
+from app.services.outbound import configure_outbound_scheduler
+from app.services.translator import TranslationService
+from app.services.watchdog import start_loop_watchdog
+from app.services.work_queue import (
+    JobTracker,
+    WorkQueue,
+    consume_updates,
+    create_work_queue,
+    default_node_id,
+    ingest_updates,
 )
+from app.services.worker_pool import WorkerPool, restart_on_signal, serve_updates
+
+configure_logging(settings.log_level, settings.log_format, settings.log_sampling)
 logger = logging.getLogger(__name__)
 
 
 class PrincessSeleneBot:
-    """Owns the Telegram Application and wires up all handlers."""
+    """Owns the Telegram Application and wires up all handlers.
+
+    With a `pool`, this is the front process: every update is forwarded to
+    the pool's workers instead of being handled here. Workers build their
+    bot with `updater=False`, since updates reach them through the pool.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        pool: Optional[WorkerPool] = None,
+        updater: bool = True,
+        journal: Optional[UpdateJournal] = None,
+        work_queue: Optional[WorkQueue] = None,
+    ) -> None:
+        self.pool = pool
+        self.journal = journal
+        self.work_queue = work_queue
+        # Claimed work queue jobs, acknowledged as their updates finish.
+        self.jobs = JobTracker(work_queue) if work_queue is not None else None
+        builder = (
+            ApplicationBuilder()
+            .token(token)
+            .base_url(settings.telegram_api_url)
+            # PTB's own default pool size for Bot API calls.
+            .request(CountingRequest(connection_pool_size=256))
+        )
+        if not updater:
+            builder = builder.updater(None)
+
+        builder = builder.post_init(self._on_startup)
+        if pool is not None:
+            self.application = builder.build()
+            self.application.add_handler(TypeHandler(Update, self._forward_update))
+            logger.info("Front process initialized, forwarding updates to %d workers", pool.size)
+            return
 
-    def __init__(self, token: str) -> None:
-        self.application = ApplicationBuilder().token(token).build()
-        self.message_processor = MessageProcessor()
+        recorder = get_traffic_recorder()
+        on_finished = None
+        if journal is not None:
+            on_finished = journal.mark_done
+        elif self.jobs is not None:
+            on_finished = self.jobs.mark_done
+        self.update_processor = ChatOrderedUpdateProcessor(
+            max_running=settings.update_concurrency,
+            max_pending=settings.max_pending_updates,
+            on_finished=on_finished,
+            on_received=recorder.record if recorder is not None else None,
+            accepts=is_for_bot,
+            # The queue dedupes on publish, and a failed update it hands
+            # out again has to run again.
+            dedupe=self.jobs is None,
+        )
+        if journal is not None:
+            builder = builder.update_queue(JournaledUpdateQueue(journal))
+        self.application = builder.concurrent_updates(self.update_processor).build()
+        self.message_processor = MessageProcessor(self.update_processor)
+        self._register_metrics()
         self._register_handlers()
+        if self.jobs is not None:
+            self.application.add_error_handler(self._handler_failed)
         logger.info("Bot initialized successfully")
 
+    async def _on_startup(self, application: Application) -> None:
+        """PTB's post_init for run_polling; the other run modes call it
+        themselves once the application is initialized."""
+        start_loop_watchdog()
+        if self.journal is not None:
+            application.update_queue.replay(application.bot)
+
+    async def _handler_failed(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # Replaces PTB's own logging of handler errors once registered.
+        logger.error("Update %s failed", getattr(update, "update_id", None), exc_info=context.error)
+        self.jobs.mark_failed(update)
+
+    def _close_journal(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+
+    async def _forward_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.pool.forward(update)
+
+    def _start_pool(self) -> None:
+        if self.pool is None:
+            return
+        self.pool.start()
+        attach_worker_pool(self.pool)
+        signal.signal(signal.SIGHUP, restart_on_signal(self.pool))
+
+    def _stop_pool(self) -> None:
+        if self.pool is None:
+            return
+        attach_worker_pool(None)
+        self.pool.stop()
+
+    def _register_metrics(self) -> None:
+        processor = self.update_processor
+        REGISTRY.callback("selene_updates_running", "Updates executing handlers right now", lambda: processor.running)
+        REGISTRY.callback(
+            "selene_updates_pending",
+            "Updates holding a pending slot: one per chat with an update in progress, plus chat-less ones",
+            lambda: processor.current_concurrent_updates,
+        )
+        REGISTRY.callback("selene_active_chats", "Chats with an update in progress", lambda: processor.active_chats)
+        REGISTRY.callback("selene_updates_queued", "Updates waiting behind their chat's current one", lambda: processor.queued)
+        REGISTRY.callback(
+            "selene_duplicate_updates_dropped",
+            "Redelivered updates ignored",
+            lambda: processor.duplicates_dropped,
+            kind="counter",
+        )
+        REGISTRY.callback(
+            "selene_chat_queue_overflow_dropped",
+            "Updates dropped because their chat already had too many waiting",
+            lambda: processor.overflow_dropped,
+            kind="counter",
+        )
+        REGISTRY.callback(
+            "selene_updates_ignored",
+            "Updates no handler would take, finished on arrival",
+            lambda: processor.ignored,
+            kind="counter",
+        )
+        history = self.message_processor.history
+        REGISTRY.callback("selene_history_size", "Message history held in memory", history.size, ["unit"])
+
     def _register_handlers(self) -> None:
         self.application.add_handler(CommandHandler("start", start_command))
         self.application.add_handler(CommandHandler("help", help_command))
 
-        self.application.add_handler(
-            MessageHandler(filters.TEXT & filters.ChatType.GROUPS, self._group_message)
-        )
+        # Group noise is filtered out here; the update processor already
+        # turns most of it away before it is queued (is_for_bot, see
+        # app.handlers.filters).
+        self.application.add_handler(MessageHandler(GROUP_TEXT_FOR_BOT, self._group_message))
         self.application.add_handler(
             MessageHandler(filters.TEXT & filters.ChatType.PRIVATE, self._private_message)
         )
 
         if settings.stickers_enabled:
-            # DM/group reply-to-bot check is done inside sticker_handler
-            sticker_filter = filters.Sticker.ALL
-            self.application.add_handler(MessageHandler(sticker_filter, sticker_handler))
+            self.application.add_handler(MessageHandler(STICKER_FOR_BOT, sticker_handler))
 
         logger.info("Handlers registered successfully")
 
     async def _group_message(self, update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        if self.message_processor.should_respond_in_group(update, context):
-            await self.message_processor.process_message(update, context, "group")
+        # Only messages that passed GROUP_TEXT_FOR_BOT get here;
+        # process_message still ranks them (MessageProcessor.group_priority).
+        await self.message_processor.process_message(update, context, "group")
 
     async def _private_message(self, update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await self.message_processor.process_message(update, context, "private")
 
     def run_polling(self) -> None:
         logger.info("Starting Princess Selene Bot polling...")
+        self._start_pool()
         try:
-            self.application.run_polling(drop_pending_updates=True)
+            # With a journal, updates fetched but not confirmed before a
+            # restart are wanted; the journal filters out ones already seen.
+            self.application.run_polling(drop_pending_updates=self.journal is None)
         except Exception as exc:
             logger.error("Bot polling crashed: %s", exc)
             raise
+        finally:
+            self._stop_pool()
+            self._close_journal()
+
+    async def run_webhook(self) -> None:
+        """Serve the health API and the webhook route from one uvicorn
+        server, on the same event loop as the bot's Application."""
+        webhook_url = settings.webhook_url.rstrip("/") + WEBHOOK_PATH
+        server = uvicorn.Server(
+            uvicorn.Config(health_app, host="0.0.0.0", port=settings.health_port, log_level="info", access_log=True, log_config=None)
+        )
+
+        self._start_pool()
+        async with self.application:
+            await self._on_startup(self.application)
+            await self.application.start()
+            # Every replica registers the same URL, so this is idempotent
+            # when several instances sit behind a load balancer.
+            await self.application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=settings.webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=self.journal is None,
+            )
+            attach_telegram_application(self.application)
+            logger.info("Starting Princess Selene Bot webhook at %s...", webhook_url)
+            try:
+                await server.serve()
+            finally:
+                attach_telegram_application(None)
+                await self.application.stop()
+                self._stop_pool()
+                self._close_journal()
+
+    async def run_queue_node(self, node_id: str) -> None:
+        """Take part in the shared work queue: poll Telegram while holding
+        the leader lease, and handle queued updates all along."""
+        queue = self.work_queue
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        async with self.application:
+            await self._on_startup(self.application)
+            await self.application.start()
+            attach_work_queue(queue)
+            logger.info("Starting Princess Selene Bot as queue node %s...", node_id)
+            try:
+                await asyncio.gather(
+                    ingest_updates(self.application.bot, queue, node_id, stop),
+                    consume_updates(self.application, queue, self.jobs, node_id, settings.update_concurrency, stop),
+                )
+            finally:
+                attach_work_queue(None)
+                await self.application.stop()
+                queue.close()
+
+
+def run_worker(index: int, update_queue: Any, dequeued: Any) -> None:
+    """Entry point of one worker process (WORKERS > 1)."""
+    # Ctrl+C reaches the whole process group; the front decides when
+    # workers stop, and tells them through their queue.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Telegram's global flood limit is per bot, not per process.
+    configure_outbound_scheduler(global_rate=TELEGRAM_GLOBAL_MESSAGES_PER_SECOND / settings.workers)
+    bot = PrincessSeleneBot(settings.bot_token, updater=False)
+    logger.info("Worker %d ready", index)
+
+    async def serve() -> None:
+        await bot._on_startup(bot.application)
+        await serve_updates(bot.application, update_queue, dequeued)
+
+    asyncio.run(serve())
+
+
+def _probe_telegram() -> None:
+    started = time.monotonic()
+    response = requests.get(f"{settings.telegram_api_url}{settings.bot_token}/getMe", timeout=10)
+    get_health_registry().record(
+        TELEGRAM, response.ok, time.monotonic() - started, None if response.ok else f"HTTP {response.status_code}"
+    )
+
+
+def start_health_prober() -> None:
+    """Probe dependencies that see no traffic, so /health stays current."""
+    registry = get_health_registry()
+    translator = TranslationService()
+    registry.set_probe(AI, get_ai_client().health_check)
+    registry.set_probe(TRANSLATOR, lambda: translator.from_english("hello", "am"))
+    registry.set_probe(TELEGRAM, _probe_telegram)
+    registry.start_prober(settings.health_probe_idle_seconds)
 
 
 def run_health_api() -> None:
     logger.info("Starting health API server on port %s...", settings.health_port)
-    uvicorn.run(health_app, host="0.0.0.0", port=settings.health_port, log_level="info", access_log=True)
+    uvicorn.run(health_app, host="0.0.0.0", port=settings.health_port, log_level="info", access_log=True, log_config=None)
 
 
 def main() -> None:
     try:
         settings.validate()
+        start_health_prober()
+        pool = WorkerPool(settings.workers, run_worker) if settings.workers > 1 else None
+        journal = (
+            UpdateJournal(
+                settings.journal_path, settings.journal_max_age_seconds, settings.journal_fsync_interval_seconds
+            )
+            if settings.journal_path
+            else None
+        )
+
+        if settings.update_mode == "webhook":
+            bot = PrincessSeleneBot(settings.bot_token, pool=pool, journal=journal)
+            asyncio.run(bot.run_webhook())
+            return
 
         health_thread = threading.Thread(target=run_health_api, daemon=True)
         health_thread.start()
         logger.info("Health API started in background thread")
 
-        bot = PrincessSeleneBot(settings.bot_token)
+        if settings.work_queue:
+            queue = create_work_queue(
+                settings.work_queue,
+                settings.work_queue_url,
+                settings.work_queue_visibility_seconds,
+                settings.work_queue_max_attempts,
+            )
+            bot = PrincessSeleneBot(settings.bot_token, updater=False, work_queue=queue)
+            asyncio.run(bot.run_queue_node(settings.node_id or default_node_id()))
+            return
+
+        bot = PrincessSeleneBot(settings.bot_token, pool=pool, journal=journal)
         bot.run_polling()
 
     except KeyboardInterrupt:
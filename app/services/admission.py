@@ -0,0 +1,170 @@
+"""Bounded admission queue with priority-aware load shedding.
+
+Every message that earns a reply costs a history update, several
+translator calls, an AI call and a Telegram send. During a spike in a
+big group that work used to pile up without limit, and private chats -
+the people actually talking *to* the bot - waited behind all of it.
+
+`AdmissionController` sits in front of MessageProcessor's heavy path. At
+most `max_active` messages are processed at once; the rest wait in a
+queue ordered by priority, so a free slot always goes to the most
+important waiting message. When the queue grows past `max_queue`, or its
+oldest entry has waited longer than `max_wait_seconds`, queued work is
+shed lowest priority first: group keyword triggers, then group replies
+and mentions, and private chats only as a last resort.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Deque, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """How much a message matters when the bot is overloaded - higher wins."""
+
+    GROUP_KEYWORD = 0  # a trigger keyword showed up somewhere in a group
+    GROUP_REPLY = 1  # someone replied to or @mentioned the bot in a group
+    PRIVATE = 2  # a direct message
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    priority: Priority
+    enqueued_at: float
+
+
+class AdmissionController:
+    """Limits concurrent message processing and sheds queued work under load."""
+
+    def __init__(
+        self,
+        max_active: int = settings.admission_max_active,
+        max_queue: int = settings.admission_max_queue,
+        max_wait_seconds: float = settings.admission_max_wait_seconds,
+    ) -> None:
+        self._max_active = max_active
+        self._max_queue = max_queue
+        self._max_wait = max_wait_seconds
+        self._active = 0
+        self._queues: Dict[Priority, Deque[_Waiter]] = {priority: deque() for priority in Priority}
+        self.admitted_total = 0
+        self.shed_counts: Dict[Priority, int] = {priority: 0 for priority in Priority}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self, priority: Priority) -> bool:
+        """Wait for a processing slot. Returns False if the message was shed
+        instead; on True the caller must call `release()` when done."""
+        if self._active < self._max_active and not self.queued:
+            self._active += 1
+            self.admitted_total += 1
+            return True
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, time.monotonic())
+        self._queues[priority].append(waiter)
+        self._shed_overload()
+
+        try:
+            while not waiter.future.done():
+                # Wake up periodically so an over-age queue is shed even when
+                # nothing else is being admitted or released.
+                await asyncio.wait({waiter.future}, timeout=self._max_wait)
+                self._shed_overload()
+        except asyncio.CancelledError:
+            if waiter.future.done() and waiter.future.result():
+                self.release()
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            raise
+
+        return waiter.future.result()
+
+    def release(self) -> None:
+        self._active -= 1
+        self._shed_overload()
+        self._grant_next()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self._active,
+            "max_active": self._max_active,
+            "queued": {priority.name.lower(): len(queue) for priority, queue in self._queues.items()},
+            "admitted_total": self.admitted_total,
+            "shed": {priority.name.lower(): count for priority, count in self.shed_counts.items()},
+        }
+
+    def _grant_next(self) -> None:
+        while self._active < self._max_active:
+            waiter = self._pop_highest()
+            if waiter is None:
+                return
+            waiter.future.set_result(True)
+            self._active += 1
+            self.admitted_total += 1
+
+    def _shed_overload(self) -> None:
+        now = time.monotonic()
+        while True:
+            depth = self.queued
+            if not depth:
+                return
+            oldest = self._oldest_enqueued_at()
+            if depth <= self._max_queue and now - oldest <= self._max_wait:
+                return
+
+            victim = self._pop_lowest()
+            victim.future.set_result(False)
+            self.shed_counts[victim.priority] += 1
+            logger.info(
+                "Shedding %s message after %.1fs in queue (depth %d)",
+                victim.priority.name.lower(),
+                now - victim.enqueued_at,
+                depth,
+            )
+
+    def _oldest_enqueued_at(self) -> float:
+        return min(queue[0].enqueued_at for queue in self._queues.values() if queue)
+
+    def _pop_highest(self) -> Optional[_Waiter]:
+        for priority in sorted(Priority, reverse=True):
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        return None
+
+    def _pop_lowest(self) -> _Waiter:
+        for priority in sorted(Priority):
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        raise LookupError("admission queue is empty")
+
+    def _remove(self, waiter: _Waiter) -> None:
+        try:
+            self._queues[waiter.priority].remove(waiter)
+        except ValueError:
+            pass
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Return the process-wide singleton admission controller."""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
@@ -10,6 +10,13 @@ import requests
 from app.config import settings
 from app.core.constants import FALLBACK_REPLY
 from app.core.instruction import Instruction
+from app.services.call_accounting import count_upstream_call
+from app.services.deadline import Deadline
+from app.services.faults import inject_http
+from app.services.health import AI, get_health_registry
+from app.services.memory import get_memory_registry
+from app.services.metrics import AI_REQUESTS, AI_SECONDS
+from app.services.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +51,12 @@ class APIResponse:
     response_time: Optional[float] = None
 
 
+# Metric children per outcome (None = success), bound once up front.
+_OUTCOME_METRICS = {
+    error_type: (AI_REQUESTS.labels(outcome), AI_SECONDS.labels(outcome))
+    for error_type, outcome in [(None, "ok")] + [(t, t.value) for t in APIErrorType]
+}
+
 _RETRYABLE_ERRORS = {
     APIErrorType.NETWORK_ERROR,
     APIErrorType.TIMEOUT_ERROR,
@@ -65,6 +78,9 @@ class AIClient:
     def __init__(self, config: Optional[APIConfig] = None) -> None:
         self.config = config or APIConfig()
         self.session = self._create_session()
+        # Closing the session drops its pooled connections; it reconnects
+        # on the next request.
+        get_memory_registry().register("ai_http_pool", self._pool_stats, flush=self.session.close)
 
     def _create_session(self) -> requests.Session:
         session = requests.Session()
@@ -77,9 +93,21 @@ class AIClient:
         )
         return session
 
-    def get_response(self, user_message: str) -> str:
-        """Get an AI reply, falling back to a friendly stock message on failure."""
-        response = self._request_with_retry(user_message)
+    def _pool_stats(self) -> Dict[str, int]:
+        pools = [
+            pool
+            for adapter in self.session.adapters.values()
+            for pool in (adapter.poolmanager.pools.values() if hasattr(adapter, "poolmanager") else ())
+        ]
+        return {"hosts": len(pools), "idle_connections": sum(pool.pool.qsize() for pool in pools if pool.pool)}
+
+    def get_response(self, user_message: str, deadline: Optional[Deadline] = None) -> str:
+        """Get an AI reply, falling back to a friendly stock message on failure.
+
+        With a `deadline`, each attempt's timeout is shortened to the time
+        left, and no retry is attempted once its backoff wouldn't fit.
+        """
+        response = self._request_with_retry(user_message, deadline)
         if response.success:
             logger.info("API request successful in %.2fs", response.response_time or 0.0)
             return response.content
@@ -93,15 +121,23 @@ class AIClient:
         except Exception:
             return False
 
-    def _request_with_retry(self, user_message: str) -> APIResponse:
+    def _request_with_retry(self, user_message: str, deadline: Optional[Deadline] = None) -> APIResponse:
         last_response: Optional[APIResponse] = None
 
         for attempt in range(self.config.max_retries):
-            try:
-                response = self._make_single_request(user_message)
-            except Exception as exc:
-                logger.error("Unexpected error during API request: %s", exc)
-                response = APIResponse(success=False, content="", error_type=APIErrorType.UNKNOWN_ERROR)
+            timeout = self.config.timeout if deadline is None else deadline.clamp(self.config.timeout)
+            if timeout <= 0:
+                logger.warning("Out of time budget before API attempt %d, giving up", attempt + 1)
+                break
+
+            with span("ai.attempt", attempt=attempt + 1, timeout=round(timeout, 1)) as attempt_span:
+                try:
+                    response = self._make_single_request(user_message, timeout)
+                except Exception as exc:
+                    logger.error("Unexpected error during API request: %s", exc)
+                    response = APIResponse(success=False, content="", error_type=APIErrorType.UNKNOWN_ERROR)
+                if response.error_type is not None:
+                    attempt_span.set(error=response.error_type.value)
 
             if response.success or response.error_type not in _RETRYABLE_ERRORS:
                 return response
@@ -109,18 +145,37 @@ class AIClient:
             last_response = response
             if attempt < self.config.max_retries - 1:
                 delay = self.config.retry_delay * (2 ** attempt)
+                if deadline is not None and delay >= deadline.remaining():
+                    logger.warning("Not retrying API request: %.1fs backoff exceeds the remaining time budget", delay)
+                    break
                 logger.warning("Retrying API request in %.1fs (attempt %d)", delay, attempt + 1)
-                time.sleep(delay)
-
-        return last_response or APIResponse(success=False, content="", error_type=APIErrorType.UNKNOWN_ERROR)
+                with span("ai.backoff", seconds=delay):
+                    time.sleep(delay)
+
+        return last_response or APIResponse(success=False, content="", error_type=APIErrorType.TIMEOUT_ERROR)
+
+    def _make_single_request(self, user_message: str, timeout: Optional[float] = None) -> APIResponse:
+        response = self._send_request(user_message, timeout)
+        requests_total, seconds = _OUTCOME_METRICS[None if response.success else response.error_type]
+        requests_total.inc()
+        seconds.observe(response.response_time or 0.0)
+        get_health_registry().record(
+            AI,
+            response.success,
+            response.response_time or 0.0,
+            response.error_type.value if response.error_type else None,
+        )
+        return response
 
-    def _make_single_request(self, user_message: str) -> APIResponse:
+    def _send_request(self, user_message: str, timeout: Optional[float]) -> APIResponse:
         start = time.time()
         url = f"{self.config.base_url}{self.config.model}"
         payload = self._build_payload(user_message)
+        count_upstream_call(AI)
 
         try:
-            response = self.session.post(url, json=payload, timeout=self.config.timeout)
+            timeout = timeout or self.config.timeout
+            response = inject_http(AI, lambda: self.session.post(url, json=payload, timeout=timeout), timeout)
             return self._process_response(response, time.time() - start)
         except requests.exceptions.Timeout:
             return APIResponse(success=False, content="", error_type=APIErrorType.TIMEOUT_ERROR, response_time=time.time() - start)
@@ -0,0 +1,120 @@
+"""Per-update accounting of upstream calls.
+
+Every AI attempt and translator call costs quota, and every Bot API call
+counts against Telegram's limits, yet how many of them one message
+causes depends on its language, the history length, how many pet names
+split it into chunks, retries, and whether it got a reaction or a
+sticker. Nothing counted that per message.
+
+`track_upstream_calls()` opens an account for the update being handled
+(the dispatcher does this for every update) and keeps it in a context
+variable, so it follows the update into its pipeline tasks, worker
+threads and queued Telegram sends. The clients count themselves against
+whatever account is current:
+
+- ai: each completion attempt, retries included (app.services.ai_client)
+- translator: each chunk sent to the translator (app.services.translator)
+- telegram: each Bot API call except getStickerSet, which is counted as
+  sticker_set (`CountingRequest`, the bot's HTTP transport)
+
+The counts ride along in the update's log context (`calls=ai:1,...` on
+every line, and a summary when the update is done) and go to the
+`selene_upstream_calls_per_update` histogram. Tests can open an account
+themselves to assert a call budget:
+
+    with track_upstream_calls() as calls:
+        await processor.process_message(...)
+    assert calls[AI] <= 1 and calls[TRANSLATOR] == 0
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from app.logging_config import add_log_context
+from app.services.faults import FaultInjectingRequest
+from app.services.health import AI, TELEGRAM, TRANSLATOR
+from app.services.metrics import UPSTREAM_CALLS_PER_UPDATE
+
+logger = logging.getLogger(__name__)
+
+STICKER_SET = "sticker_set"
+DEPENDENCIES = (AI, TRANSLATOR, TELEGRAM, STICKER_SET)
+
+# Metric children per dependency, bound once up front.
+_PER_UPDATE = {dependency: UPSTREAM_CALLS_PER_UPDATE.labels(dependency) for dependency in DEPENDENCIES}
+
+
+class UpstreamCalls:
+    """Call counts for one update. Shared by its tasks and threads."""
+
+    def __init__(self) -> None:
+        # Kept in the log context as is, so log lines show the counts so far.
+        self.counts: Dict[str, int] = {}
+        self.open = True
+        self._lock = threading.Lock()
+
+    def add(self, dependency: str) -> None:
+        with self._lock:
+            self.counts[dependency] = self.counts.get(dependency, 0) + 1
+
+    def __getitem__(self, dependency: str) -> int:
+        return self.counts.get(dependency, 0)
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return sum(self.counts.values())
+
+
+_current: ContextVar[Optional[UpstreamCalls]] = ContextVar("selene_upstream_calls", default=None)
+
+
+def count_upstream_call(dependency: str) -> None:
+    """Count one call to `dependency` against the current update, if any."""
+    calls = _current.get()
+    if calls is not None:
+        calls.add(dependency)
+
+
+@contextmanager
+def track_upstream_calls() -> Iterator[UpstreamCalls]:
+    """Open an account for the calls made inside, or carry on with the
+    current one if it's still open. A debounced turn runs after the
+    update that started it has finished, so it gets an account of its
+    own. Only the block that opened an account reports it."""
+    current = _current.get()
+    if current is not None and current.open:
+        yield current
+        return
+
+    calls = UpstreamCalls()
+    token = _current.set(calls)
+    add_log_context(calls=calls.counts)
+    try:
+        yield calls
+    finally:
+        calls.open = False
+        _current.reset(token)
+        _report(calls)
+
+
+def _report(calls: UpstreamCalls) -> None:
+    # Updates the bot ignored made no calls and would only bury the rest.
+    if not calls.total:
+        return
+    for dependency, child in _PER_UPDATE.items():
+        child.observe(calls[dependency])
+    # The breakdown is in the log context, still attached here.
+    logger.info("Update made %d upstream call(s)", calls.total)
+
+
+class CountingRequest(FaultInjectingRequest):
+    """The bot's HTTP transport for Bot API calls: counts each call
+    against the current update, then sends it (or injects a fault)."""
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        count_upstream_call(STICKER_SET if endpoint == "getStickerSet" else TELEGRAM)
+        return await super().do_request(url, method, *args, **kwargs)
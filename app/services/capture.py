@@ -0,0 +1,249 @@
+"""Opt-in recording of real traffic, anonymized, for replaying later.
+
+Synthetic load (loadtest/) never quite matches real chats: the bursts,
+the language mix, how often pet names and trigger words come up. With
+CAPTURE_PATH set, every incoming message update is appended to a gzipped
+JSON-lines file together with its arrival time, so a real stretch of
+traffic can be fed back into the bot against local stand-ins
+(`python -m loadtest.replay`) before and after a change.
+
+What is kept and what isn't:
+
+- Only the fields the bot looks at are written: ids, chat type, text and
+  its entities, sticker, reply-to, sender language. Names, titles,
+  photos, forwards and everything else are dropped.
+- User and chat ids are replaced by an HMAC of the id keyed with
+  CAPTURE_SALT, so one person is the same id across the capture but can't
+  be looked up. Bots' ids are kept - replies to the bot must still be
+  replies to the bot. Without a salt a random one is used, so ids only
+  line up within one process's capture.
+- With CAPTURE_REDACT_TEXT, every letter is masked (x/X for most
+  scripts, ሀ for Ge'ez) and every digit becomes 0, except trigger words,
+  pet names and mentions of the bot, which decide how a message is
+  handled. Lengths, spacing, punctuation and emoji survive, so message
+  shape and entity offsets do; the words - and with them what language
+  detection makes of Latin-script text - don't.
+
+Recording only appends to an in-memory buffer; a background thread
+compresses and writes it every CAPTURE_FLUSH_SECONDS, like the update
+journal. Each flush is a gzip sync point, so a capture cut short by a
+crash still reads up to its last flush.
+"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from telegram import Update
+
+from app.config import settings
+from app.core.constants import CAPTURE_BUFFER_MAX, CAPTURE_FLUSH_SECONDS
+from app.handlers.filters import get_trigger_matchers
+from app.services.memory import get_memory_registry
+from app.services.pet_name_guard import PetNameGuard
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_FORMAT = 1
+
+_STICKER_FIELDS = ("file_id", "file_unique_id", "type", "width", "height", "is_animated", "is_video", "set_name", "emoji")
+_GEEZ = re.compile(r"[ሀ-፿]")
+
+
+class Anonymizer:
+    """Turns a message dict (Message.to_dict()) into its anonymized form."""
+
+    def __init__(self, salt: bytes, redact_text: bool = False) -> None:
+        self._salt = salt
+        self.redact_text = redact_text
+        self._pet_guard = PetNameGuard()
+
+    def user_id(self, user_id: int) -> int:
+        digest = hmac.new(self._salt, str(user_id).encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:6], "big") or 1
+
+    def chat_id(self, chat_id: int) -> int:
+        # Private chats share the user's id, and group ids stay negative
+        # with Telegram's -100 prefix.
+        if chat_id > 0:
+            return self.user_id(chat_id)
+        return -(10**12 + self.user_id(-chat_id) % 10**12)
+
+    def message(self, message: Dict[str, Any], bot_username: Optional[str] = None) -> Dict[str, Any]:
+        chat = message["chat"]
+        anonymized: Dict[str, Any] = {
+            "message_id": message["message_id"],
+            "date": message["date"],
+            "chat": {"id": self.chat_id(chat["id"]), "type": chat["type"]},
+        }
+        if "from" in message:
+            anonymized["from"] = self._user(message["from"])
+        if "text" in message:
+            text = message["text"]
+            anonymized["text"] = self.redact(text, chat["id"], bot_username) if self.redact_text else text
+        if "entities" in message:
+            anonymized["entities"] = [
+                {key: entity[key] for key in ("type", "offset", "length")} for entity in message["entities"]
+            ]
+        if "sticker" in message:
+            anonymized["sticker"] = {key: message["sticker"][key] for key in _STICKER_FIELDS if key in message["sticker"]}
+        if "reply_to_message" in message:
+            anonymized["reply_to_message"] = self.message(message["reply_to_message"], bot_username)
+        return anonymized
+
+    def _user(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        if user.get("is_bot"):
+            return {key: user[key] for key in ("id", "is_bot", "first_name", "username") if key in user}
+        user_id = self.user_id(user["id"])
+        anonymized = {"id": user_id, "is_bot": False, "first_name": f"user{user_id:x}"[:10]}
+        if "username" in user:
+            anonymized["username"] = f"u{user_id:x}"
+        if "language_code" in user:
+            anonymized["language_code"] = user["language_code"]
+        return anonymized
+
+    def redact(self, text: str, chat_id: int, bot_username: Optional[str] = None) -> str:
+        """Mask `text` letter by letter, keeping trigger words, pet names
+        and @mentions of the bot. Every character keeps its UTF-16 width,
+        so entity offsets stay valid."""
+        kept = bytearray(len(text))
+        spans = get_trigger_matchers().for_chat(chat_id).spans(text) + self._pet_guard.spans(text)
+        if bot_username:
+            mention = f"@{bot_username}".lower()
+            spans += [(m.start(), m.end()) for m in re.finditer(re.escape(mention), text.lower())]
+        for start, end in spans:
+            kept[start:end] = b"\x01" * (end - start)
+        return "".join(char if kept[i] else _mask(char) for i, char in enumerate(text))
+
+
+def _mask(char: str) -> str:
+    if char.isdigit():
+        return "0"
+    if not char.isalpha():
+        return char
+    if _GEEZ.match(char):
+        return "ሀ"
+    masked = "X" if char.isupper() else "x"
+    # Astral-plane letters are two UTF-16 units wide.
+    return masked * 2 if ord(char) > 0xFFFF else masked
+
+
+class TrafficRecorder:
+    """Anonymizes incoming message updates and appends them to a gzipped
+    JSON-lines capture."""
+
+    def __init__(
+        self, path: str, salt: str = "", redact_text: bool = False, flush_interval: float = CAPTURE_FLUSH_SECONDS
+    ) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.anonymizer = Anonymizer(salt.encode() or os.urandom(16), redact_text)
+        self.recorded = 0
+        self.dropped = 0
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Appending starts a new gzip member; readers see one stream.
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        header = {"capture": CAPTURE_FORMAT, "started": time.time(), "redacted": redact_text}
+        self._buffer.append(json.dumps(header))
+        self._writer = threading.Thread(target=self._flush_loop, name="capture-writer", daemon=True)
+        self._writer.start()
+        get_memory_registry().register("traffic_capture", lambda: {"buffered": len(self._buffer)}, root=lambda: self._buffer)
+        logger.info("Capturing traffic to %s (text %s)", path, "redacted" if redact_text else "kept")
+
+    def record(self, update: object) -> None:
+        """Buffer `update` if it carries a message. Never raises."""
+        if not isinstance(update, Update) or update.message is None:
+            return
+        try:
+            bot_username = update.get_bot().username
+        except RuntimeError:
+            bot_username = None
+        try:
+            message = self.anonymizer.message(update.message.to_dict(), bot_username)
+        except Exception as exc:
+            logger.debug("Not capturing update %s: %s", update.update_id, exc)
+            return
+        line = json.dumps({"t": time.time(), "update_id": update.update_id, "message": message}, ensure_ascii=False)
+        with self._lock:
+            if len(self._buffer) >= CAPTURE_BUFFER_MAX:
+                self.dropped += 1
+                return
+            self._buffer.append(line)
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"recorded": self.recorded, "dropped": self.dropped, "buffered": len(self._buffer)}
+
+    def close(self) -> None:
+        self._stopping.set()
+        self._writer.join()
+        self._flush()
+        self._file.close()
+
+    def _flush_loop(self) -> None:
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self._flush()
+            except OSError as exc:
+                logger.error("Could not write traffic capture: %s", exc)
+
+    def _flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+
+
+def read_capture(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """(header, records) of a capture. The records iterator stops quietly
+    at a truncated end, as left by a crash."""
+    stream = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(stream.readline())
+    if header.get("capture") != CAPTURE_FORMAT:
+        stream.close()
+        raise ValueError(f"{path} is not a traffic capture")
+
+    def records() -> Iterator[Dict[str, Any]]:
+        with stream:
+            try:
+                for line in stream:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    # A later process appending to the same file starts
+                    # with its own header.
+                    if "capture" not in record:
+                        yield record
+            except (EOFError, OSError, json.JSONDecodeError):
+                return
+
+    return header, records()
+
+
+_recorder: Optional[TrafficRecorder] = None
+
+
+def get_traffic_recorder() -> Optional[TrafficRecorder]:
+    """Return the process-wide recorder, or None if CAPTURE_PATH is
+    unset."""
+    global _recorder
+    if _recorder is None and settings.capture_path:
+        _recorder = TrafficRecorder(settings.capture_path, settings.capture_salt, settings.capture_redact_text)
+        # Write out the last buffered records on the way out.
+        atexit.register(_recorder.close)
+    return _recorder
@@ -0,0 +1,44 @@
+"""Per-update time budget, passed down to every upstream call.
+
+A reply that shows up two minutes after the message is worthless in a
+chat, yet nothing used to bound the total time spent on one: translation
+had no timeout at all and the AI client alone could spend 90+ seconds
+across its retries.
+
+A `Deadline` starts when an update reaches the dispatcher (waiting
+behind the chat's earlier updates counts) and travels with it. Each
+stage clamps its own timeout to what's left (`clamp`), the AI client
+stops retrying once its backoff wouldn't fit, the translator stops
+sending chunks once time is up, and the pipeline skips straight to each
+stage's fallback when the budget is already spent.
+"""
+import time
+from typing import Optional
+
+
+class Deadline:
+    """A point in (monotonic) time by which an update should be answered."""
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, expires_at: float) -> None:
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float, start: Optional[float] = None) -> "Deadline":
+        """`seconds` from `start` (a time.monotonic() value), default now."""
+        return cls((time.monotonic() if start is None else start) + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def clamp(self, timeout: Optional[float]) -> float:
+        """Shorten `timeout` (None = unbounded) to fit the remaining budget."""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s)"
@@ -0,0 +1,70 @@
+"""Per-key debounce that merges rapid-fire items into one batch.
+
+People rarely send one tidy message - it's "hey" / "babe" / "you there?"
+in three quick bursts. Answering each of those separately costs three
+history updates, several translator calls and three AI calls, and the
+user gets three replies to what was really one thought.
+
+`Debouncer` collects items per key (the processor uses chat + user) and
+only runs the callback once the key has been quiet for `window_seconds`.
+A new item arriving within the window restarts it, so the run that
+finally happens carries every item collected so far.
+
+Once the window has passed the batch is closed: the callback is never
+cancelled, and items arriving while it runs start a new batch. Cancelling
+a run that had already started would throw away translator and AI calls
+still running in worker threads - merging must only ever save calls.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Batch(Generic[T]):
+    """Items collected for one key, in arrival order."""
+
+    items: List[T] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+
+class Debouncer(Generic[T]):
+    """Runs `callback(batch)` once a key has been quiet for `window_seconds`."""
+
+    def __init__(self, window_seconds: float, callback: Callable[[Batch[T]], Awaitable[None]]) -> None:
+        self._window = window_seconds
+        self._callback = callback
+        # Only batches still inside their quiet window.
+        self._batches: Dict[Hashable, Batch[T]] = {}
+        self.merged_total = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._batches)
+
+    def submit(self, key: Hashable, item: T) -> None:
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = Batch()
+            self._batches[key] = batch
+        else:
+            # Still sleeping out its window: nothing has been done yet.
+            batch.task.cancel()
+            self.merged_total += 1
+
+        batch.items.append(item)
+        batch.task = asyncio.get_running_loop().create_task(self._run(key, batch))
+
+    async def _run(self, key: Hashable, batch: Batch[T]) -> None:
+        await asyncio.sleep(self._window)
+        # Closed from here on, with no await in between.
+        del self._batches[key]
+        try:
+            await self._callback(batch)
+        except Exception:
+            logger.exception("Debounced callback failed")
@@ -0,0 +1,304 @@
+"""Per-chat ordered, cross-chat concurrent update processing.
+
+THE PROBLEM
+-----------
+MessageProcessor used to remember a single process-wide `_last_update_id`
+and drop anything at or below it. That only works while updates are
+handled strictly one at a time: the moment two chats are processed
+concurrently, whichever finishes second looks "old" and is silently
+thrown away. So the bot had to stay serial, and one slow AI call in one
+chat held up everybody else.
+
+THE FIX
+-------
+`ChatOrderedUpdateProcessor` plugs into python-telegram-bot's own
+concurrency hook (`ApplicationBuilder.concurrent_updates`). Updates from
+different chats run in parallel, up to `max_running` at once. Updates
+from the *same* chat are chained behind each other, so a chat never sees
+replies out of order. Duplicates are suppressed by exact update id, using
+a bounded window of recently seen ids, rather than by "is this id bigger
+than the last one".
+
+An update that has to wait for an earlier update in its own chat is
+parked in that chat's queue and its call returns, so it holds neither one
+of the `max_running` slots nor one of PTB's `max_pending` ones; the task
+handling the chat's current update works through the queue afterwards.
+Each busy chat therefore takes one pending slot however much it has
+queued, and can't starve the others by piling up behind itself. A chat
+with more than UPDATE_CHAT_QUEUE_MAX updates waiting has the newer ones
+dropped.
+
+The time each update arrived is available to its handlers through
+`update_received_at()`, so time spent waiting here counts against the
+update's deadline (app.services.deadline).
+
+Updates no handler would take (most of a big group's chatter) are
+finished on arrival, before they are chained behind their chat, so they
+never hold up the chat's real work. They are still deduplicated and
+passed to `on_received`, so a traffic capture keeps them.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, NamedTuple, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from app.core.constants import UPDATE_CHAT_QUEUE_MAX, UPDATE_DEDUPE_WINDOW
+from app.logging_config import log_context
+from app.services.call_accounting import track_upstream_calls
+from app.services.memory import get_memory_registry
+
+logger = logging.getLogger(__name__)
+
+_received_at: ContextVar[Optional[float]] = ContextVar("selene_update_received_at", default=None)
+
+
+def update_received_at() -> Optional[float]:
+    """When (time.monotonic()) the update being handled reached the
+    dispatcher, or None outside of one."""
+    return _received_at.get()
+
+
+class RecentUpdateIds:
+    """Bounded set of recently seen update ids, oldest evicted first."""
+
+    def __init__(self, capacity: int = UPDATE_DEDUPE_WINDOW) -> None:
+        self._capacity = capacity
+        self._ids: "OrderedDict[int, None]" = OrderedDict()
+
+    def add(self, update_id: int) -> bool:
+        """Record `update_id`. Returns False if it was already seen."""
+        if update_id in self._ids:
+            return False
+        self._ids[update_id] = None
+        if len(self._ids) > self._capacity:
+            self._ids.popitem(last=False)
+        return True
+
+    def __contains__(self, update_id: object) -> bool:
+        return update_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def store(self) -> "OrderedDict[int, None]":
+        """The underlying id store, for memory accounting only."""
+        return self._ids
+
+
+def _chat_key(update: object) -> Optional[int]:
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+
+class _Job(NamedTuple):
+    update: object
+    coroutine: Awaitable[Any]
+    finish: bool  # report the update finished once done
+    received_at: float
+
+
+def _discard(coroutine: Awaitable[Any]) -> None:
+    # PTB hands us an already-created coroutine; closing it avoids the
+    # "coroutine was never awaited" warning for updates we choose not to run.
+    if inspect.iscoroutine(coroutine):
+        coroutine.close()
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates from different chats concurrently while keeping each
+    chat's updates strictly in arrival order.
+
+    `max_pending` is the cap PTB itself enforces: chats with an update in
+    progress, plus updates without a chat. Updates queued behind their
+    chat don't count against it. `max_running` is how many may actually
+    be executing handlers at the same time, and `max_queued_per_chat` how
+    many may wait behind one chat's current update.
+    `on_finished(update)` is called once an update's handlers have run
+    (not if it was cancelled first), or when it is dropped from a full
+    chat queue or not accepted - the update journal uses it.
+    `on_received(update)` is called as each new (non-duplicate) update
+    arrives, whether or not any handler takes it, before it waits for its
+    chat - the traffic recorder uses it.
+    `accepts(update)` is a cheap check that the update may concern some
+    handler; those it rejects are finished straight away without running.
+    With `dedupe` off, repeated update ids run again - for the work queue,
+    which dedupes when publishing and redelivers updates that failed.
+    """
+
+    def __init__(
+        self,
+        max_running: int,
+        max_pending: Optional[int] = None,
+        on_finished: Optional[Callable[[object], None]] = None,
+        on_received: Optional[Callable[[object], None]] = None,
+        max_queued_per_chat: int = UPDATE_CHAT_QUEUE_MAX,
+        accepts: Optional[Callable[[object], bool]] = None,
+        dedupe: bool = True,
+    ) -> None:
+        super().__init__(max_pending or max_running)
+        if max_running < 1:
+            raise ValueError("max_running must be a positive integer")
+        self._max_running = max_running
+        self._on_finished = on_finished
+        self._on_received = on_received
+        self._max_queued_per_chat = max_queued_per_chat
+        self._accepts = accepts
+        self._dedupe = dedupe
+        self._running: Optional[asyncio.Semaphore] = None
+        # chat_id -> updates waiting behind the one in progress; a chat is
+        # present while it has an update in progress.
+        self._chat_queues: Dict[int, Deque[_Job]] = {}
+        self._seen = RecentUpdateIds()
+        self.duplicates_dropped = 0
+        self.overflow_dropped = 0
+        self.ignored = 0
+        self.running = 0  # updates executing handlers right now
+        get_memory_registry().register(
+            "update_dispatcher",
+            lambda: {"recent_update_ids": len(self._seen), "chats": len(self._chat_queues)},
+            root=lambda: (self._seen.store(), self._chat_queues),
+        )
+
+    @property
+    def max_running(self) -> int:
+        return self._max_running
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chat_queues)
+
+    @property
+    def queued(self) -> int:
+        """Updates waiting behind their chat's current one."""
+        return sum(len(waiting) for waiting in self._chat_queues.values())
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self._max_running)
+
+    async def shutdown(self) -> None:
+        for waiting in self._chat_queues.values():
+            for job in waiting:
+                _discard(job.coroutine)
+            waiting.clear()
+        self._chat_queues.clear()
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # Stamped before PTB's pending slot is waited for: from here on
+        # the update's deadline is running.
+        _received_at.set(time.monotonic())
+        await super().process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        update_id = getattr(update, "update_id", None)
+        if self._dedupe and update_id is not None and not self._seen.add(update_id):
+            self.duplicates_dropped += 1
+            logger.info("Dropping duplicate update %s", update_id)
+            _discard(coroutine)
+            return
+        # Before the relevance check: a capture of real traffic needs the
+        # chatter the bot ignores too.
+        if self._on_received is not None:
+            self._on_received(update)
+
+        if self._accepts is not None and not self._accepts(update):
+            self.ignored += 1
+            _discard(coroutine)
+            self._finished(update)
+            return
+
+        if self._running is None:
+            await self.initialize()
+
+        await self._dispatch(_Job(update, coroutine, True, _received_at.get() or time.monotonic()))
+
+    async def run_in_chat(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Run `coroutine` - work on behalf of `update` that outlives its
+        handler, like a debounced turn - in order with the rest of the
+        update's chat and within `max_running`. The update isn't checked
+        for duplicates, reported or finished again."""
+        if self._running is None:
+            await self.initialize()
+        await self._dispatch(_Job(update, coroutine, False, _received_at.get() or time.monotonic()))
+
+    async def _dispatch(self, job: _Job) -> None:
+        update = job.update
+        chat_id = _chat_key(update)
+        if chat_id is None:
+            await self._run_next(job)
+            return
+
+        # Queue up *before* the first await, so arrival order is exactly
+        # the order PTB handed updates to us.
+        waiting = self._chat_queues.get(chat_id)
+        if waiting is not None:
+            if len(waiting) >= self._max_queued_per_chat:
+                self.overflow_dropped += 1
+                logger.warning(
+                    "Chat %s has %d updates waiting, dropping update %s",
+                    chat_id,
+                    len(waiting),
+                    getattr(update, "update_id", None),
+                )
+                _discard(job.coroutine)
+                if job.finish:
+                    self._finished(update)
+                return
+            # The task handling this chat's current update runs it next;
+            # returning gives PTB's pending slot back meanwhile.
+            waiting.append(job)
+            return
+
+        waiting = self._chat_queues[chat_id] = deque()
+        try:
+            await self._run_next(job)
+            while waiting:
+                await self._run_next(waiting.popleft())
+        finally:
+            # Only left non-empty if we were cancelled; those updates stay
+            # unfinished (so the journal replays them).
+            for queued in waiting:
+                _discard(queued.coroutine)
+            del self._chat_queues[chat_id]
+
+    async def _run_next(self, job: _Job) -> None:
+        started = False
+        try:
+            async with self._running:
+                started = True
+                await self._run(job)
+        except Exception:
+            # PTB reports handler errors itself; this only keeps one broken
+            # update from stranding the rest of its chat's queue.
+            logger.exception("Update %s failed", getattr(job.update, "update_id", None))
+            return
+        finally:
+            if not started:
+                _discard(job.coroutine)
+        if job.finish:
+            self._finished(job.update)
+
+    async def _run(self, job: _Job) -> None:
+        update = job.update
+        self.running += 1
+        # Queued jobs run in the task of their chat's first update.
+        token = _received_at.set(job.received_at)
+        try:
+            with log_context(update_id=getattr(update, "update_id", None), chat_id=_chat_key(update)):
+                with track_upstream_calls():
+                    await job.coroutine
+        finally:
+            _received_at.reset(token)
+            self.running -= 1
+
+    def _finished(self, update: object) -> None:
+        if self._on_finished is None:
+            return
+        try:
+            self._on_finished(update)
+        except Exception as exc:
+            logger.error("on_finished hook failed for update %s: %s", getattr(update, "update_id", None), exc)
@@ -0,0 +1,227 @@
+"""Weighted fair scheduling of AI and translation calls across chats.
+
+Every answered message makes several blocking upstream calls (translator
+chunks, the AI completion, the back-translation), each run in a worker
+thread. Without a scheduler those calls are served in whatever order they
+happen to be made, so one very active group - or a user hammering the bot
+from several chats - can hold every slot while everyone else queues.
+
+`FairScheduler` hands out a fixed number of call slots using deficit
+round-robin (DRR). Each chat is a flow; active flows are visited in turn,
+and on each visit a flow earns credit equal to its weight, spending one
+credit per call. Private chats get a larger weight than groups, so under
+contention a DM gets proportionally more calls through. On top of that a
+per-user cap stops any single person from occupying more than
+`per_user_limit` slots at once, whichever chats their calls come from.
+
+Wait times are tracked so starvation shows up in the stats rather than in
+user complaints: any call that waited longer than `starvation_seconds`
+for a slot is counted as starved.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+from app.config import settings
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class FlowKey:
+    """Who a call is made on behalf of: the chat it belongs to (the unit
+    of fairness), the user behind it (for the per-user cap), and the
+    chat's scheduling weight."""
+
+    chat_id: Hashable
+    user_id: Hashable
+    weight: float = 1.0
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    user_id: Hashable
+    enqueued_at: float
+
+
+@dataclass
+class _Flow:
+    weight: float
+    queue: Deque[_Waiter] = field(default_factory=deque)
+    deficit: float = 0.0
+
+
+class FairScheduler:
+    """Deficit round-robin over chats, with a per-user concurrency cap."""
+
+    def __init__(
+        self,
+        capacity: int = settings.fair_capacity,
+        per_user_limit: int = settings.fair_per_user_limit,
+        starvation_seconds: float = settings.fair_starvation_seconds,
+    ) -> None:
+        self._capacity = capacity
+        self._per_user_limit = per_user_limit
+        self._starvation_seconds = starvation_seconds
+        self._in_service = 0
+        self._per_user: Dict[Hashable, int] = {}
+        self._flows: Dict[Hashable, _Flow] = {}
+        # Round-robin order of flows that have queued calls.
+        self._active: "OrderedDict[Hashable, None]" = OrderedDict()
+
+        self.granted_total = 0
+        self.starved_total = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def in_service(self) -> int:
+        return self._in_service
+
+    @property
+    def queued(self) -> int:
+        return sum(len(flow.queue) for flow in self._flows.values())
+
+    async def run(self, flow: FlowKey, func: Callable[..., R], *args: Any) -> R:
+        """Run blocking `func(*args)` in a worker thread once `flow` gets a slot."""
+        with span("slot_wait"):
+            await self.acquire(flow)
+        try:
+            # As asyncio.to_thread does, so the call keeps the caller's context.
+            call = functools.partial(contextvars.copy_context().run, func, *args)
+            future = asyncio.get_running_loop().run_in_executor(None, call)
+        except BaseException:
+            self.release(flow)
+            raise
+        # A thread can't be stopped, so the slot is held until the call
+        # itself returns, even if the caller has given up on it (timeout or
+        # cancellation) - otherwise abandoned calls pile up past `capacity`.
+        future.add_done_callback(lambda _: self.release(flow))
+        return await asyncio.shield(future)
+
+    async def acquire(self, flow: FlowKey) -> None:
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), flow.user_id, time.monotonic())
+        state = self._flows.get(flow.chat_id)
+        if state is None:
+            state = self._flows[flow.chat_id] = _Flow(flow.weight)
+        state.weight = flow.weight
+        state.queue.append(waiter)
+        self._active[flow.chat_id] = None
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(flow)
+            else:
+                self._remove(flow.chat_id, waiter)
+            raise
+
+    def release(self, flow: FlowKey) -> None:
+        self._in_service -= 1
+        remaining = self._per_user.get(flow.user_id, 0) - 1
+        if remaining > 0:
+            self._per_user[flow.user_id] = remaining
+        else:
+            self._per_user.pop(flow.user_id, None)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "in_service": self._in_service,
+            "capacity": self._capacity,
+            "queued": self.queued,
+            "active_flows": len(self._active),
+            "granted_total": self.granted_total,
+            "starved_total": self.starved_total,
+            "avg_wait_seconds": round(self.wait_seconds_total / self.granted_total, 4) if self.granted_total else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+        }
+
+    def _dispatch(self) -> None:
+        # Flows visited in a row without granting anything; once every
+        # active flow has been skipped, all remaining work is blocked by
+        # per-user caps and has to wait for a release.
+        blocked_visits = 0
+        while self._in_service < self._capacity and self._active:
+            if blocked_visits >= len(self._active):
+                return
+
+            chat_id = next(iter(self._active))
+            flow = self._flows[chat_id]
+            waiter = self._next_eligible(flow)
+            if waiter is None:
+                self._active.move_to_end(chat_id)
+                blocked_visits += 1
+                continue
+
+            if flow.deficit < 1:
+                flow.deficit += flow.weight
+                if flow.deficit < 1:
+                    # Weight below one: needs several rounds to earn a call.
+                    self._active.move_to_end(chat_id)
+                    continue
+
+            flow.queue.remove(waiter)
+            flow.deficit -= 1
+            self._grant(waiter)
+            blocked_visits = 0
+
+            if not flow.queue:
+                del self._active[chat_id]
+                del self._flows[chat_id]
+            elif flow.deficit < 1:
+                self._active.move_to_end(chat_id)
+
+    def _next_eligible(self, flow: _Flow) -> Optional[_Waiter]:
+        for waiter in flow.queue:
+            if self._per_user.get(waiter.user_id, 0) < self._per_user_limit:
+                return waiter
+        return None
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self._in_service += 1
+        self._per_user[waiter.user_id] = self._per_user.get(waiter.user_id, 0) + 1
+        self.granted_total += 1
+
+        waited = time.monotonic() - waiter.enqueued_at
+        self.wait_seconds_total += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited > self._starvation_seconds:
+            self.starved_total += 1
+            logger.warning("Upstream call waited %.1fs for a fair-scheduler slot", waited)
+
+        waiter.future.set_result(None)
+
+    def _remove(self, chat_id: Hashable, waiter: _Waiter) -> None:
+        flow = self._flows.get(chat_id)
+        if flow is None:
+            return
+        try:
+            flow.queue.remove(waiter)
+        except ValueError:
+            return
+        if not flow.queue:
+            self._active.pop(chat_id, None)
+            del self._flows[chat_id]
+
+
+_scheduler: Optional[FairScheduler] = None
+
+
+def get_fair_scheduler() -> FairScheduler:
+    """Return the process-wide singleton fair scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler()
+    return _scheduler
@@ -0,0 +1,241 @@
+"""Fault and latency injection for the AI, translator and Telegram calls.
+
+Timeouts, retries, fallbacks and the flood-limit handling only matter
+when a dependency misbehaves, which in testing it rarely does on cue.
+This layer makes it misbehave on purpose, with set probabilities, so a
+retry or timeout policy can be checked against a repeatable scenario.
+
+It is off unless configured: FAULT_INJECTION (JSON, dependency -> rule)
+at startup, or the admin endpoint (app.health.admin) at runtime. A rule:
+
+    {"delay_seconds": 2.0, "delay_rate": 0.5,   # add 2s to half the calls
+     "error_rate": 0.1, "status": 429,          # answer 10% with HTTP 429
+     "drop_rate": 0.05,                         # drop 5% of connections
+     "empty_rate": 0.05}                        # 5% come back empty
+
+Each call draws at most one of error/drop/empty, after any delay. How a
+fault looks depends on the client, and is made to look like the real
+thing so the real error handling runs:
+
+- ai: an HTTP response with `status`, a `requests` ConnectionError, or
+  an empty 200 body; a delay past the request timeout is a Timeout.
+- translator: an exception from the translator (deep-translator raises
+  on HTTP errors), a ConnectionError, or None - the silent failure
+  `_translate_chunk` already guards against.
+- telegram: a Bot API error answer with `status` (429 carries
+  retry_after=1), or a NetworkError. "empty" doesn't apply. Polling for
+  updates is never affected.
+
+With FAULT_SEED set, every dependency draws from its own seeded random
+generator, so the same sequence of calls meets the same faults.
+"""
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import requests
+from telegram.error import NetworkError
+from telegram.request import HTTPXRequest
+
+from app.config import settings
+from app.services.health import AI, TELEGRAM, TRANSLATOR
+from app.services.metrics import FAULTS_INJECTED
+
+logger = logging.getLogger(__name__)
+
+DEPENDENCIES = (AI, TRANSLATOR, TELEGRAM)
+_KINDS = ("delay", "error", "drop", "empty")
+
+
+@dataclass(frozen=True)
+class FaultRule:
+    delay_seconds: float = 0.0
+    delay_rate: float = 1.0
+    error_rate: float = 0.0
+    status: int = 503
+    drop_rate: float = 0.0
+    empty_rate: float = 0.0
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "FaultRule":
+        known = {field.name for field in fields(cls)}
+        unknown = set(raw) - known
+        if unknown:
+            raise ValueError(f"Unknown fault rule field(s): {', '.join(sorted(unknown))}")
+        rule = cls(**{name: type(getattr(cls, name))(value) for name, value in raw.items()})
+        rates = (rule.delay_rate, rule.error_rate, rule.drop_rate, rule.empty_rate)
+        if not all(0 <= rate <= 1 for rate in rates):
+            raise ValueError("Fault rates must be between 0 and 1")
+        if rule.error_rate + rule.drop_rate + rule.empty_rate > 1:
+            raise ValueError("error_rate + drop_rate + empty_rate can't exceed 1")
+        if rule.delay_seconds < 0 or not 400 <= rule.status <= 599:
+            raise ValueError("delay_seconds must be >= 0 and status an HTTP error (400-599)")
+        return rule
+
+
+class Fault(NamedTuple):
+    delay: float
+    kind: Optional[str]  # "error", "drop", "empty" or None (only delayed)
+    status: int
+
+
+def parse_fault_rules(raw: str) -> Dict[str, FaultRule]:
+    """Parse FAULT_INJECTION ('{"ai": {"error_rate": 0.2, "status": 429}}')."""
+    if not raw.strip():
+        return {}
+    config = json.loads(raw)
+    if not isinstance(config, dict) or not all(isinstance(rule, dict) for rule in config.values()):
+        raise ValueError("expected a JSON object of dependency -> rule object")
+    unknown = set(config) - set(DEPENDENCIES)
+    if unknown:
+        raise ValueError(f"unknown dependency {', '.join(sorted(unknown))}; use {', '.join(DEPENDENCIES)}")
+    return {dependency: FaultRule.from_dict(rule) for dependency, rule in config.items()}
+
+
+class FaultInjector:
+    """The active rules, and the draw that decides each call's fault."""
+
+    def __init__(self, rules: Optional[Dict[str, FaultRule]] = None, seed: Optional[str] = None) -> None:
+        self._rules: Dict[str, FaultRule] = dict(rules or {})
+        self._seed = seed
+        self._rngs = {dependency: self._rng(dependency) for dependency in DEPENDENCIES}
+        self._lock = threading.Lock()
+        self._counters = {
+            dependency: {kind: FAULTS_INJECTED.labels(dependency, kind) for kind in _KINDS} for dependency in DEPENDENCIES
+        }
+
+    def _rng(self, dependency: str) -> random.Random:
+        return random.Random(f"{self._seed}:{dependency}") if self._seed else random.Random()
+
+    def set_rule(self, dependency: str, rule: Optional[FaultRule]) -> None:
+        """Replace `dependency`'s rule; None removes it. Restarts its
+        seeded sequence."""
+        if dependency not in DEPENDENCIES:
+            raise KeyError(dependency)
+        with self._lock:
+            if rule is None:
+                self._rules.pop(dependency, None)
+            else:
+                self._rules[dependency] = rule
+            self._rngs[dependency] = self._rng(dependency)
+        logger.warning("Fault injection for %s: %s", dependency, asdict(rule) if rule else "off")
+
+    def rules(self) -> Dict[str, Dict[str, Any]]:
+        return {dependency: asdict(rule) for dependency, rule in self._rules.items()}
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            dependency: {kind: int(counter.value) for kind, counter in kinds.items()}
+            for dependency, kinds in self._counters.items()
+        }
+
+    def draw(self, dependency: str) -> Optional[Fault]:
+        """The fault for this call to `dependency`, or None."""
+        rule = self._rules.get(dependency)
+        if rule is None:
+            return None
+        with self._lock:
+            rng = self._rngs[dependency]
+            delayed = rule.delay_seconds > 0 and rng.random() < rule.delay_rate
+            roll = rng.random()
+        kind = None
+        if roll < rule.error_rate:
+            kind = "error"
+        elif roll < rule.error_rate + rule.drop_rate:
+            kind = "drop"
+        elif roll < rule.error_rate + rule.drop_rate + rule.empty_rate:
+            kind = "empty"
+        if not delayed and kind is None:
+            return None
+        counters = self._counters[dependency]
+        if delayed:
+            counters["delay"].inc()
+        if kind is not None:
+            counters[kind].inc()
+        return Fault(rule.delay_seconds if delayed else 0.0, kind, rule.status)
+
+
+def inject_http(dependency: str, send: Callable[[], requests.Response], timeout: Optional[float]) -> requests.Response:
+    """Call `send` (a `requests` call that takes `timeout`), or fake what
+    a misbehaving server would have done instead."""
+    fault = get_fault_injector().draw(dependency)
+    if fault is None:
+        return send()
+    if fault.delay:
+        if timeout is not None and fault.delay >= timeout:
+            time.sleep(timeout)
+            raise requests.exceptions.ReadTimeout(f"injected: no answer within {timeout:.1f}s")
+        time.sleep(fault.delay)
+    if fault.kind == "drop":
+        raise requests.exceptions.ConnectionError("injected: connection dropped")
+    if fault.kind == "error":
+        return _http_response(fault.status, json.dumps({"success": False, "errors": ["injected fault"]}).encode())
+    if fault.kind == "empty":
+        return _http_response(200, b"")
+    return send()
+
+
+def _http_response(status: int, body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+class InjectedFault(Exception):
+    """Raised in place of a dependency's own HTTP error."""
+
+
+def inject_call(dependency: str, call: Callable[..., Any], *args: Any) -> Any:
+    """Call `call(*args)` - a blocking client call that raises on
+    failure - or fake a failure instead."""
+    fault = get_fault_injector().draw(dependency)
+    if fault is None:
+        return call(*args)
+    if fault.delay:
+        time.sleep(fault.delay)
+    if fault.kind == "drop":
+        raise requests.exceptions.ConnectionError("injected: connection dropped")
+    if fault.kind == "error":
+        raise InjectedFault(f"injected: HTTP {fault.status}")
+    if fault.kind == "empty":
+        return None
+    return call(*args)
+
+
+class FaultInjectingRequest(HTTPXRequest):
+    """PTB's HTTP transport for Bot API calls, with faults injected.
+    Used for every call except getUpdates (which has its own transport)."""
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> Tuple[int, bytes]:
+        fault = get_fault_injector().draw(TELEGRAM)
+        if fault is not None:
+            if fault.delay:
+                await asyncio.sleep(fault.delay)
+            if fault.kind == "drop":
+                raise NetworkError("injected: connection dropped")
+            if fault.kind == "error":
+                body: Dict[str, Any] = {"ok": False, "error_code": fault.status, "description": "Injected fault"}
+                if fault.status == 429:
+                    body["parameters"] = {"retry_after": 1}
+                return fault.status, json.dumps(body).encode()
+        return await super().do_request(url, method, *args, **kwargs)
+
+
+_injector: Optional[FaultInjector] = None
+
+
+def get_fault_injector() -> FaultInjector:
+    """Return the process-wide injector, with FAULT_INJECTION's rules."""
+    global _injector
+    if _injector is None:
+        _injector = FaultInjector(parse_fault_rules(settings.fault_injection), settings.fault_seed or None)
+        for dependency, rule in _injector.rules().items():
+            logger.warning("Fault injection for %s: %s", dependency, rule)
+    return _injector
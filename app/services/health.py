@@ -0,0 +1,172 @@
+"""Passive health of the services the bot depends on.
+
+/health used to make a real AI completion call ("Hello") on every probe -
+a blocking `requests` call inside an async endpoint, spending AI quota
+every 30 seconds and stalling the event loop for as long as the AI took.
+
+Instead, the AI client, the translator and the outbound Telegram queue
+report the outcome and latency of every real call here. Each dependency
+keeps a rolling window of recent calls, and its status is derived from
+that: recent error rate, consecutive failures, latency percentiles and
+how long ago it last succeeded. Reading it is just arithmetic on a small
+window, so /health answers in well under a millisecond.
+
+When a dependency sees no traffic for HEALTH_PROBE_IDLE_SECONDS, a
+background prober makes one cheap call to it so its status doesn't go
+stale. With real traffic flowing, the prober does nothing.
+
+Stats are per process: with WORKERS > 1 the front process only sees its
+own probes.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from app.core.constants import (
+    HEALTH_DEGRADED_ERROR_RATE,
+    HEALTH_PROBE_CHECK_SECONDS,
+    HEALTH_UNHEALTHY_CONSECUTIVE_FAILURES,
+    HEALTH_UNHEALTHY_ERROR_RATE,
+    HEALTH_WINDOW_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+AI = "ai"
+TRANSLATOR = "translator"
+TELEGRAM = "telegram"
+
+
+class DependencyHealth:
+    """Rolling window of recent call outcomes for one dependency."""
+
+    def __init__(self, name: str, window: int = HEALTH_WINDOW_SIZE) -> None:
+        self.name = name
+        # (monotonic time, ok, latency seconds)
+        self._calls: Deque[Tuple[float, bool, float]] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.last_success_at: Optional[float] = None
+        self.last_call_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, ok: bool, latency: float, error: Optional[str] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append((now, ok, latency))
+            self.last_call_at = now
+            if ok:
+                self.consecutive_failures = 0
+                self.last_success_at = now
+            else:
+                self.consecutive_failures += 1
+                self.last_error = error
+
+    def idle_for(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return float("inf") if self.last_call_at is None else now - self.last_call_at
+
+    def status(self) -> str:
+        with self._lock:
+            return self._status_locked()
+
+    def snapshot(self) -> Dict[str, object]:
+        now = time.monotonic()
+        with self._lock:
+            latencies = sorted(latency for _, _, latency in self._calls)
+            return {
+                "status": self._status_locked(),
+                "calls": len(self._calls),
+                "error_rate": round(self._error_rate_locked(), 3),
+                "consecutive_failures": self.consecutive_failures,
+                "p50_seconds": round(_percentile(latencies, 0.5), 3),
+                "p95_seconds": round(_percentile(latencies, 0.95), 3),
+                "last_success_age_seconds": (
+                    round(now - self.last_success_at, 1) if self.last_success_at is not None else None
+                ),
+                "last_error": self.last_error,
+            }
+
+    def _error_rate_locked(self) -> float:
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok, _ in self._calls if not ok) / len(self._calls)
+
+    def _status_locked(self) -> str:
+        if not self._calls:
+            return "unknown"
+        error_rate = self._error_rate_locked()
+        if self.consecutive_failures >= HEALTH_UNHEALTHY_CONSECUTIVE_FAILURES or error_rate >= HEALTH_UNHEALTHY_ERROR_RATE:
+            return "unhealthy"
+        if self.consecutive_failures or error_rate >= HEALTH_DEGRADED_ERROR_RATE:
+            return "degraded"
+        return "healthy"
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class HealthRegistry:
+    """All dependencies' health, plus the idle-time prober."""
+
+    def __init__(self) -> None:
+        self.dependencies: Dict[str, DependencyHealth] = {
+            name: DependencyHealth(name) for name in (AI, TRANSLATOR, TELEGRAM)
+        }
+        self._probes: Dict[str, Callable[[], None]] = {}
+        self._prober: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def record(self, name: str, ok: bool, latency: float, error: Optional[str] = None) -> None:
+        self.dependencies[name].record(ok, latency, error)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return {name: dependency.snapshot() for name, dependency in self.dependencies.items()}
+
+    def set_probe(self, name: str, probe: Callable[[], None]) -> None:
+        """`probe()` makes one cheap call to the dependency and reports its
+        outcome through `record` like real traffic does."""
+        self._probes[name] = probe
+
+    def start_prober(self, idle_seconds: float) -> None:
+        if self._prober is not None or idle_seconds <= 0:
+            return
+        self._prober = threading.Thread(
+            target=self._probe_loop, args=(idle_seconds,), name="health-prober", daemon=True
+        )
+        self._prober.start()
+
+    def stop_prober(self) -> None:
+        self._stopping.set()
+
+    def probe_idle(self, idle_seconds: float) -> None:
+        """Probe every dependency that has been idle for `idle_seconds`."""
+        now = time.monotonic()
+        for name, probe in self._probes.items():
+            if self.dependencies[name].idle_for(now) < idle_seconds:
+                continue
+            started = time.monotonic()
+            try:
+                probe()
+            except Exception as exc:
+                self.record(name, False, time.monotonic() - started, f"probe failed: {exc}")
+
+    def _probe_loop(self, idle_seconds: float) -> None:
+        while not self._stopping.wait(min(HEALTH_PROBE_CHECK_SECONDS, idle_seconds)):
+            self.probe_idle(idle_seconds)
+
+
+_registry: Optional[HealthRegistry] = None
+
+
+def get_health_registry() -> HealthRegistry:
+    """Return the process-wide health registry."""
+    global _registry
+    if _registry is None:
+        _registry = HealthRegistry()
+    return _registry
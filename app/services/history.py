@@ -27,6 +27,19 @@ class MessageHistory:
             return ""
         return " ".join(message for message, _ in history)
 
+    def size(self) -> Dict[str, int]:
+        return {
+            "users": len(self._histories),
+            "messages": sum(len(history) for history in self._histories.values()),
+        }
+
+    def clear(self) -> None:
+        self._histories.clear()
+
+    def store(self) -> Dict[int, Deque[Tuple[str, float]]]:
+        """The underlying per-user store, for memory accounting only."""
+        return self._histories
+
     def _trim(self, user_id: int, now: float) -> None:
         history = self._histories[user_id]
 
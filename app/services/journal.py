@@ -0,0 +1,213 @@
+"""Append-only journal of received updates, for crash recovery.
+
+Polling used to start with `drop_pending_updates=True`, and any update
+already fetched but not yet answered lived only in memory - so every
+restart, redeploy or crash (and a free-tier host does all three often)
+silently ignored whoever had just written to the bot.
+
+With JOURNAL_PATH set, every update is appended to a local JSON-lines
+file the moment it's received, and a "done" line follows once its
+handlers have finished. On startup, entries without a "done" line are
+replayed, except ones older than JOURNAL_MAX_AGE_SECONDS - a reply to a
+message from hours ago would only confuse. Update ids already seen are
+ignored, so an update both replayed from the journal and redelivered by
+Telegram is handled once: at-least-once handling, without duplicates in
+the common case.
+
+Writes are buffered and a background thread flushes and fsyncs them in
+batches every JOURNAL_FSYNC_INTERVAL_SECONDS, so receiving an update
+never waits on the disk. The cost is that a hard crash can lose the last
+interval's entries. The file is compacted down to the unfinished
+entries whenever it grows past JOURNAL_COMPACT_BYTES.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from telegram import Bot, Update
+
+from app.core.constants import JOURNAL_COMPACT_BYTES
+from app.services.dispatcher import RecentUpdateIds
+from app.services.memory import get_memory_registry
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateJournal:
+    """The journal file plus the in-memory view of what's unfinished."""
+
+    def __init__(self, path: str, max_age_seconds: float, fsync_interval: float) -> None:
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.fsync_interval = fsync_interval
+        self.replayed = 0
+        self.skipped_stale = 0
+
+        # update_id -> its "recv" line, for everything not finished yet
+        self._open: Dict[int, str] = {}
+        self._done = RecentUpdateIds()
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pending = self._load()
+        self._file: Optional[TextIO] = None
+        self._compact_locked()  # start from only what's still unfinished
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+        get_memory_registry().register(
+            "update_journal",
+            lambda: {"open": len(self._open), "buffered": len(self._buffer)},
+            root=lambda: (self._open, self._buffer),
+        )
+
+    def record(self, update: Update) -> bool:
+        """Journal a freshly received update. False if it was already
+        seen (still open, or recently finished) and should be ignored."""
+        with self._lock:
+            if update.update_id in self._open or update.update_id in self._done:
+                return False
+            line = json.dumps({"op": "recv", "id": update.update_id, "ts": time.time(), "update": update.to_dict()})
+            self._open[update.update_id] = line
+            self._buffer.append(line)
+            return True
+
+    def mark_done(self, update: object) -> None:
+        update_id = getattr(update, "update_id", None)
+        if update_id is None:
+            return
+        with self._lock:
+            if self._open.pop(update_id, None) is None:
+                return
+            self._done.add(update_id)
+            self._buffer.append(json.dumps({"op": "done", "id": update_id}))
+
+    def take_pending(self) -> List[Dict[str, Any]]:
+        """The unfinished, not-too-old updates found on startup, oldest
+        first. Only returned once."""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "buffered": len(self._buffer),
+                "replayed": self.replayed,
+                "skipped_stale": self.skipped_stale,
+            }
+
+    def close(self) -> None:
+        self._stopping.set()
+        self._flusher.join()
+        with self._lock:
+            self._flush_locked()
+            self._file.close()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+
+        received: Dict[int, Dict[str, Any]] = {}
+        with open(self.path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves a torn last line.
+                    continue
+                if entry.get("op") == "recv":
+                    received.setdefault(entry["id"], entry)
+                elif entry.get("op") == "done":
+                    received.pop(entry["id"], None)
+                    self._done.add(entry["id"])
+
+        cutoff = time.time() - self.max_age_seconds
+        pending = []
+        for update_id in sorted(received):
+            entry = received[update_id]
+            if entry["ts"] < cutoff:
+                self.skipped_stale += 1
+                continue
+            self._open[update_id] = json.dumps(entry)
+            pending.append(entry["update"])
+
+        if received:
+            logger.info(
+                "Journal: %d unfinished update(s) to replay, %d too old to bother",
+                len(pending),
+                self.skipped_stale,
+            )
+        return pending
+
+    def _flush_loop(self) -> None:
+        while not self._stopping.wait(self.fsync_interval):
+            try:
+                with self._lock:
+                    self._flush_locked()
+                    if self._file.tell() > JOURNAL_COMPACT_BYTES:
+                        self._compact_locked()
+            except OSError as exc:
+                logger.error("Journal write failed: %s", exc)
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        self._file.write("\n".join(self._buffer) + "\n")
+        self._buffer.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _compact_locked(self) -> None:
+        # Write the unfinished entries to a new file and swap it in
+        # atomically, so a crash mid-compaction leaves the old one intact.
+        self._buffer.clear()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as compacted:
+            compacted.writelines(line + "\n" for line in self._open.values())
+            compacted.flush()
+            os.fsync(compacted.fileno())
+        os.replace(temp_path, self.path)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+
+class JournaledUpdateQueue(asyncio.Queue):
+    """The Application's update queue, journaling each update as it's put
+    in - which is how both the poller and the webhook route deliver them."""
+
+    def __init__(self, journal: UpdateJournal) -> None:
+        super().__init__()
+        self.journal = journal
+
+    def put_nowait(self, item: Any) -> None:
+        if isinstance(item, Update) and not self.journal.record(item):
+            logger.info("Ignoring already-journaled update %s", item.update_id)
+            return
+        super().put_nowait(item)
+
+    def replay(self, bot: Bot) -> int:
+        """Queue the journal's unfinished updates (already journaled, so
+        they bypass `record`). Returns how many were queued."""
+        count = 0
+        for data in self.journal.take_pending():
+            try:
+                update = Update.de_json(data, bot)
+            except Exception as exc:
+                logger.warning("Skipping journaled update that no longer parses: %s", exc)
+                continue
+            super().put_nowait(update)
+            count += 1
+        self.journal.replayed += count
+        if count:
+            logger.info("Replayed %d unfinished update(s) from the journal", count)
+        return count
+
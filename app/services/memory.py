@@ -0,0 +1,185 @@
+"""What's holding the memory: a registry of in-process stores.
+
+When a container is OOM-killed there is no telling which structure grew.
+Every cache and store that can grow with traffic - message history, the
+sticker pack cache, the AI client's HTTP connection pool, the recent
+update ids, the slow-trace buffer - opts in here by registering:
+
+- `stats()`: its entry counts, cheap to call;
+- `root`: the object holding its data, walked on request to estimate how
+  many bytes it keeps alive (see `deep_sizeof`);
+- `flush()` (optional): empty it.
+
+The admin memory endpoint (app.health.admin) reports every store plus
+process-wide numbers: RSS, GC generations and, while tracemalloc is on,
+the top allocating source lines.
+
+Sizes are estimated while the bot keeps running, possibly from another
+thread, so containers are copied (`list(...)`, atomic under the GIL)
+before being walked and the numbers are approximate.
+"""
+import gc
+import logging
+import sys
+import threading
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.constants import MEMORY_SIZEOF_MAX_OBJECTS, TRACEMALLOC_FRAMES
+
+logger = logging.getLogger(__name__)
+
+_Module = type(sys)
+
+
+@dataclass
+class _Store:
+    stats: Callable[[], Dict[str, int]]
+    root: Optional[Callable[[], Any]]
+    flush: Optional[Callable[[], None]]
+
+
+class MemoryRegistry:
+    def __init__(self) -> None:
+        self._stores: Dict[str, _Store] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        stats: Callable[[], Dict[str, int]],
+        root: Optional[Callable[[], Any]] = None,
+        flush: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Register (or replace) a store under `name`."""
+        with self._lock:
+            self._stores[name] = _Store(stats, root, flush)
+
+    def names(self) -> List[str]:
+        return sorted(self._stores)
+
+    def report(self, sizes: bool = True) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            stores = dict(self._stores)
+        report = {}
+        for name, store in sorted(stores.items()):
+            try:
+                entry: Dict[str, Any] = dict(store.stats())
+                if sizes and store.root is not None:
+                    entry["approx_bytes"], entry["size_truncated"] = deep_sizeof(store.root())
+            except Exception as exc:
+                entry = {"error": repr(exc)}
+            entry["flushable"] = store.flush is not None
+            report[name] = entry
+        return report
+
+    def flush(self, name: str) -> None:
+        """Empty one store. KeyError if unknown, ValueError if it can't be
+        flushed."""
+        store = self._stores[name]
+        if store.flush is None:
+            raise ValueError(f"{name} can't be flushed")
+        store.flush()
+        logger.info("Flushed in-process store %s", name)
+
+
+def deep_sizeof(obj: Any, max_objects: int = MEMORY_SIZEOF_MAX_OBJECTS) -> Tuple[int, bool]:
+    """Approximate bytes kept alive by `obj`: sys.getsizeof over it and
+    everything reachable through containers, instance dicts and slots,
+    each object counted once. Stops after `max_objects` objects; the
+    second value says whether it did."""
+    seen = set()
+    total = 0
+    pending = deque([obj])
+    while pending:
+        if len(seen) >= max_objects:
+            return total, True
+        current = pending.popleft()
+        if id(current) in seen or isinstance(current, (type, _Module)) or callable(current):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+
+        if isinstance(current, (str, bytes, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, dict):
+            for key, value in list(current.items()):
+                pending.append(key)
+                pending.append(value)
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            pending.extend(list(current))
+        else:
+            attributes = getattr(current, "__dict__", None)
+            if attributes is not None:
+                pending.append(attributes)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    pending.append(getattr(current, slot))
+    return total, False
+
+
+def process_memory() -> Dict[str, Any]:
+    """Process-wide numbers: resident memory and garbage collector state."""
+    return {
+        "rss_bytes": _rss_bytes(),
+        "gc": {
+            "counts": gc.get_count(),
+            "thresholds": gc.get_threshold(),
+            "generations": gc.get_stats(),
+            "tracked_objects": len(gc.get_objects()),
+        },
+        "tracemalloc": tracemalloc.is_tracing(),
+    }
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+
+        # Peak rather than current, but better than nothing off Linux.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def set_tracemalloc(enabled: bool) -> None:
+    """tracemalloc slows allocation down and uses memory of its own, so it
+    only runs while someone is looking."""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def top_allocations(limit: int) -> List[Dict[str, Any]]:
+    """The source lines holding the most traced memory right now."""
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+    )
+    return [
+        {"where": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+_registry: Optional[MemoryRegistry] = None
+
+
+def get_memory_registry() -> MemoryRegistry:
+    """Return the process-wide store registry."""
+    global _registry
+    if _registry is None:
+        _registry = MemoryRegistry()
+    return _registry
@@ -0,0 +1,243 @@
+"""A small in-process metrics registry, rendered in Prometheus' text format
+at /metrics on the health API.
+
+It's built to stay switched on in production. Recording a value is an
+attribute increment on an object that already exists: no locks, and no
+allocation besides the float itself. Callers bind a metric's labels once
+(`metric.labels(...)` at import or construction time) and keep the child
+around, so the hot path never even builds a label tuple. Without locks a
+rare increment can be lost when two threads race on the same child; for
+monitoring that's an acceptable trade.
+
+Things that already keep their own numbers - queue depths, cache stats,
+history size - are exposed through callbacks that run only when
+/metrics is scraped, so they cost nothing in between.
+
+`prometheus_client` would do the same, but isn't worth a dependency for
+a handful of counters.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds. Covers everything from a cache hit to a slow AI answer.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """The child for these label values - bind it once, then reuse it."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self) -> object:
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        for key, child in list(self._children.items()):
+            yield self.name + "_total", dict(zip(self.labelnames, key)), child.value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+                cumulative += count
+                yield self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield self.name + "_sum", labels, child.sum
+            yield self.name + "_count", labels, child.count
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter whose values come from `callback()` at scrape
+    time: a number, or a {label value(s): number} dict."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], object],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        name = self.name + "_total" if self.kind == "counter" else self.name
+        values = self.callback()
+        if not isinstance(values, dict):
+            yield name, {}, float(values)
+            return
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield name, dict(zip(self.labelnames, map(str, key))), float(value)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], object],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> CallbackMetric:
+        """Register (or replace) a scrape-time metric."""
+        metric = CallbackMetric(name, documentation, callback, labelnames, kind)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = list(metric.samples())
+            except Exception as exc:  # a broken callback must not break the scrape
+                lines.append(f"# {metric.name} unavailable: {exc!r}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} already registered differently")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+AI_REQUESTS = REGISTRY.counter("selene_ai_requests", "AI completion attempts, by outcome", ["outcome"])
+AI_SECONDS = REGISTRY.histogram("selene_ai_request_seconds", "AI completion attempt latency, by outcome", ["outcome"])
+TRANSLATIONS = REGISTRY.counter(
+    "selene_translations", "Translation calls, by direction and language", ["direction", "language"]
+)
+TRANSLATION_SECONDS = REGISTRY.histogram(
+    "selene_translation_seconds", "Translation call latency, by direction", ["direction"]
+)
+TELEGRAM_CALLS = REGISTRY.counter(
+    "selene_telegram_calls", "Outbound Telegram calls, by kind (reply/reaction) and outcome", ["kind", "outcome"]
+)
+TELEGRAM_SECONDS = REGISTRY.histogram("selene_telegram_call_seconds", "Outbound Telegram call latency", ["kind"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "selene_pipeline_stage_seconds", "Message pipeline stage duration, by stage and status", ["stage", "status"]
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "selene_event_loop_lag_seconds",
+    "How late the watchdog heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+EVENT_LOOP_STALLS = REGISTRY.counter("selene_event_loop_stalls", "Times the event loop was blocked past the threshold")
+
+FAULTS_INJECTED = REGISTRY.counter(
+    "selene_faults_injected", "Faults injected into upstream calls, by dependency and kind", ["dependency", "kind"]
+)
+UPSTREAM_CALLS_PER_UPDATE = REGISTRY.histogram(
+    "selene_upstream_calls_per_update",
+    "Upstream calls one update caused, by dependency (updates that made none aren't observed)",
+    ["dependency"],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+)
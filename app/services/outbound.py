@@ -0,0 +1,362 @@
+"""Rate-limited outbound Telegram sends that respect flood limits.
+
+Telegram throttles bots at roughly 30 messages per second overall, about
+one per second in a private chat and about 20 per minute in a group. Go
+over and the Bot API answers with `RetryAfter`, which nothing used to
+handle - the reply was simply lost.
+
+Every send, sticker and reaction now goes through `OutboundScheduler`.
+Calls queue up and a single worker releases them when both the global
+token bucket and the chat's own bucket have room. Replies always go
+ahead of reactions. A reaction that can't go out quickly - it waited too
+long, or the queue is under pressure - is dropped, since a late reaction
+is worth less than a prompt reply. A `RetryAfter` pauses that chat for
+as long as Telegram asked, and the call is retried afterwards.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from telegram import Bot, ReactionTypeEmoji
+from telegram.error import NetworkError, RetryAfter
+
+from app.core.constants import (
+    OUTBOUND_CHAT_BURST,
+    OUTBOUND_MAX_RETRIES,
+    OUTBOUND_PRESSURE_DEPTH,
+    OUTBOUND_REACTION_MAX_WAIT_SECONDS,
+    TELEGRAM_GLOBAL_MESSAGES_PER_SECOND,
+    TELEGRAM_GROUP_MESSAGES_PER_MINUTE,
+    TELEGRAM_PRIVATE_MESSAGES_PER_SECOND,
+)
+from app.services.health import TELEGRAM, get_health_registry
+from app.services.metrics import TELEGRAM_CALLS, TELEGRAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Idle chat buckets are forgotten once there are more than this many.
+_MAX_CHAT_BUCKETS = 10_000
+
+
+class SendPriority(IntEnum):
+    """Higher goes first."""
+
+    REACTION = 0
+    REPLY = 1
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+# Metric children, bound once: priority -> outcome -> counter.
+_CALL_COUNTS = {
+    priority: {outcome: TELEGRAM_CALLS.labels(priority.name.lower(), outcome) for outcome in ("ok", "retry_after", "error")}
+    for priority in SendPriority
+}
+_CALL_SECONDS = {priority: TELEGRAM_SECONDS.labels(priority.name.lower()) for priority in SendPriority}
+
+
+@dataclass
+class _Job:
+    chat_id: int
+    priority: SendPriority
+    factory: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    seq: int
+    enqueued_at: float
+    # The submitter's context, so the call is logged and counted
+    # against the update that made it, not the worker's.
+    context: contextvars.Context
+    attempts: int = 0
+
+
+@dataclass
+class _Stats:
+    sent: int = 0
+    retried: int = 0
+    dropped_reactions: int = 0
+    failed: int = 0
+    retry_after_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    by_priority: Dict[str, int] = field(default_factory=dict)
+
+
+class OutboundScheduler:
+    """Queues Telegram API calls and releases them within flood limits."""
+
+    def __init__(
+        self,
+        global_rate: float = TELEGRAM_GLOBAL_MESSAGES_PER_SECOND,
+        private_rate: float = TELEGRAM_PRIVATE_MESSAGES_PER_SECOND,
+        group_rate: float = TELEGRAM_GROUP_MESSAGES_PER_MINUTE / 60,
+        chat_burst: float = OUTBOUND_CHAT_BURST,
+        reaction_max_wait: float = OUTBOUND_REACTION_MAX_WAIT_SECONDS,
+        pressure_depth: int = OUTBOUND_PRESSURE_DEPTH,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+    ) -> None:
+        self._global = TokenBucket(global_rate, global_rate)
+        self._private_rate = private_rate
+        self._group_rate = group_rate
+        self._chat_burst = chat_burst
+        self._reaction_max_wait = reaction_max_wait
+        self._pressure_depth = pressure_depth
+        self._max_retries = max_retries
+
+        self._chats: Dict[int, TokenBucket] = {}
+        self._pending: List[_Job] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._stats = _Stats()
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    async def send_message(self, bot: Bot, chat_id: int, **kwargs: Any) -> Any:
+        return await self.submit(chat_id, lambda: bot.send_message(chat_id=chat_id, **kwargs))
+
+    async def send_sticker(self, bot: Bot, chat_id: int, **kwargs: Any) -> Any:
+        return await self.submit(chat_id, lambda: bot.send_sticker(chat_id=chat_id, **kwargs))
+
+    async def set_reaction(self, bot: Bot, chat_id: int, message_id: int, emoji: str) -> Any:
+        """Best-effort: returns None without sending if dropped under pressure."""
+        return await self.submit(
+            chat_id,
+            lambda: bot.set_message_reaction(
+                chat_id=chat_id, message_id=message_id, reaction=[ReactionTypeEmoji(emoji)]
+            ),
+            SendPriority.REACTION,
+        )
+
+    async def submit(
+        self,
+        chat_id: int,
+        factory: Callable[[], Awaitable[Any]],
+        priority: SendPriority = SendPriority.REPLY,
+    ) -> Any:
+        """Queue `factory()` (a fresh Bot API call each time it is invoked, so
+        it can be retried) and return its result once it has been sent."""
+        if priority == SendPriority.REACTION and self._under_pressure():
+            self._drop(None, "queue under pressure")
+            return None
+
+        self._ensure_worker()
+        job = _Job(
+            chat_id=chat_id,
+            priority=priority,
+            factory=factory,
+            future=asyncio.get_running_loop().create_future(),
+            seq=next(self._seq),
+            enqueued_at=time.monotonic(),
+            context=contextvars.copy_context(),
+        )
+        self._enqueue(job)
+        return await job.future
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "queued": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "sent": self._stats.sent,
+            "retried": self._stats.retried,
+            "failed": self._stats.failed,
+            "dropped_reactions": self._stats.dropped_reactions,
+            "retry_after_seconds": self._stats.retry_after_seconds,
+            "max_wait_seconds": round(self._stats.max_wait_seconds, 4),
+            "by_priority": dict(self._stats.by_priority),
+        }
+
+    def _under_pressure(self) -> bool:
+        replies = sum(1 for job in self._pending if job.priority == SendPriority.REPLY)
+        return replies >= self._pressure_depth
+
+    def _enqueue(self, job: _Job) -> None:
+        self._pending.append(job)
+        self._pending.sort(key=lambda j: (-j.priority, j.seq))
+        self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._drop_stale_reactions(now)
+
+            job, delay = self._next_ready(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._pending.remove(job)
+            if job.future.cancelled():
+                # Caller gave up (e.g. its turn was cancelled) - don't send.
+                continue
+            self._global.take(now)
+            self._chat_bucket(job.chat_id).take(now)
+
+            waited = now - job.enqueued_at
+            self._stats.max_wait_seconds = max(self._stats.max_wait_seconds, waited)
+            task = job.context.run(asyncio.get_running_loop().create_task, self._execute(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    def _next_ready(self, now: float) -> Tuple[Optional[_Job], Optional[float]]:
+        if not self._pending:
+            return None, None
+
+        global_wait = self._global.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        soonest: Optional[float] = None
+        for job in self._pending:  # already in priority order
+            wait = self._chat_bucket(job.chat_id).wait_time(now)
+            if wait <= 0:
+                return job, 0.0
+            soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    async def _execute(self, job: _Job) -> None:
+        job.attempts += 1
+        started = time.monotonic()
+        try:
+            result = await job.factory()
+        except RetryAfter as exc:
+            elapsed = time.monotonic() - started
+            _CALL_COUNTS[job.priority]["retry_after"].inc()
+            _CALL_SECONDS[job.priority].observe(elapsed)
+            # Flood control means Telegram is up and answering.
+            get_health_registry().record(TELEGRAM, True, elapsed)
+            self._handle_retry_after(job, exc)
+            return
+        except Exception as exc:
+            elapsed = time.monotonic() - started
+            _CALL_COUNTS[job.priority]["error"].inc()
+            _CALL_SECONDS[job.priority].observe(elapsed)
+            # Only network trouble says anything about Telegram's health;
+            # a BadRequest is our fault.
+            get_health_registry().record(TELEGRAM, not isinstance(exc, NetworkError), elapsed, repr(exc))
+            self._stats.failed += 1
+            if not job.future.done():
+                job.future.set_exception(exc)
+            return
+
+        elapsed = time.monotonic() - started
+        _CALL_COUNTS[job.priority]["ok"].inc()
+        _CALL_SECONDS[job.priority].observe(elapsed)
+        get_health_registry().record(TELEGRAM, True, elapsed)
+        self._stats.sent += 1
+        name = job.priority.name.lower()
+        self._stats.by_priority[name] = self._stats.by_priority.get(name, 0) + 1
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def _handle_retry_after(self, job: _Job, exc: RetryAfter) -> None:
+        delay = float(exc.retry_after)
+        self._stats.retry_after_seconds += delay
+        self._chat_bucket(job.chat_id).block(time.monotonic() + delay)
+        logger.warning("Flood limit hit in chat %s, pausing it for %ss", job.chat_id, delay)
+
+        if job.priority == SendPriority.REACTION:
+            self._drop(job, "flood limit")
+        elif job.attempts > self._max_retries:
+            self._stats.failed += 1
+            if not job.future.done():
+                job.future.set_exception(exc)
+        else:
+            self._stats.retried += 1
+            self._enqueue(job)
+
+    def _drop_stale_reactions(self, now: float) -> None:
+        stale = [
+            job
+            for job in self._pending
+            if job.priority == SendPriority.REACTION and now - job.enqueued_at > self._reaction_max_wait
+        ]
+        for job in stale:
+            self._pending.remove(job)
+            self._drop(job, "waited too long")
+
+    def _drop(self, job: Optional[_Job], reason: str) -> None:
+        self._stats.dropped_reactions += 1
+        logger.info("Dropping reaction (%s)", reason)
+        if job is not None and not job.future.done():
+            job.future.set_result(None)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                self._prune_idle_buckets()
+            # Group and channel ids are negative, private chats positive.
+            rate = self._group_rate if chat_id < 0 else self._private_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self._chat_burst)
+        return bucket
+
+    def _prune_idle_buckets(self) -> None:
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.is_idle(now)]:
+            del self._chats[chat_id]
+
+
+_scheduler: Optional[OutboundScheduler] = None
+
+
+def get_outbound_scheduler() -> OutboundScheduler:
+    """Return the process-wide singleton outbound scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = OutboundScheduler()
+    return _scheduler
+
+
+def configure_outbound_scheduler(**kwargs: Any) -> OutboundScheduler:
+    """Replace the singleton with one built from `kwargs` - e.g. worker
+    processes each take only their share of the global rate."""
+    global _scheduler
+    _scheduler = OutboundScheduler(**kwargs)
+    return _scheduler
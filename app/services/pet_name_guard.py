@@ -58,23 +58,10 @@ class PetNameGuard:
         if not text:
             return [("text", text)]
 
-        occupied = bytearray(len(text))
-        matches: List[Tuple[int, int, PetName]] = []
-
-        for pattern, pet_name in _LOOKUP:
-            for m in pattern.finditer(text):
-                start, end = m.start(), m.end()
-                if any(occupied[start:end]):
-                    continue
-                matches.append((start, end, pet_name))
-                for i in range(start, end):
-                    occupied[i] = 1
-
+        matches = self._matches(text)
         if not matches:
             return [("text", text)]
 
-        matches.sort(key=lambda m: m[0])
-
         segments: List[Segment] = []
         cursor = 0
         for start, end, pet_name in matches:
@@ -87,6 +74,27 @@ class PetNameGuard:
 
         return segments
 
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the pet names in `text`, in order."""
+        return [(start, end) for start, end, _ in self._matches(text)]
+
+    @staticmethod
+    def _matches(text: str) -> List[Tuple[int, int, PetName]]:
+        occupied = bytearray(len(text))
+        matches: List[Tuple[int, int, PetName]] = []
+
+        for pattern, pet_name in _LOOKUP:
+            for m in pattern.finditer(text):
+                start, end = m.start(), m.end()
+                if any(occupied[start:end]):
+                    continue
+                matches.append((start, end, pet_name))
+                for i in range(start, end):
+                    occupied[i] = 1
+
+        matches.sort(key=lambda m: m[0])
+        return matches
+
     def render(self, pet_name: PetName, target_lang: str) -> str:
         """Return the natural equivalent for `pet_name` in `target_lang`
         ("am", "om", or anything else -> plain English)."""
@@ -0,0 +1,229 @@
+"""A small dependency-driven pipeline of async stages.
+
+Answering a message used to be one long coroutine: history, translate the
+history, translate the message, AI, parse the reaction, back-translate,
+send, react - each step waiting for the one before it even when it didn't
+need its result. Both `to_english` calls, for example, only need the raw
+text, and setting the reaction only needs the AI's answer.
+
+A `Pipeline` is a list of `Stage`s that each declare which other stages
+they depend on. Every stage starts as soon as its dependencies are done,
+so independent stages overlap. Each stage also gets its own timeout and
+error policy, and every run produces a timing record per stage. Running
+totals per stage are kept too, so it's easy to see where the time goes.
+
+A run can carry a `Deadline` (app.services.deadline). Stages that have a
+timeout shorten it to fit the remaining budget - down to their
+`min_timeout`, so e.g. sending a fallback still gets a fair chance - and
+once the budget is spent they go straight to their error policy without
+running at all.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.logging_config import record_stage_timing
+from app.services.deadline import Deadline
+from app.services.metrics import STAGE_SECONDS
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+Results = Dict[str, Any]
+
+
+class ErrorPolicy(Enum):
+    FAIL = "fail"  # abort the whole run and raise StageError
+    FALLBACK = "fallback"  # use stage.fallback(results) as the stage's result
+    IGNORE = "ignore"  # carry on with None as the stage's result
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of a pipeline. `run` receives the shared results dict -
+    the pipeline inputs plus the result of every finished stage, keyed by
+    stage name - and returns this stage's result."""
+
+    name: str
+    run: Callable[[Results], Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    on_error: ErrorPolicy = ErrorPolicy.FAIL
+    # May be a coroutine function, for fallbacks that do blocking work.
+    fallback: Optional[Callable[[Results], Any]] = None
+    # Floor for the deadline-clamped timeout (only applies if `timeout` is set).
+    min_timeout: float = 0.0
+
+
+@dataclass(frozen=True)
+class StageTiming:
+    name: str
+    started_at: float  # seconds since the run started
+    duration: float
+    status: str  # "ok", "error" or "timeout"
+
+
+@dataclass
+class StageStats:
+    runs: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+@dataclass
+class PipelineResult:
+    results: Results
+    timings: List[StageTiming]
+
+    @property
+    def total_seconds(self) -> float:
+        return max((t.started_at + t.duration for t in self.timings), default=0.0)
+
+
+class StageError(Exception):
+    """A stage with ErrorPolicy.FAIL raised or timed out."""
+
+    def __init__(self, stage: str, cause: BaseException) -> None:
+        super().__init__(f"Stage '{stage}' failed: {cause!r}")
+        self.stage = stage
+
+
+class Pipeline:
+    """Runs `stages` concurrently wherever their dependencies allow."""
+
+    def __init__(self, stages: Sequence[Stage]) -> None:
+        self._stages = list(stages)
+        self._validate()
+        self._stats: Dict[str, StageStats] = {stage.name: StageStats() for stage in self._stages}
+        # stage -> status -> histogram child, bound once
+        self._histograms = {
+            stage.name: {status: STAGE_SECONDS.labels(stage.name, status) for status in ("ok", "error", "timeout")}
+            for stage in self._stages
+        }
+
+    async def run(self, inputs: Results, deadline: Optional[Deadline] = None) -> PipelineResult:
+        results: Results = dict(inputs)
+        timings: List[StageTiming] = []
+        run_started = time.monotonic()
+
+        waiting = {stage.name: stage for stage in self._stages}
+        running: Dict[asyncio.Task, Stage] = {}
+        finished = set()
+
+        try:
+            while waiting or running:
+                for stage in [s for s in waiting.values() if all(dep in finished for dep in s.depends_on)]:
+                    del waiting[stage.name]
+                    task = asyncio.create_task(self._run_stage(stage, results, run_started, timings, deadline))
+                    running[task] = stage
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    results[stage.name] = task.result()
+                    finished.add(stage.name)
+        except BaseException:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+
+        logger.debug(
+            "Pipeline finished in %.2fs: %s",
+            time.monotonic() - run_started,
+            " ".join(f"{t.name}={t.duration:.3f}s" for t in timings),
+        )
+        return PipelineResult(results, timings)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "runs": s.runs,
+                "errors": s.errors,
+                "timeouts": s.timeouts,
+                "avg_seconds": round(s.total_seconds / s.runs, 4) if s.runs else 0.0,
+                "max_seconds": round(s.max_seconds, 4),
+            }
+            for name, s in self._stats.items()
+        }
+
+    async def _run_stage(
+        self,
+        stage: Stage,
+        results: Results,
+        run_started: float,
+        timings: List[StageTiming],
+        deadline: Optional[Deadline],
+    ) -> Any:
+        started = time.monotonic()
+        status = "ok"
+        trace_span = span(stage.name)
+        try:
+            with trace_span:
+                timeout = self._effective_timeout(stage, deadline)
+                if timeout is None:
+                    return await stage.run(results)
+                if timeout <= 0:
+                    raise asyncio.TimeoutError("deadline already passed")
+                return await asyncio.wait_for(stage.run(results), timeout)
+        except asyncio.TimeoutError as exc:
+            status = "timeout"
+            return await self._handle_error(stage, exc, results)
+        except Exception as exc:
+            status = "error"
+            return await self._handle_error(stage, exc, results)
+        finally:
+            duration = time.monotonic() - started
+            timings.append(StageTiming(stage.name, started - run_started, duration, status))
+            self._histograms[stage.name][status].observe(duration)
+            record_stage_timing(stage.name, duration)
+            stats = self._stats[stage.name]
+            stats.runs += 1
+            stats.errors += status == "error"
+            stats.timeouts += status == "timeout"
+            stats.total_seconds += duration
+            stats.max_seconds = max(stats.max_seconds, duration)
+
+    @staticmethod
+    def _effective_timeout(stage: Stage, deadline: Optional[Deadline]) -> Optional[float]:
+        if stage.timeout is None or deadline is None:
+            return stage.timeout
+        return max(deadline.clamp(stage.timeout), stage.min_timeout)
+
+    async def _handle_error(self, stage: Stage, exc: BaseException, results: Results) -> Any:
+        if stage.on_error == ErrorPolicy.FAIL:
+            raise StageError(stage.name, exc) from exc
+
+        logger.warning("Stage '%s' failed (%r), continuing with its %s policy", stage.name, exc, stage.on_error.value)
+        if stage.on_error == ErrorPolicy.FALLBACK and stage.fallback is not None:
+            result = stage.fallback(results)
+            return await result if inspect.isawaitable(result) else result
+        return None
+
+    def _validate(self) -> None:
+        names = [stage.name for stage in self._stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Pipeline stage names must be unique")
+
+        known = set(names)
+        for stage in self._stages:
+            missing = [dep for dep in stage.depends_on if dep not in known]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage(s): {', '.join(missing)}")
+
+        # Kahn's algorithm - anything left over is part of a cycle.
+        remaining = {stage.name: set(stage.depends_on) for stage in self._stages}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle among: {', '.join(sorted(remaining))}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
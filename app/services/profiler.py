@@ -0,0 +1,127 @@
+"""On-demand sampling CPU profiler for the live process.
+
+Production hot spots depend on the real traffic mix - which languages,
+how many pet names, how long the histories are - so they rarely show up
+when reproducing locally. This profiles the running bot instead.
+
+cProfile only sees the thread that enabled it and slows every call down.
+A sampler instead wakes every PROFILE_SAMPLE_INTERVAL_SECONDS, reads every
+thread's current Python stack from `sys._current_frames()` - the event
+loop, `asyncio.to_thread` workers, the health API - and counts identical
+stacks. Its overhead is fixed by the sample rate, not by how busy the bot
+is, and the run length is capped at PROFILE_MAX_SECONDS.
+
+The result is in collapsed-stack format ("thread;outer;...;inner count"
+per line), which flamegraph.pl, speedscope and inferno read directly.
+Only one profile runs at a time.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional
+
+from app.core.constants import PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_SECONDS
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running."""
+
+
+class SamplingProfiler:
+    def __init__(
+        self, interval: float = PROFILE_SAMPLE_INTERVAL_SECONDS, max_seconds: float = PROFILE_MAX_SECONDS
+    ) -> None:
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float) -> "Profile":
+        """Sample every thread for `seconds` (capped at `max_seconds`),
+        blocking the calling thread. Raises ProfilerBusy if a profile is
+        already running."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        try:
+            return self._sample(min(seconds, self.max_seconds))
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float) -> "Profile":
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+        next_at = started
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    stacks[_collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            samples += 1
+
+            # A fixed schedule, so time spent sampling doesn't skew the rate.
+            next_at += self.interval
+            if next_at >= deadline:
+                break
+            time.sleep(max(0.0, next_at - time.monotonic()))
+        return Profile(stacks, samples, time.monotonic() - started, self.interval)
+
+
+class Profile:
+    def __init__(self, stacks: Counter, samples: int, duration: float, interval: float) -> None:
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 20) -> List[Dict[str, object]]:
+        """Functions by the share of samples they were running (innermost
+        frame) in - a quick look without rendering a flame graph."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": function, "samples": count, "share": round(count / total, 4)}
+            for function, count in leaves.most_common(limit)
+        ]
+
+
+def _collapse(thread_name: str, frame: Optional[FrameType]) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    frames.append(thread_name.replace(";", ":").replace(" ", "_"))
+    return ";".join(reversed(frames))
+
+
+def _short_path(filename: str) -> str:
+    # Last two components: enough to tell app/services/x.py from a
+    # library's x.py, short enough to read in a flame graph.
+    head, tail = os.path.split(filename)
+    return os.path.join(os.path.basename(head), tail)
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+def get_profiler() -> SamplingProfiler:
+    """Return the process-wide profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler()
+    return _profiler
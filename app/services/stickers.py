@@ -1,16 +1,65 @@
-"""Looks up sticker packs and picks a random sticker to reply with."""
+"""Looks up sticker packs and picks a random sticker to reply with.
+
+Pack contents are cached in memory so a reply sticker almost never waits
+on Telegram:
+
+- The cache is an LRU bounded to STICKER_PACK_CACHE_MAX_PACKS packs.
+- Only one `get_sticker_set` call per pack is ever in flight; concurrent
+  callers wait for that one instead of each fetching the pack.
+- Once a pack is older than STICKER_PACK_CACHE_SECONDS its cached contents
+  are still served, and refreshed in the background (stale-while-
+  revalidate), for up to STICKER_PACK_STALE_SECONDS.
+- A pack that fails to load is remembered as empty for
+  STICKER_PACK_NEGATIVE_CACHE_SECONDS, rather than retried on every sticker.
+- A random sticker other than the one just sent is picked in O(1),
+  without building a filtered list.
+"""
+import asyncio
 import logging
 import random
 import time
-from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
 
 from telegram import Bot
 
-from app.core.constants import STICKER_PACK_CACHE_SECONDS
+from app.core.constants import (
+    STICKER_PACK_CACHE_MAX_PACKS,
+    STICKER_PACK_CACHE_SECONDS,
+    STICKER_PACK_NEGATIVE_CACHE_SECONDS,
+    STICKER_PACK_STALE_SECONDS,
+)
+from app.services.memory import get_memory_registry
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class _Pack:
+    file_ids: Tuple[str, ...]
+    fetched_at: float
+    # file_id -> its position in file_ids, for O(1) exclusion
+    positions: Dict[str, int] = field(default_factory=dict)
+    # Failed fetch: don't try again before this time.
+    retry_at: float = 0.0
+
+    @classmethod
+    def of(cls, file_ids: Tuple[str, ...], fetched_at: float) -> "_Pack":
+        return cls(file_ids, fetched_at, {fid: i for i, fid in enumerate(file_ids)})
+
+    def pick(self, exclude_file_id: Optional[str]) -> Optional[str]:
+        count = len(self.file_ids)
+        if count == 0:
+            return None
+        excluded = self.positions.get(exclude_file_id) if exclude_file_id is not None else None
+        if excluded is None or count == 1:
+            return self.file_ids[random.randrange(count)]
+        # Pick among the other count - 1 positions, skipping over `excluded`.
+        index = random.randrange(count - 1)
+        return self.file_ids[index + 1 if index >= excluded else index]
+
+
 class StickerService:
     """Fetches a sticker pack's contents (with caching) and picks a random one.
 
@@ -19,36 +68,97 @@ class StickerService:
     have `set_name is None`, and callers should handle that case separately.
     """
 
-    def __init__(self) -> None:
-        # set_name -> (fetched_at, [file_id, ...])
-        self._cache: Dict[str, Tuple[float, List[str]]] = {}
+    def __init__(
+        self,
+        max_packs: int = STICKER_PACK_CACHE_MAX_PACKS,
+        fresh_seconds: float = STICKER_PACK_CACHE_SECONDS,
+        stale_seconds: float = STICKER_PACK_STALE_SECONDS,
+        negative_seconds: float = STICKER_PACK_NEGATIVE_CACHE_SECONDS,
+    ) -> None:
+        self._max_packs = max_packs
+        self._fresh_seconds = fresh_seconds
+        self._stale_seconds = stale_seconds
+        self._negative_seconds = negative_seconds
+        self._cache: "OrderedDict[str, _Pack]" = OrderedDict()
+        self._fetches: Dict[str, asyncio.Task] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "fetches": 0, "failures": 0, "evictions": 0}
+        get_memory_registry().register(
+            "sticker_packs",
+            lambda: {"packs": len(self._cache), "fetching": len(self._fetches)},
+            root=lambda: self._cache,
+            flush=self.clear,
+        )
 
     async def get_random_sticker(
         self, bot: Bot, set_name: str, exclude_file_id: Optional[str] = None
     ) -> Optional[str]:
         """Return a random sticker file_id from `set_name`, or None if unavailable."""
-        file_ids = await self._get_pack_file_ids(bot, set_name)
-        if not file_ids:
-            return None
-
-        choices = [fid for fid in file_ids if fid != exclude_file_id] or file_ids
-        return random.choice(choices)
-
-    async def _get_pack_file_ids(self, bot: Bot, set_name: str) -> List[str]:
-        cached = self._cache.get(set_name)
-        now = time.time()
-        if cached and now - cached[0] < STICKER_PACK_CACHE_SECONDS:
-            return cached[1]
-
+        pack = await self._get_pack(bot, set_name)
+        return pack.pick(exclude_file_id) if pack is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "packs": len(self._cache), "fetching": len(self._fetches)}
+
+    def clear(self) -> None:
+        """Forget every cached pack (fetches in flight still land)."""
+        self._cache.clear()
+
+    async def _get_pack(self, bot: Bot, set_name: str) -> Optional[_Pack]:
+        now = time.monotonic()
+        pack = self._cache.get(set_name)
+        if pack is not None:
+            self._cache.move_to_end(set_name)
+            age = now - pack.fetched_at
+            if age < self._fresh_seconds or now < pack.retry_at:
+                self._stats["hits"] += 1
+                return pack
+            if age < self._fresh_seconds + self._stale_seconds:
+                self._stats["stale_hits"] += 1
+                self._fetch(bot, set_name)  # refresh in the background
+                return pack
+
+        self._stats["misses"] += 1
+        # Shielded so one caller giving up doesn't cancel everyone's fetch.
+        return await asyncio.shield(self._fetch(bot, set_name))
+
+    def _fetch(self, bot: Bot, set_name: str) -> "asyncio.Task[Optional[_Pack]]":
+        """Start fetching `set_name`, or join the fetch already running."""
+        task = self._fetches.get(set_name)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.get_running_loop().create_task(self._load(bot, set_name))
+            self._fetches[set_name] = task
+            task.add_done_callback(lambda done: self._fetch_finished(set_name, done))
+        return task
+
+    def _fetch_finished(self, set_name: str, task: asyncio.Task) -> None:
+        if self._fetches.get(set_name) is task:
+            del self._fetches[set_name]
+
+    async def _load(self, bot: Bot, set_name: str) -> Optional[_Pack]:
+        self._stats["fetches"] += 1
         try:
             sticker_set = await bot.get_sticker_set(set_name)
         except Exception as exc:
+            self._stats["failures"] += 1
             logger.warning("Could not fetch sticker set '%s': %s", set_name, exc)
-            return cached[1] if cached else []
-
-        file_ids = [sticker.file_id for sticker in sticker_set.stickers]
-        self._cache[set_name] = (now, file_ids)
-        return file_ids
+            now = time.monotonic()
+            # Never loaded: an empty pack that is only "fresh" via retry_at.
+            pack = self._cache.get(set_name) or _Pack.of((), float("-inf"))
+            # Keep serving what we had (if anything), but stop asking for a while.
+            pack.retry_at = now + self._negative_seconds
+            self._store(set_name, pack)
+            return pack
+
+        pack = _Pack.of(tuple(sticker.file_id for sticker in sticker_set.stickers), time.monotonic())
+        self._store(set_name, pack)
+        return pack
+
+    def _store(self, set_name: str, pack: _Pack) -> None:
+        self._cache[set_name] = pack
+        self._cache.move_to_end(set_name)
+        while len(self._cache) > self._max_packs:
+            self._cache.popitem(last=False)
+            self._stats["evictions"] += 1
 
 
 _service: Optional[StickerService] = None
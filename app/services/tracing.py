@@ -0,0 +1,347 @@
+"""Lightweight per-turn tracing: where did the time go?
+
+When a reply takes 20 seconds, the pipeline's per-stage totals say which
+stage was slow on average, but not what happened in *that* turn: was it
+langdetect, one of several Google Translate chunks, an AI attempt that
+timed out and was retried, or waiting for a free slot?
+
+Each turn `MessageProcessor` answers is a trace. Spans are opened with
+`span(name, **attributes)` anywhere below it - pipeline stages, waits for
+an admission or fair-scheduler slot, language detection, each translator
+chunk, each AI attempt and retry backoff. The current span lives in a
+context variable, so it follows the turn into pipeline tasks and into the
+worker threads `asyncio.to_thread` starts, with nothing passed around.
+
+Finished traces are kept only if they're among the slowest
+TRACE_SLOW_KEEP seen (served at /debug/slow), logged if they took longer
+than TRACE_SLOW_LOG_SECONDS, and, with TRACE_OTLP_ENDPOINT set, exported
+in the background as OTLP/HTTP JSON to a local collector.
+
+Overhead: a sampled span is one small object and a context variable
+set/reset - microseconds, against upstream calls measured in seconds.
+TRACE_SAMPLE_RATE < 1 traces only that fraction of turns; outside a
+sampled trace `span()` returns a shared no-op.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Union
+
+import requests
+
+from app.config import settings
+from app.core.constants import (
+    TRACE_EXPORT_BATCH_SIZE,
+    TRACE_EXPORT_INTERVAL_SECONDS,
+    TRACE_EXPORT_QUEUE_SIZE,
+    TRACE_EXPORT_TIMEOUT_SECONDS,
+    TRACE_SLOW_KEEP,
+)
+from app.services.memory import get_memory_registry
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["Span"]] = ContextVar("selene_current_span", default=None)
+
+
+class Span:
+    """One timed step. Also its own context manager: entering makes it the
+    current span, leaving ends it."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "end", "attributes", "status", "_token")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[int], attributes: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self._token: Optional[Token] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = time.monotonic()
+        if exc_type is not None:
+            self.status = "cancelled" if issubclass(exc_type, asyncio.CancelledError) else "error"
+            self.attributes.setdefault("error", repr(exc))
+        _current.reset(self._token)
+        if self.parent_id is None:
+            self.trace.tracer.finish(self.trace)
+
+
+class _NoopSpan:
+    """Stands in for a span outside any sampled trace."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Trace:
+    """All the spans of one turn. `spans` is appended to from the event
+    loop and worker threads alike - list.append is atomic."""
+
+    __slots__ = ("tracer", "trace_id", "started_unix_ns", "root", "spans")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.trace_id = random.getrandbits(128)
+        self.started_unix_ns = time.time_ns()
+        self.root = Span(self, name, None, attributes)
+        self.spans: List[Span] = [self.root]
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+
+    def unix_ns(self, monotonic: float) -> int:
+        return self.started_unix_ns + int((monotonic - self.root.start) * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        depth = {None: -1}
+        spans = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            depth[span.span_id] = depth.get(span.parent_id, 0) + 1
+            spans.append(
+                {
+                    "name": span.name,
+                    "depth": depth[span.span_id],
+                    "offset_ms": round((span.start - self.root.start) * 1000, 1),
+                    "duration_ms": round(span.duration * 1000, 1),
+                    "status": span.status,
+                    **({"attributes": span.attributes} if span.attributes else {}),
+                }
+            )
+        return {
+            "trace_id": f"{self.trace_id:032x}",
+            "name": self.root.name,
+            "started_at": self.started_unix_ns / 1e9,
+            "duration_ms": round(self.duration * 1000, 1),
+            "status": self.root.status,
+            "attributes": self.root.attributes,
+            "spans": spans,
+        }
+
+    def summary(self) -> str:
+        """'ai=15.20s translate_history=3.10s ...' over the top-level spans."""
+        children = [s for s in self.spans if s.parent_id == self.root.span_id]
+        return " ".join(f"{s.name}={s.duration:.2f}s" for s in sorted(children, key=lambda s: -s.duration))
+
+
+class Tracer:
+    """Samples turns, keeps the slowest finished ones, logs and exports."""
+
+    def __init__(
+        self,
+        sample_rate: float,
+        keep: int = TRACE_SLOW_KEEP,
+        slow_log_seconds: float = 0.0,
+        otlp_endpoint: str = "",
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.slow_log_seconds = slow_log_seconds
+        self.traced = 0
+        # min-heap of (duration, tie-breaker, trace): the root is the
+        # fastest of the slowest, the one to evict next
+        self._slowest: List[tuple] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.exporter = OTLPExporter(otlp_endpoint) if otlp_endpoint else None
+        get_memory_registry().register(
+            "slow_traces",
+            lambda: {"traces": len(self._slowest), "spans": sum(len(t.spans) for _, _, t in list(self._slowest))},
+            root=lambda: [trace.spans for _, _, trace in list(self._slowest)],
+            flush=self.clear,
+        )
+
+    def start_trace(self, name: str, **attributes: Any) -> Union[Span, _NoopSpan]:
+        """A root span for a new trace - or, inside a trace already, just a
+        child span. A no-op when this turn isn't sampled."""
+        if _current.get() is not None:
+            return span(name, **attributes)
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return _NOOP
+        return Trace(self, name, attributes).root
+
+    def finish(self, trace: Trace) -> None:
+        duration = trace.duration
+        with self._lock:
+            self.traced += 1
+            entry = (duration, next(self._counter), trace)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+        if self.slow_log_seconds and duration >= self.slow_log_seconds:
+            attributes = " ".join(f"{key}={value}" for key, value in trace.root.attributes.items())
+            logger.warning("Slow %s (%s): %.2fs - %s", trace.root.name, attributes, duration, trace.summary())
+        if self.exporter is not None:
+            self.exporter.submit(trace)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slowest.clear()
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = [trace for _, _, trace in sorted(self._slowest, reverse=True)]
+        return [trace.to_dict() for trace in traces]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sample_rate": self.sample_rate,
+            "traced": self.traced,
+            "kept": len(self._slowest),
+            "exporter": self.exporter.stats() if self.exporter is not None else None,
+        }
+
+
+def span(name: str, **attributes: Any) -> Union[Span, _NoopSpan]:
+    """A child of the current span, to use as `with span("ai.attempt"):`.
+    Outside a sampled trace it costs one context variable lookup."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace.spans.append(child)
+    return child
+
+
+class OTLPExporter:
+    """Ships finished traces to an OTLP/HTTP collector (JSON encoding, e.g.
+    http://localhost:4318/v1/traces) from a background thread, in
+    batches. If the collector falls behind, traces are dropped rather
+    than queued without bound."""
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+        self._session = requests.Session()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "endpoint": self.endpoint,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self._queue.qsize(),
+        }
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + TRACE_EXPORT_INTERVAL_SECONDS
+            while len(batch) < TRACE_EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self.export(batch)
+
+    def export(self, batch: List[Trace]) -> None:
+        try:
+            response = self._session.post(self.endpoint, json=otlp_payload(batch), timeout=TRACE_EXPORT_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            self.exported += len(batch)
+        except requests.RequestException as exc:
+            self.failed += len(batch)
+            logger.warning("Exporting %d trace(s) to %s failed: %s", len(batch), self.endpoint, exc)
+
+
+def otlp_payload(traces: List[Trace]) -> Dict[str, Any]:
+    """OTLP/HTTP JSON ExportTraceServiceRequest for `traces`."""
+    spans = []
+    for trace in traces:
+        trace_id = f"{trace.trace_id:032x}"
+        for span_ in trace.spans:
+            end = span_.end if span_.end is not None else span_.start
+            spans.append(
+                {
+                    "traceId": trace_id,
+                    "spanId": f"{span_.span_id:016x}",
+                    **({"parentSpanId": f"{span_.parent_id:016x}"} if span_.parent_id is not None else {}),
+                    "name": span_.name,
+                    "kind": 1,  # INTERNAL
+                    "startTimeUnixNano": str(trace.unix_ns(span_.start)),
+                    "endTimeUnixNano": str(trace.unix_ns(end)),
+                    "attributes": [_otlp_attribute(key, value) for key, value in span_.attributes.items()],
+                    "status": {"code": 2 if span_.status == "error" else 1},
+                }
+            )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_otlp_attribute("service.name", "princess-selene-bot")]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, configured from settings."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(
+            settings.trace_sample_rate,
+            slow_log_seconds=settings.trace_slow_log_seconds,
+            otlp_endpoint=settings.trace_otlp_endpoint,
+        )
+    return _tracer
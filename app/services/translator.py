@@ -3,17 +3,40 @@ instead of ever being sent through Google Translate. See
 app.services.pet_name_guard for the full explanation."""
 import logging
 import re
-from typing import Tuple
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
 
+import requests
+from bs4 import BeautifulSoup
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError, TooManyRequests, TranslationNotFound
+from deep_translator.validate import is_input_valid, request_failed
 from fidel import Transliterate
 from langdetect import DetectorFactory, detect
-
+from langdetect.detector_factory import init_factory
+
+from app.config import settings
+from app.core.constants import TRANSLATION_CALL_TIMEOUT_SECONDS
+from app.services.call_accounting import count_upstream_call
+from app.services.deadline import Deadline
+from app.services.faults import inject_call
+from app.services.health import TRANSLATOR, get_health_registry
+from app.services.metrics import TRANSLATION_SECONDS, TRANSLATIONS
 from app.services.pet_name_guard import PetNameGuard
+from app.services.tracing import span
 
 # Deterministic language detection.
 DetectorFactory.seed = 0
 
+# langdetect loads its language profiles on the first detect(), and makes
+# the half-loaded factory visible before it's done: a detect() racing it
+# from another worker thread guesses from a partial set (English comes
+# out as Polish), which sent English messages after every restart down
+# the translation path. The first caller loads them under this lock.
+_profiles_lock = threading.Lock()
+_profiles_loaded = False
+
 logger = logging.getLogger(__name__)
 
 _GEEZ_RANGE = re.compile(r"[\u1200-\u137F]")
@@ -21,6 +44,37 @@ _LATIN_RANGE = re.compile(r"[a-zA-Z]")
 
 _LANG_NAME_MAP = {"en": "English", "om": "Afan Oromo"}
 
+# direction -> (source, target) language pair for GoogleTranslator
+_TRANSLATOR_PAIRS = {
+    "geez_to_en": ("am", "en"),
+    "en_to_geez": ("en", "am"),
+    "oromo_to_en": ("om", "en"),
+    "en_to_oromo": ("en", "om"),
+}
+
+# Translation metric children, bound once: direction -> language -> counter.
+_LANGUAGE_CODES = ("en", "am", "om", "am_lat", "other")
+_TRANSLATION_COUNTS = {
+    direction: {lang: TRANSLATIONS.labels(direction, lang) for lang in _LANGUAGE_CODES}
+    for direction in ("to_en", "from_en")
+}
+_TRANSLATION_SECONDS = {direction: TRANSLATION_SECONDS.labels(direction) for direction in ("to_en", "from_en")}
+
+
+def _record_translation(direction: str, lang: str, started: float) -> None:
+    counts = _TRANSLATION_COUNTS[direction]
+    counts.get(lang, counts["other"]).inc()
+    _TRANSLATION_SECONDS[direction].observe(time.monotonic() - started)
+
+
+def _load_language_profiles() -> None:
+    global _profiles_loaded
+    if _profiles_loaded:
+        return
+    with _profiles_lock:
+        init_factory()
+        _profiles_loaded = True
+
 
 class ScriptDetector:
     """Detects whether text is Ge'ez script, Latin-script Amharic, English, or Oromo."""
@@ -34,6 +88,7 @@ class ScriptDetector:
         return "Unknown"
 
     def _detect_language(self, text: str) -> str:
+        _load_language_profiles()
         try:
             code = detect(text)
             return _LANG_NAME_MAP.get(code, "Latin script (Other)")
@@ -53,6 +108,50 @@ class ScriptDetector:
         return text
 
 
+class _TimedGoogleTranslator(GoogleTranslator):
+    """GoogleTranslator whose calls time out, optionally talking to
+    another server that speaks the same protocol (TRANSLATE_BASE_URL, e.g.
+    the load test's stand-in).
+
+    deep-translator's own `translate` sends its request without a timeout,
+    so a server that never answers held a worker thread - and with it a
+    fair-scheduler slot - forever. This is the same request and parsing,
+    with a timeout.
+    """
+
+    def __init__(self, source: str, target: str, base_url: Optional[str] = None) -> None:
+        super().__init__(source=source, target=target)
+        if base_url:
+            # BaseTranslator takes the endpoint as a constructor argument
+            # and keeps it here; GoogleTranslator always passes Google's.
+            self._base_url = base_url
+
+    def translate(self, text: str, timeout: float = TRANSLATION_CALL_TIMEOUT_SECONDS, **kwargs: Any) -> str:
+        if not is_input_valid(text, max_chars=5000):
+            return text
+        text = text.strip()
+        if self._same_source_target() or not text:
+            return text
+        params = {**self._url_params, "tl": self._target, "sl": self._source, self.payload_key: text}
+        response = requests.get(self._base_url, params=params, proxies=self.proxies, timeout=timeout)
+        if response.status_code == 429:
+            raise TooManyRequests()
+        if request_failed(status_code=response.status_code):
+            raise RequestError()
+        soup = BeautifulSoup(response.text, "html.parser")
+        response.close()
+        element = soup.find(self._element_tag, self._element_query) or soup.find(
+            self._element_tag, self._alt_element_query
+        )
+        if not element:
+            raise TranslationNotFound(text)
+        return element.get_text(strip=True)
+
+
+def _new_translator(source: str, target: str) -> GoogleTranslator:
+    return _TimedGoogleTranslator(source, target, settings.translate_base_url or None)
+
+
 class TranslationService:
     """Translates between English, Amharic, and Afaan Oromo.
 
@@ -62,21 +161,31 @@ class TranslationService:
     chunks are spliced in directly from the glossary. See
     app.services.pet_name_guard for why an earlier placeholder-token
     approach didn't work for this language pair.
+
+    Safe to call from several worker threads at once: GoogleTranslator
+    keeps the text being translated in per-instance state, so each thread
+    gets its own set of translator instances instead of sharing one.
     """
 
     def __init__(self) -> None:
-        self._translators = {
-            "geez_to_en": GoogleTranslator(source="am", target="en"),
-            "en_to_geez": GoogleTranslator(source="en", target="am"),
-            "oromo_to_en": GoogleTranslator(source="om", target="en"),
-            "en_to_oromo": GoogleTranslator(source="en", target="om"),
-        }
+        self._local = threading.local()
         self.scripts = ScriptDetector()
         self.pet_guard = PetNameGuard()
 
+    @property
+    def _translators(self) -> Dict[str, GoogleTranslator]:
+        translators = getattr(self._local, "translators", None)
+        if translators is None:
+            translators = {
+                direction: _new_translator(source, target) for direction, (source, target) in _TRANSLATOR_PAIRS.items()
+            }
+            self._local.translators = translators
+        return translators
+
     def detect_language_code(self, text: str) -> str:
         """Return a short code: 'am', 'en', 'om', 'am_lat', or 'other'."""
-        script = self.scripts.detect_script(text)
+        with span("detect_language", chars=len(text)):
+            script = self.scripts.detect_script(text)
         return {
             "Amharic (Ge'ez)": "am",
             "English": "en",
@@ -84,44 +193,60 @@ class TranslationService:
             "Amharic (Latin script)": "am_lat",
         }.get(script, "other")
 
-    def to_english(self, text: str) -> Tuple[str, str]:
+    def to_english(self, text: str, deadline: Optional[Deadline] = None) -> Tuple[str, str]:
         """Detect the language of `text` and translate it to English.
 
-        Returns (translated_text, detected_language_code).
+        Returns (translated_text, detected_language_code). Once `deadline`
+        has passed, untranslated chunks are returned as-is instead of
+        being sent to the translator.
         """
+        started = time.monotonic()
+        translated, lang = self._to_english(text, deadline)
+        _record_translation("to_en", lang, started)
+        return translated, lang
+
+    def from_english(self, text: str, target_language: str, deadline: Optional[Deadline] = None) -> str:
+        """Translate English text into `target_language` ('am', 'om', 'en', 'am_lat')."""
+        started = time.monotonic()
+        translated = self._from_english(text, target_language, deadline)
+        _record_translation("from_en", target_language, started)
+        return translated
+
+    def _to_english(self, text: str, deadline: Optional[Deadline]) -> Tuple[str, str]:
         lang = self.detect_language_code(text)
 
         if lang == "en":
             return text, lang
         if lang == "am":
-            return self._translate_guarded(text, self._translators["geez_to_en"], "en"), lang
+            return self._translate_guarded(text, self._translators["geez_to_en"], "en", deadline), lang
         if lang == "om":
-            return self._translate_guarded(text, self._translators["oromo_to_en"], "en"), lang
+            return self._translate_guarded(text, self._translators["oromo_to_en"], "en", deadline), lang
         if lang == "am_lat":
             geez_text = self.scripts.latin_to_geez(text)
-            return self._translate_guarded(geez_text, self._translators["geez_to_en"], "en"), lang
+            return self._translate_guarded(geez_text, self._translators["geez_to_en"], "en", deadline), lang
 
         # Unknown script - best effort via the Amharic path.
         geez_text = self.scripts.latin_to_geez(text)
-        return self._translate_guarded(geez_text, self._translators["geez_to_en"], "en"), "other"
+        return self._translate_guarded(geez_text, self._translators["geez_to_en"], "en", deadline), "other"
 
-    def from_english(self, text: str, target_language: str) -> str:
-        """Translate English text into `target_language` ('am', 'om', 'en', 'am_lat')."""
+    def _from_english(self, text: str, target_language: str, deadline: Optional[Deadline]) -> str:
         if target_language == "en":
             return text
         if target_language == "am":
-            return self._translate_guarded(text, self._translators["en_to_geez"], "am")
+            return self._translate_guarded(text, self._translators["en_to_geez"], "am", deadline)
         if target_language == "om":
-            return self._translate_guarded(text, self._translators["en_to_oromo"], "om")
+            return self._translate_guarded(text, self._translators["en_to_oromo"], "om", deadline)
         if target_language == "am_lat":
-            geez = self._translate_guarded(text, self._translators["en_to_geez"], "am")
+            geez = self._translate_guarded(text, self._translators["en_to_geez"], "am", deadline)
             return self.scripts.geez_to_latin(geez)
 
         # Unknown target - fall back to Amharic Latin script.
-        geez = self._translate_guarded(text, self._translators["en_to_geez"], "am")
+        geez = self._translate_guarded(text, self._translators["en_to_geez"], "am", deadline)
         return self.scripts.geez_to_latin(geez)
 
-    def _translate_guarded(self, text: str, translator: GoogleTranslator, target_lang: str) -> str:
+    def _translate_guarded(
+        self, text: str, translator: GoogleTranslator, target_lang: str, deadline: Optional[Deadline] = None
+    ) -> str:
         """Translate `text`, splicing in glossary pet-name terms directly
         instead of ever sending them to the translator.
 
@@ -135,21 +260,21 @@ class TranslationService:
         # Common case: no pet names in this text at all - one call, no
         # extra overhead, identical behavior to before this feature existed.
         if len(segments) == 1 and segments[0][0] == "text":
-            return self._translate_chunk(segments[0][1], translator)
+            return self._translate_chunk(segments[0][1], translator, deadline)
 
         parts = []
         for kind, value in segments:
             if kind == "pet":
                 parts.append(self.pet_guard.render(value, target_lang))
             elif value.strip():
-                parts.append(self._translate_chunk(value, translator))
+                parts.append(self._translate_chunk(value, translator, deadline))
             else:
                 # Whitespace/punctuation-only chunk - nothing to translate.
                 parts.append(value)
 
         return "".join(parts)
 
-    def _translate_chunk(self, text: str, translator: GoogleTranslator) -> str:
+    def _translate_chunk(self, text: str, translator: GoogleTranslator, deadline: Optional[Deadline] = None) -> str:
         """Translate one chunk, always returning a usable string.
 
         deep_translator's GoogleTranslator can return None instead of
@@ -159,14 +284,29 @@ class TranslationService:
         `parts` list that later gets "".join()-ed, crashing with
         "sequence item N: expected str instance, NoneType found". Every
         return path here is now guaranteed to be a real string.
+
+        A call gets at most TRANSLATION_CALL_TIMEOUT_SECONDS, less if the
+        deadline leaves less, and none at all once it has passed.
         """
+        if deadline is not None and deadline.expired():
+            logger.warning("Out of time budget, leaving chunk untranslated")
+            return text
+        timeout = deadline.clamp(TRANSLATION_CALL_TIMEOUT_SECONDS) if deadline else TRANSLATION_CALL_TIMEOUT_SECONDS
+
+        health = get_health_registry()
+        count_upstream_call(TRANSLATOR)
+        started = time.monotonic()
         try:
-            result = translator.translate(text)
+            with span("translate_chunk", chars=len(text)):
+                result = inject_call(TRANSLATOR, translator.translate, text, timeout)
         except Exception as exc:
+            health.record(TRANSLATOR, False, time.monotonic() - started, str(exc))
             logger.error("Translation failed for chunk, returning original text: %s", exc)
             return text
 
-        if not isinstance(result, str) or not result:
+        ok = isinstance(result, str) and bool(result)
+        health.record(TRANSLATOR, ok, time.monotonic() - started, None if ok else f"returned {result!r}")
+        if not ok:
             logger.warning(
                 "Translator returned %r for chunk %r, falling back to original text",
                 result,
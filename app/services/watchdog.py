@@ -0,0 +1,153 @@
+"""Detects the event loop being blocked, and shows what blocked it.
+
+Everything the bot does for every chat shares one event loop, so a single
+synchronous call on it - `requests` in the AI client, GoogleTranslator,
+fidel's transliteration, langdetect - stalls all of them at once. Those
+calls are meant to run in worker threads; the day one slips back onto the
+loop, nothing fails, replies just get slower for everyone.
+
+With LOOP_WATCHDOG_SECONDS set, a heartbeat task wakes every
+WATCHDOG_HEARTBEAT_SECONDS and records how late it woke (the loop lag,
+exported as a histogram). A watcher thread checks the heartbeat; once it
+is more than LOOP_WATCHDOG_SECONDS overdue, the loop is stuck right now,
+so the watcher grabs the loop thread's current stack - the blocking call
+itself - counts the stall and logs it. Logging is rate-limited to one
+stall per WATCHDOG_LOG_INTERVAL_SECONDS; the rest are only counted.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.core.constants import WATCHDOG_HEARTBEAT_SECONDS, WATCHDOG_LOG_INTERVAL_SECONDS, WATCHDOG_STACK_DEPTH
+from app.services.metrics import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """Heartbeat on the watched loop, watcher on its own thread."""
+
+    def __init__(
+        self,
+        threshold: float,
+        heartbeat_interval: float = WATCHDOG_HEARTBEAT_SECONDS,
+        log_interval: float = WATCHDOG_LOG_INTERVAL_SECONDS,
+    ) -> None:
+        self.threshold = threshold
+        self.heartbeat_interval = heartbeat_interval
+        self.log_interval = log_interval
+        self.stalls = 0
+        self.unlogged = 0  # stalls counted but not logged since the last log line
+        self.max_lag = 0.0
+        self.last_stall: Optional[Dict[str, object]] = None
+
+        self._last_beat = time.monotonic()
+        self._reported_beat: Optional[float] = None
+        self._last_logged_at = float("-inf")
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Watch the running event loop. Call from inside it."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info("Event loop watchdog on: stalls over %.2fs are reported", self.threshold)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def check(self, now: Optional[float] = None) -> bool:
+        """Report a stall if the heartbeat is overdue by more than the
+        threshold - once per missed beat. True if one was reported."""
+        now = time.monotonic() if now is None else now
+        beat = self._last_beat
+        stalled = now - beat - self.heartbeat_interval
+        if stalled < self.threshold or beat == self._reported_beat:
+            return False
+
+        self._reported_beat = beat
+        stack = self._loop_stack()
+        self.stalls += 1
+        EVENT_LOOP_STALLS.inc()
+        self.last_stall = {"at": time.time(), "stalled_seconds": round(stalled, 3), "stack": stack}
+
+        if now - self._last_logged_at >= self.log_interval:
+            logger.warning(
+                "Event loop blocked for %.2fs+ (%d earlier stall(s) not logged). Loop thread is at:\n%s",
+                stalled,
+                self.unlogged,
+                "".join(stack),
+            )
+            self._last_logged_at = now
+            self.unlogged = 0
+        else:
+            self.unlogged += 1
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "threshold_seconds": self.threshold,
+            "stalls": self.stalls,
+            "max_lag_seconds": round(self.max_lag, 3),
+            "last_stall": self.last_stall,
+        }
+
+    async def _heartbeat(self) -> None:
+        interval = self.heartbeat_interval
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - before - interval)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.threshold / 2):
+            try:
+                self.check()
+            except Exception as exc:  # never let the watchdog take anything down
+                logger.error("Event loop watchdog check failed: %s", exc)
+
+    def _loop_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        return traceback.format_stack(frame)[-WATCHDOG_STACK_DEPTH:]
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def get_loop_watchdog() -> Optional[LoopWatchdog]:
+    """Return the process-wide watchdog, or None if LOOP_WATCHDOG_SECONDS
+    is off."""
+    global _watchdog
+    if _watchdog is None and settings.loop_watchdog_seconds > 0:
+        _watchdog = LoopWatchdog(settings.loop_watchdog_seconds)
+    return _watchdog
+
+
+def start_loop_watchdog() -> None:
+    """Watch the running event loop, if the watchdog is on."""
+    watchdog = get_loop_watchdog()
+    if watchdog is not None:
+        watchdog.start()
@@ -0,0 +1,533 @@
+"""A durable work queue between receiving updates and handling them.
+
+WORKERS (app.services.worker_pool) spreads updates over the cores of one
+machine. To go past one machine, updates have to be handed out through
+something every node can reach, and only one node may call getUpdates -
+Telegram answers a second poller with a Conflict error.
+
+With WORK_QUEUE set, every node runs the same two loops:
+
+- `ingest_updates`: nodes compete for a leader lease; only the holder
+  long-polls Telegram and publishes each update to the queue. If it dies,
+  its lease runs out and another node takes over.
+- `consume_updates`: every node claims updates from the queue and runs
+  them through its own Application. A job is acknowledged when the update
+  processor reports its update finished (`JobTracker`), not when handing
+  it over returns - an update waiting behind its chat is handed over
+  long before it runs. One whose handler failed is left unacknowledged.
+
+A claimed update that isn't acknowledged within the visibility timeout
+(its node crashed, say) becomes claimable again; after `max_attempts`
+claims it's parked as dead instead of being retried forever. Updates are
+published with their update id as a dedupe key, so a new leader
+re-fetching updates the old one never confirmed doesn't create doubles.
+Several consumer groups can read the same queue, each getting every
+update once.
+
+Two backends:
+
+- `SQLiteWorkQueue`: a single file, shared by every process on one host.
+  It also keeps each chat's updates in order - a chat's next update
+  can't be claimed while an earlier one is still in flight.
+- `RedisWorkQueue`: Redis streams (needs the `redis` package), for
+  several hosts. Streams have no per-key ordering, so two updates of one
+  chat may be handled at the same time on different nodes.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+
+from app.core.constants import (
+    WORK_QUEUE_LEASE_SECONDS,
+    WORK_QUEUE_POLL_INTERVAL_SECONDS,
+    WORK_QUEUE_RETENTION_SECONDS,
+)
+from app.services.worker_pool import routing_key
+
+logger = logging.getLogger(__name__)
+
+# getUpdates long-poll timeout; must stay well below the leader lease.
+_POLL_TIMEOUT_SECONDS = 10
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    payload: Dict[str, Any]
+    key: str
+    attempts: int
+
+
+class WorkQueue:
+    """What both backends provide. A queue object serves one consumer group."""
+
+    def publish(self, payload: Dict[str, Any], key: str, dedupe_key: Optional[str] = None) -> bool:
+        """Add `payload` for every consumer group. Returns False if
+        `dedupe_key` was published before."""
+        raise NotImplementedError
+
+    def claim(self, consumer: str, count: int = 1) -> List[Job]:
+        """Take up to `count` jobs; they stay invisible to other consumers
+        until acknowledged or the visibility timeout runs out."""
+        raise NotImplementedError
+
+    def ack(self, job: Job) -> None:
+        raise NotImplementedError
+
+    def acquire_leadership(self, node_id: str) -> bool:
+        """Take or renew the leader lease. True if `node_id` holds it."""
+        raise NotImplementedError
+
+    def release_leadership(self, node_id: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue in one SQLite file, for the processes of one host."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS groups (name TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            dedupe_key TEXT UNIQUE,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS deliveries (
+            grp TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'ready',
+            visible_at REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            consumer TEXT,
+            PRIMARY KEY (grp, message_id)
+        );
+        CREATE INDEX IF NOT EXISTS deliveries_ready ON deliveries (grp, status, key, message_id);
+        CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        group: str = "updates",
+        visibility_timeout: float = 120.0,
+        max_attempts: int = 3,
+        lease_seconds: float = WORK_QUEUE_LEASE_SECONDS,
+    ) -> None:
+        self.group = group
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit; transactions are opened explicitly where needed.
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+        self._db.execute("INSERT OR IGNORE INTO groups (name) VALUES (?)", (group,))
+
+    def publish(self, payload: Dict[str, Any], key: str, dedupe_key: Optional[str] = None) -> bool:
+        with self._lock, self._transaction():
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO messages (payload, dedupe_key, created_at) VALUES (?, ?, ?)",
+                (json.dumps(payload), dedupe_key, time.time()),
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._db.execute(
+                "INSERT INTO deliveries (grp, message_id, key) SELECT name, ?, ? FROM groups",
+                (cursor.lastrowid, key),
+            )
+            return True
+
+    def claim(self, consumer: str, count: int = 1) -> List[Job]:
+        now = time.time()
+        with self._lock, self._transaction():
+            dead = self._db.execute(
+                "UPDATE deliveries SET status = 'dead' "
+                "WHERE grp = ? AND status = 'ready' AND visible_at <= ? AND attempts >= ?",
+                (self.group, now, self.max_attempts),
+            ).rowcount
+            if dead:
+                logger.error("%d update(s) failed %d times and were parked as dead", dead, self.max_attempts)
+
+            # Oldest visible delivery of each key that has no earlier
+            # delivery still waiting or in flight - that keeps a chat's
+            # updates in order across consumers.
+            rows = self._db.execute(
+                """
+                SELECT d.message_id, d.key, d.attempts, m.payload
+                FROM deliveries d JOIN messages m ON m.id = d.message_id
+                WHERE d.grp = ? AND d.status = 'ready' AND d.visible_at <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM deliveries e
+                      WHERE e.grp = d.grp AND e.key = d.key AND e.status = 'ready' AND e.message_id < d.message_id
+                  )
+                ORDER BY d.message_id
+                LIMIT ?
+                """,
+                (self.group, now, count),
+            ).fetchall()
+
+            jobs = []
+            for message_id, key, attempts, payload in rows:
+                self._db.execute(
+                    "UPDATE deliveries SET visible_at = ?, attempts = attempts + 1, consumer = ? "
+                    "WHERE grp = ? AND message_id = ?",
+                    (now + self.visibility_timeout, consumer, self.group, message_id),
+                )
+                jobs.append(Job(str(message_id), json.loads(payload), key, attempts + 1))
+
+        self._maybe_purge(now)
+        return jobs
+
+    def ack(self, job: Job) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE deliveries SET status = 'done' WHERE grp = ? AND message_id = ?",
+                (self.group, int(job.id)),
+            )
+
+    def acquire_leadership(self, node_id: str) -> bool:
+        now = time.time()
+        with self._lock, self._transaction():
+            row = self._db.execute("SELECT holder, expires_at FROM leases WHERE name = 'leader'").fetchone()
+            if row is not None and row[0] != node_id and row[1] > now:
+                return False
+            self._db.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES ('leader', ?, ?)",
+                (node_id, now + self.lease_seconds),
+            )
+            return True
+
+    def release_leadership(self, node_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE name = 'leader' AND holder = ?", (node_id,))
+
+    def stats(self) -> Dict[str, object]:
+        now = time.time()
+        with self._lock:
+            counts = dict(
+                self._db.execute(
+                    "SELECT CASE WHEN status = 'ready' AND visible_at > ? THEN 'in_flight' ELSE status END, COUNT(*) "
+                    "FROM deliveries WHERE grp = ? GROUP BY 1",
+                    (now, self.group),
+                ).fetchall()
+            )
+            leader = self._db.execute(
+                "SELECT holder FROM leases WHERE name = 'leader' AND expires_at > ?", (now,)
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "group": self.group,
+            "ready": counts.get("ready", 0),
+            "in_flight": counts.get("in_flight", 0),
+            "dead": counts.get("dead", 0),
+            "leader": leader[0] if leader else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _transaction(self) -> "sqlite3.Connection":
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # can't both read the same rows as claimable.
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db
+
+    def _maybe_purge(self, now: float) -> None:
+        if now - self._last_purge < WORK_QUEUE_RETENTION_SECONDS / 10:
+            return
+        self._last_purge = now
+        cutoff = now - WORK_QUEUE_RETENTION_SECONDS
+        with self._lock, self._transaction():
+            # Finished messages are kept for the retention period so their
+            # dedupe keys still catch late duplicates.
+            self._db.execute(
+                "DELETE FROM messages WHERE created_at < ? AND NOT EXISTS "
+                "(SELECT 1 FROM deliveries d WHERE d.message_id = messages.id AND d.status != 'done')",
+                (cutoff,),
+            )
+            self._db.execute(
+                "DELETE FROM deliveries WHERE status = 'done' "
+                "AND message_id NOT IN (SELECT id FROM messages)"
+            )
+
+
+class RedisWorkQueue(WorkQueue):
+    """Work queue on a Redis stream, for several hosts."""
+
+    # Extend the lease only if we still hold it.
+    _RENEW_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+
+    def __init__(
+        self,
+        url: str,
+        group: str = "updates",
+        visibility_timeout: float = 120.0,
+        max_attempts: int = 3,
+        lease_seconds: float = WORK_QUEUE_LEASE_SECONDS,
+        stream: str = "selene:updates",
+    ) -> None:
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("WORK_QUEUE=redis needs the 'redis' package (pip install redis)") from exc
+
+        self.group = group
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._stream = stream
+        self._dead_stream = f"{stream}:dead"
+        self._leader_key = f"{stream}:leader"
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._renew = self._redis.register_script(self._RENEW_LEASE)
+        try:
+            self._redis.xgroup_create(stream, group, id="0", mkstream=True)
+        except redis.ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def publish(self, payload: Dict[str, Any], key: str, dedupe_key: Optional[str] = None) -> bool:
+        if dedupe_key is not None:
+            fresh = self._redis.set(
+                f"{self._stream}:seen:{dedupe_key}", 1, nx=True, ex=int(WORK_QUEUE_RETENTION_SECONDS)
+            )
+            if not fresh:
+                return False
+        self._redis.xadd(self._stream, {"payload": json.dumps(payload), "key": key})
+        return True
+
+    def claim(self, consumer: str, count: int = 1) -> List[Job]:
+        # Entries another consumer claimed but never acknowledged in time.
+        _, reclaimed, _ = self._redis.xautoclaim(
+            self._stream, self.group, consumer, min_idle_time=int(self.visibility_timeout * 1000), count=count
+        )
+        entries = list(reclaimed)
+        if len(entries) < count:
+            for _, fresh in self._redis.xreadgroup(self.group, consumer, {self._stream: ">"}, count=count - len(entries)):
+                entries.extend(fresh)
+
+        attempts = self._delivery_counts([entry_id for entry_id, _ in entries])
+        jobs = []
+        for entry_id, fields in entries:
+            if not fields:  # trimmed from the stream meanwhile
+                self._redis.xack(self._stream, self.group, entry_id)
+                continue
+            tries = attempts.get(entry_id, 1)
+            if tries > self.max_attempts:
+                logger.error("Update %s failed %d times, parking it as dead", entry_id, self.max_attempts)
+                self._redis.xadd(self._dead_stream, fields)
+                self._redis.xack(self._stream, self.group, entry_id)
+                continue
+            jobs.append(Job(entry_id, json.loads(fields["payload"]), fields["key"], tries))
+        return jobs
+
+    def ack(self, job: Job) -> None:
+        self._redis.xack(self._stream, self.group, job.id)
+
+    def acquire_leadership(self, node_id: str) -> bool:
+        ttl = int(self.lease_seconds * 1000)
+        if self._redis.set(self._leader_key, node_id, nx=True, px=ttl):
+            return True
+        return bool(self._renew(keys=[self._leader_key], args=[node_id, ttl]))
+
+    def release_leadership(self, node_id: str) -> None:
+        if self._redis.get(self._leader_key) == node_id:
+            self._redis.delete(self._leader_key)
+
+    def stats(self) -> Dict[str, object]:
+        pending = self._redis.xpending(self._stream, self.group)
+        groups = {g["name"]: g for g in self._redis.xinfo_groups(self._stream)}
+        return {
+            "backend": "redis",
+            "group": self.group,
+            "ready": groups.get(self.group, {}).get("lag") or 0,
+            "in_flight": pending.get("pending", 0),
+            "dead": self._redis.xlen(self._dead_stream),
+            "leader": self._redis.get(self._leader_key),
+        }
+
+    def close(self) -> None:
+        self._redis.close()
+
+    def _delivery_counts(self, entry_ids: List[str]) -> Dict[str, int]:
+        counts = {}
+        for entry_id in entry_ids:
+            for info in self._redis.xpending_range(self._stream, self.group, entry_id, entry_id, 1):
+                counts[entry_id] = info["times_delivered"]
+        return counts
+
+
+def create_work_queue(
+    backend: str, url: str, visibility_timeout: float, max_attempts: int
+) -> WorkQueue:
+    if backend == "sqlite":
+        return SQLiteWorkQueue(url, visibility_timeout=visibility_timeout, max_attempts=max_attempts)
+    if backend == "redis":
+        return RedisWorkQueue(url, visibility_timeout=visibility_timeout, max_attempts=max_attempts)
+    raise ValueError(f"Unknown work queue backend {backend!r}")
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def ingest_updates(bot: Bot, queue: WorkQueue, node_id: str, stop: asyncio.Event) -> None:
+    """Leader loop: whoever holds the lease polls Telegram and publishes."""
+    offset: Optional[int] = None
+    leading = False
+    try:
+        while not stop.is_set():
+            if not await asyncio.to_thread(queue.acquire_leadership, node_id):
+                if leading:
+                    logger.warning("Lost the leader lease, no longer polling Telegram")
+                    leading, offset = False, None
+                await _sleep_unless(stop, WORK_QUEUE_LEASE_SECONDS / 3)
+                continue
+
+            if not leading:
+                logger.info("Node %s is now the leader, polling Telegram", node_id)
+                leading = True
+                await bot.delete_webhook()
+
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=_POLL_TIMEOUT_SECONDS, allowed_updates=Update.ALL_TYPES
+                )
+            except TelegramError as exc:
+                logger.warning("getUpdates failed: %s", exc)
+                await _sleep_unless(stop, 1.0)
+                continue
+
+            for update in updates:
+                await asyncio.to_thread(
+                    queue.publish, update.to_dict(), str(routing_key(update)), str(update.update_id)
+                )
+                # Only moves past an update once it's safely in the queue;
+                # the next getUpdates call confirms it to Telegram.
+                offset = update.update_id + 1
+    finally:
+        if leading:
+            await asyncio.to_thread(queue.release_leadership, node_id)
+
+
+class JobTracker:
+    """Claimed jobs by update id, acknowledged once their update is done.
+
+    `mark_done` is the update processor's `on_finished` hook, as the update
+    journal's is; `mark_failed` is called (from an error handler) when a
+    handler raised, and keeps that update's job from being acknowledged,
+    so the visibility timeout hands it out again.
+    """
+
+    def __init__(self, queue: WorkQueue) -> None:
+        self._queue = queue
+        self._jobs: Dict[int, Job] = {}
+        self._failed: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def track(self, update_id: int, job: Job) -> None:
+        self._jobs[update_id] = job
+
+    def forget(self, update_id: int) -> None:
+        self._jobs.pop(update_id, None)
+        self._failed.discard(update_id)
+
+    def mark_failed(self, update: object) -> None:
+        update_id = getattr(update, "update_id", None)
+        if update_id in self._jobs:
+            self._failed.add(update_id)
+
+    def mark_done(self, update: object) -> None:
+        update_id = getattr(update, "update_id", None)
+        job = self._jobs.pop(update_id, None)
+        if job is None:
+            return
+        if update_id in self._failed:
+            self._failed.discard(update_id)
+            logger.error("Update %s failed (attempt %d), leaving it for redelivery", job.id, job.attempts)
+            return
+        asyncio.get_running_loop().run_in_executor(None, self._ack, job)
+
+    def _ack(self, job: Job) -> None:
+        try:
+            self._queue.ack(job)
+        except Exception as exc:
+            # Comes back after the visibility timeout and runs again.
+            logger.error("Could not acknowledge update %s: %s", job.id, exc)
+
+
+async def consume_updates(
+    application: Any, queue: WorkQueue, tracker: JobTracker, consumer: str, max_in_flight: int, stop: asyncio.Event
+) -> None:
+    """Worker loop: claim updates and run them through `application`'s
+    handlers (via its update processor, so per-chat ordering and
+    concurrency limits still apply). `tracker` must be the update processor's
+    `on_finished` hook; it acknowledges each job once its update is done."""
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def handle(job: Job) -> None:
+        update_id = job.payload.get("update_id")
+        try:
+            update = Update.de_json(job.payload, application.bot)
+            tracker.track(update.update_id, job)
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception as exc:
+            # Not acknowledged: it comes back after the visibility timeout.
+            logger.error("Update %s failed (attempt %d): %s", job.id, job.attempts, exc)
+            tracker.forget(update_id)
+        finally:
+            in_flight.release()
+
+    while not stop.is_set():
+        await in_flight.acquire()
+        jobs = await asyncio.to_thread(queue.claim, consumer, 1)
+        if not jobs:
+            in_flight.release()
+            await _sleep_unless(stop, WORK_QUEUE_POLL_INTERVAL_SECONDS)
+            continue
+        task = asyncio.create_task(handle(jobs[0]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _sleep_unless(stop: asyncio.Event, seconds: float) -> None:
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
@@ -0,0 +1,221 @@
+"""Spread updates over several worker processes, sharded by chat id.
+
+Language detection, pet-name splitting, transliteration and JSON handling
+are all CPU work, and in one process they all share one core. With
+WORKERS > 1 the process that receives updates (polling or webhook) does
+nothing but forward them: each update goes, as plain `to_dict()` JSON, to
+worker `chat_id % WORKERS`. Every worker runs its own Application and
+MessageProcessor, so per-chat state such as history always lives in the
+same worker, and updates of one chat keep their order.
+
+Workers are supervised: one that dies is started again, and `restart()`
+does a graceful restart - the old worker finishes everything already
+queued for it before the new one starts reading. Per-worker queue depth
+(forwarded but not yet picked up) is reported by `stats()`.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Signature of the function each worker process runs:
+# target(index, update_queue, dequeued_counter).
+WorkerTarget = Callable[[int, Any, Any], None]
+
+# How long a gracefully stopping worker gets to drain its queue.
+_STOP_GRACE_SECONDS = 30.0
+_SUPERVISE_INTERVAL_SECONDS = 1.0
+
+
+def routing_key(update: Update) -> int:
+    """What an update is sharded by: its chat, so a chat's history and
+    ordering stay in one place. Updates without a chat (e.g. inline
+    queries) fall back to the user, then the update id."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+def shard_for(update: Update, workers: int) -> int:
+    """The worker an update belongs to."""
+    return routing_key(update) % workers
+
+
+@dataclass
+class _Worker:
+    index: int
+    process: Any = None
+    queue: Any = None
+    dequeued: Any = None  # multiprocessing.Value, bumped by the worker
+    queued_in: int = 0  # forwarded into the current queue
+    forwarded: int = 0  # forwarded in total
+    restarts: int = 0
+    restarting: bool = False  # hands off for the supervisor
+
+
+class WorkerPool:
+    """Owns the worker processes and forwards updates to them."""
+
+    def __init__(self, workers: int, target: WorkerTarget) -> None:
+        if workers < 1:
+            raise ValueError("WorkerPool needs at least one worker")
+        # spawn, not fork: the front process already runs threads (health
+        # API, supervisor) and an event loop, neither of which survive a fork.
+        self._ctx = multiprocessing.get_context("spawn")
+        self._target = target
+        self._workers = [_Worker(index) for index in range(workers)]
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def start(self) -> None:
+        for worker in self._workers:
+            with self._lock:
+                self._new_queue(worker)
+                self._spawn(worker)
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+        self._supervisor.start()
+        logger.info("Started %d update workers", self.size)
+
+    def forward(self, update: Update) -> int:
+        """Queue `update` for its worker and return that worker's index."""
+        worker = self._workers[shard_for(update, self.size)]
+        data = update.to_dict()
+        with self._lock:
+            worker.queue.put(data)
+            worker.queued_in += 1
+            worker.forwarded += 1
+        return worker.index
+
+    def restart(self, index: int) -> None:
+        """Gracefully replace worker `index`. Updates forwarded meanwhile
+        wait in a fresh queue for the new process, so none are lost and a
+        chat's updates are never handled by two workers at once."""
+        worker = self._workers[index]
+        with self._lock:
+            if worker.restarting:
+                return
+            worker.restarting = True
+            old_process, old_queue = worker.process, worker.queue
+            self._new_queue(worker)
+        old_queue.put(None)
+        self._join(old_process)
+        with self._lock:
+            self._spawn(worker)
+            worker.restarts += 1
+            worker.restarting = False
+        logger.info("Worker %d restarted (pid %s)", index, worker.process.pid)
+
+    def restart_all(self) -> None:
+        """Rolling restart, one worker at a time."""
+        for index in range(self.size):
+            self.restart(index)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            processes = [worker.process for worker in self._workers]
+            for worker in self._workers:
+                worker.queue.put(None)
+        for process in processes:
+            self._join(process)
+        logger.info("All update workers stopped")
+
+    def stats(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return [
+                {
+                    "worker": worker.index,
+                    "pid": worker.process.pid if worker.process else None,
+                    "alive": bool(worker.process and worker.process.is_alive()),
+                    "queued": max(0, worker.queued_in - worker.dequeued.value) if worker.dequeued else 0,
+                    "forwarded": worker.forwarded,
+                    "restarts": worker.restarts,
+                }
+                for worker in self._workers
+            ]
+
+    def _new_queue(self, worker: _Worker) -> None:
+        worker.queue = self._ctx.Queue()
+        worker.dequeued = self._ctx.Value("q", 0)
+        worker.queued_in = 0
+
+    def _spawn(self, worker: _Worker) -> None:
+        worker.process = self._ctx.Process(
+            target=self._target,
+            args=(worker.index, worker.queue, worker.dequeued),
+            name=f"update-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    @staticmethod
+    def _join(process: Any) -> None:
+        process.join(_STOP_GRACE_SECONDS)
+        if process.is_alive():
+            logger.warning("Worker %s didn't stop within %ss, terminating it", process.name, _STOP_GRACE_SECONDS)
+            process.terminate()
+            process.join()
+
+    def _supervise(self) -> None:
+        while not self._stopping.wait(_SUPERVISE_INTERVAL_SECONDS):
+            with self._lock:
+                for worker in self._workers:
+                    if worker.restarting or worker.process.is_alive() or worker.process.exitcode is None:
+                        continue
+                    if self._stopping.is_set():
+                        return
+                    lost = max(0, worker.queued_in - worker.dequeued.value)
+                    logger.error(
+                        "Worker %d died (exit code %s), restarting it; %d queued updates lost",
+                        worker.index,
+                        worker.process.exitcode,
+                        lost,
+                    )
+                    # A process that dies inside queue.get() takes the
+                    # queue's read lock with it, so the old queue can't be
+                    # reused.
+                    self._new_queue(worker)
+                    self._spawn(worker)
+                    worker.restarts += 1
+
+
+async def serve_updates(application: Any, queue: Any, dequeued: Any) -> None:
+    """Worker side: feed updates from `queue` into `application` until the
+    pool sends the stop marker, then let it finish what it already has."""
+    async with application:
+        await application.start()
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            with dequeued.get_lock():
+                dequeued.value += 1
+            try:
+                update = Update.de_json(data, application.bot)
+            except Exception as exc:
+                logger.warning("Dropping update the worker couldn't parse: %s", exc)
+                continue
+            await application.update_queue.put(update)
+        await application.stop()
+
+
+def restart_on_signal(pool: WorkerPool) -> Callable[..., None]:
+    """A signal handler that rolling-restarts `pool` off the main thread."""
+
+    def handler(*_: Any) -> None:
+        threading.Thread(target=pool.restart_all, name="worker-restart", daemon=True).start()
+
+    return handler
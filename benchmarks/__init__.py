@@ -0,0 +1,4 @@
+"""Micro-benchmarks for the pure-Python code that runs on every message.
+
+Run with `python -m benchmarks`; see benchmarks/__main__.py.
+"""
@@ -0,0 +1,61 @@
+"""python -m benchmarks [--filter NAME] [--output FILE] [--baseline FILE]
+                     [--save-baseline] [--threshold 0.15]
+
+Runs the suite, prints a table, writes the results as JSON and, if a
+baseline file exists, exits 1 when anything regressed past the threshold.
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.runner import compare, format_table, run
+from benchmarks.suite import BENCHMARKS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Hot-path micro-benchmarks")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", default=os.path.join(HERE, "results.json"), help="where to write the results")
+    parser.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"), help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline too")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed regression, 0.15 = 15%%")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument("--repeats", type=int, default=5, help="timing rounds; the fastest counts")
+    args = parser.parse_args(argv)
+
+    selected = [benchmark for name, benchmark in BENCHMARKS.items() if args.filter in name]
+    if not selected:
+        parser.error(f"no benchmark matches {args.filter!r}; have {', '.join(BENCHMARKS)}")
+
+    results = run(selected, args.min_time, args.repeats)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    print(format_table(results, baseline))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressed by more than {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Multilingual message corpora for the benchmarks (and the load test).
+
+Hand-written samples of what the bot actually sees - English, Amharic in
+Ge'ez script, Amharic typed in Latin letters, Afaan Oromo and emoji-heavy
+chatter - with pet names and trigger words at roughly the density real
+chats have. `messages()` mixes them deterministically, so every run
+benchmarks exactly the same text.
+"""
+import random
+from typing import Dict, List
+
+ENGLISH = [
+    "hey selene, how are you today?",
+    "I missed you so much baby, where have you been",
+    "tell me a joke, I had the worst day at work",
+    "good morning my love! did you sleep well?",
+    "haha that was fun, you are such a cutie",
+    "guys, has anyone seen the match last night?",
+    "honestly I don't know what to do with my life anymore",
+    "you're gorgeous, you know that right darling?",
+    "can you help me write a message to my mom for her birthday",
+    "ok but seriously princess, what's your favourite movie",
+    "lol no way, that's hilarious",
+    "I'm bored, talk to me sweetheart",
+]
+
+AMHARIC_GEEZ = [
+    "ሰላም ሰሌን እንዴት ነሽ?",
+    "ዛሬ በጣም ደክሞኛል፣ አንድ ቀልድ ንገሪኝ",
+    "ፍቅሬ ናፍቀሽኛል",
+    "ምን እየሰራሽ ነው? ቁርስ በላሽ?",
+    "እሺ ውዴ፣ ነገ እናወራለን",
+    "ይህ ፊልም በጣም አስቂኝ ነበር",
+    "ልዕልቲቱ ምን ትያለሽ?",
+    "ጓደኞቼ ሁሉ ወደ ሰርግ ሄደዋል እኔ ብቻዬን ነኝ",
+    "አመሰግናለሁ በጣም ደግ ነሽ",
+    "ዛሬ አየሩ በጣም ሞቃት ነው",
+]
+
+AMHARIC_LATIN = [
+    "selam selene endet nesh?",
+    "betam nafkeshignal baby",
+    "min eyeserash new?",
+    "eshi wude, nege enawaralen",
+    "ante gin betam konjo nesh",
+    "tiru new, ameseginalehu",
+    "yihe film betam asiki neber jema",
+    "zare betam dekmognal, and kelid negerign",
+    "ine bicha negn, guadegnoche hulu hedewal",
+    "konjo lij, min tiyalesh?",
+]
+
+OROMO = [
+    "akkam jirta selene?",
+    "baay'een si yaade jaalala koo",
+    "har'a maal hojjechaa jirta?",
+    "galatoomi, baay'ee gaarii dha",
+    "kolfa na kolfisiisi, guyyaan koo gaarii miti",
+    "obboleeyyan koo hundi gara cidhaatti deemaniiru",
+    "bareedduu koo, maal jette?",
+    "hardha qilleensi baay'ee ho'aa dha",
+    "nagaa bulte? ciisicha gaarii turee?",
+    "fiilmiin kun baay'ee nama kolfisiisa",
+]
+
+EMOJI_HEAVY = [
+    "😂😂😂 no wayyy",
+    "❤️‍🔥❤️‍🔥 you're the best selene 🥰",
+    "🔥🔥🔥",
+    "good night babe 😴💤🌙",
+    "ሰላም 😍😍",
+    "😭😭 why would you say that 💔",
+    "haha 🤣 fun times guys 🎉🎉",
+    "🥺👉👈 can we talk",
+    "selam 👋 endet nesh 😊",
+    "👀",
+]
+
+CORPORA: Dict[str, List[str]] = {
+    "english": ENGLISH,
+    "amharic_geez": AMHARIC_GEEZ,
+    "amharic_latin": AMHARIC_LATIN,
+    "oromo": OROMO,
+    "emoji": EMOJI_HEAVY,
+}
+
+# Rough share of each language in real traffic.
+MIX = {"english": 0.45, "amharic_geez": 0.2, "amharic_latin": 0.15, "oromo": 0.1, "emoji": 0.1}
+
+# What the AI sends back: a reply plus the REACT: control line, in the
+# shapes it really comes in - clean, NONE, bare, noisy, and missing.
+AI_REPLIES = [
+    "Aww, I missed you too baby! Where were you hiding? 😘\nREACT: 🥰",
+    "Haha okay okay, here's one: why did the scarecrow win an award? Because he was outstanding in his field!\nREACT: 🤣",
+    "Good morning my love! I slept like a princess, obviously.\nREACT: NONE",
+    "That sounds really hard, darling. I'm here, tell me everything.\nREACT: 😭.",
+    "You're making me blush, cutie!\nREACT: (😍)",
+    "Of course I can help! Start with how much she means to you.\nREACT:",
+    "My favourite movie? Anything with a happy ending and a gorgeous prince.",
+    "Hmm, I don't think that's a good idea, sweetheart.\nreact: 🔥 lol",
+    "Bored? With me around? Impossible! Let's play a game.\nREACT: NONE",
+    "Wow, that's a lot to take in. Give me a second to think about it, honey.\nREACT: 💔",
+]
+
+
+def messages(count: int, seed: int = 7, mix: Dict[str, float] = MIX) -> List[str]:
+    """`count` messages drawn from the corpora in `mix` proportions."""
+    rng = random.Random(seed)
+    languages = list(mix)
+    weights = [mix[language] for language in languages]
+    return [rng.choice(CORPORA[rng.choices(languages, weights)[0]]) for _ in range(count)]
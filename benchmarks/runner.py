@@ -0,0 +1,128 @@
+"""Timing, allocation measurement and baseline comparison.
+
+Throughput: the operation is run enough times that one round takes at
+least `min_time` seconds, for `repeats` rounds; the fastest round counts,
+since everything slower is noise from the rest of the machine.
+
+Allocations: a few further calls run under tracemalloc, which reports the
+peak bytes allocated during a call (how much garbage a message makes) and
+what is still allocated afterwards (what it keeps - should be ~0 once
+caches are warm). tracemalloc slows allocation down, so it is never on
+while timing.
+"""
+import gc
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from benchmarks.suite import Benchmark
+
+ALLOCATION_CALLS = 5
+
+# Allocation figures below this many bytes per message are too small for a
+# relative change to mean anything.
+ALLOCATION_NOISE_BYTES = 256
+
+
+def _time_calls(operation: Callable[[], object], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        operation()
+    return time.perf_counter() - start
+
+
+def _calibrate(operation: Callable[[], object], min_time: float) -> int:
+    calls = 1
+    while True:
+        if _time_calls(operation, calls) >= min_time:
+            return calls
+        calls *= 2
+
+
+def _allocations(operation: Callable[[], object], calls: int) -> Dict[str, int]:
+    peaks: List[int] = []
+    retained: List[int] = []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            operation()
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    return {"peak": int(statistics.median(peaks)), "retained": int(statistics.median(retained))}
+
+
+def measure(
+    benchmark: Benchmark, min_time: float = 0.2, repeats: int = 5, allocation_calls: int = ALLOCATION_CALLS
+) -> Dict[str, Any]:
+    operation = benchmark.setup()
+    operation()  # warm caches and lazy imports
+
+    calls = _calibrate(operation, min_time)
+    gc.collect()
+    best = min(_time_calls(operation, calls) for _ in range(repeats))
+    per_call = best / calls
+
+    allocations = _allocations(operation, allocation_calls)
+    return {
+        "items_per_call": benchmark.items,
+        "calls_per_round": calls,
+        "seconds_per_call": per_call,
+        "ops_per_second": round(1 / per_call, 1),
+        "items_per_second": round(benchmark.items / per_call, 1),
+        "usec_per_item": round(per_call / benchmark.items * 1e6, 3),
+        "peak_bytes_per_item": round(allocations["peak"] / benchmark.items, 1),
+        "retained_bytes_per_item": round(allocations["retained"] / benchmark.items, 1),
+    }
+
+
+def run(benchmarks: List[Benchmark], min_time: float = 0.2, repeats: int = 5) -> Dict[str, Any]:
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": {benchmark.name: measure(benchmark, min_time, repeats) for benchmark in benchmarks},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions of `current` against `baseline`: throughput down, or
+    per-message allocations up, by more than `threshold` (0.15 = 15%).
+    Benchmarks missing from either side are skipped."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        ratio = result["items_per_second"] / base["items_per_second"]
+        if ratio < 1 - threshold:
+            regressions.append(
+                f"{name}: {result['items_per_second']:,.0f} msg/s vs {base['items_per_second']:,.0f} "
+                f"({(ratio - 1) * 100:+.1f}%)"
+            )
+        for key in ("peak_bytes_per_item", "retained_bytes_per_item"):
+            now, before = result[key], base[key]
+            if now > ALLOCATION_NOISE_BYTES and now > max(before, ALLOCATION_NOISE_BYTES) * (1 + threshold):
+                regressions.append(f"{name}: {key} {now:,.0f} vs {before:,.0f}")
+    return regressions
+
+
+def format_table(current: Dict[str, Any], baseline: Dict[str, Any] = None) -> str:
+    rows = [f"{'benchmark':<26}{'msg/s':>12}{'us/msg':>10}{'peak B/msg':>12}{'kept B/msg':>12}{'vs base':>10}"]
+    for name, result in current["results"].items():
+        base = (baseline or {}).get("results", {}).get(name)
+        change = f"{(result['items_per_second'] / base['items_per_second'] - 1) * 100:+.1f}%" if base else "-"
+        rows.append(
+            f"{name:<26}{result['items_per_second']:>12,.0f}{result['usec_per_item']:>10.2f}"
+            f"{result['peak_bytes_per_item']:>12,.0f}{result['retained_bytes_per_item']:>12,.0f}{change:>10}"
+        )
+    return "\n".join(rows)
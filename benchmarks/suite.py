@@ -0,0 +1,136 @@
+"""The benchmarks: pure-Python code that runs on every message.
+
+Each benchmark's setup builds its inputs once and returns the operation
+to time; one call of the operation handles a whole batch of messages, so
+throughput is reported per message.
+"""
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from telegram import Update
+
+from benchmarks.corpus import AI_REPLIES, CORPORA, messages
+
+BATCH = 200
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    items: int = BATCH  # messages handled per call of the operation
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, items: int = BATCH) -> Callable:
+    def register(setup: Callable[[], Callable[[], object]]) -> Callable[[], Callable[[], object]]:
+        BENCHMARKS[name] = Benchmark(name, setup, items)
+        return setup
+
+    return register
+
+
+_BOT = SimpleNamespace(id=99, username="SeleneBot")
+
+
+def _group_updates(texts: List[str]) -> List[Update]:
+    updates = []
+    for i, text in enumerate(texts):
+        message = {
+            "message_id": i,
+            "date": 0,
+            "chat": {"id": -100123, "type": "supergroup"},
+            "from": {"id": 1000 + i % 50, "is_bot": False, "first_name": "Abebe", "username": "abebe"},
+            "text": text,
+        }
+        if i % 5 == 0:
+            message["reply_to_message"] = {
+                "message_id": i - 1,
+                "date": 0,
+                "chat": message["chat"],
+                "from": {"id": _BOT.id, "is_bot": True, "first_name": "Selene"},
+                "text": "earlier",
+            }
+        update = Update.de_json({"update_id": i, "message": message}, None)
+        update.message.set_bot(_BOT)
+        updates.append(update)
+    return updates
+
+
+@benchmark("pet_guard_split")
+def _pet_guard_split() -> Callable[[], object]:
+    from app.services.pet_name_guard import PetNameGuard
+
+    guard = PetNameGuard()
+    # The guard runs on English: the user's message after translation and
+    # the AI's reply before it.
+    texts = (CORPORA["english"] + [reply.split("\nREACT")[0] for reply in AI_REPLIES]) * (BATCH // 22 + 1)
+    texts = texts[:BATCH]
+    return lambda: [guard.split(text) for text in texts]
+
+
+@benchmark("extract_reaction")
+def _extract_reaction() -> Callable[[], object]:
+    from app.services.reaction import extract_reaction
+
+    replies = (AI_REPLIES * (BATCH // len(AI_REPLIES) + 1))[:BATCH]
+    return lambda: [extract_reaction(reply) for reply in replies]
+
+
+# Latin-script text goes through langdetect, which is milliseconds per
+# message; a smaller batch keeps rounds (and tracemalloc) bearable.
+DETECT_BATCH = 25
+
+
+@benchmark("detect_script", items=DETECT_BATCH)
+def _detect_script() -> Callable[[], object]:
+    from app.services.translator import ScriptDetector
+
+    detector = ScriptDetector()
+    texts = messages(DETECT_BATCH)
+    return lambda: [detector.detect_script(text) for text in texts]
+
+
+@benchmark("history_add_get")
+def _history_add_get() -> Callable[[], object]:
+    from app.services.history import MessageHistory
+
+    history = MessageHistory()
+    texts = messages(BATCH)
+
+    def run() -> None:
+        for i, text in enumerate(texts):
+            user_id = i % 40
+            history.add_message(user_id, text)
+            history.get_history(user_id)
+
+    return run
+
+
+@benchmark("should_respond_in_group")
+def _should_respond_in_group() -> Callable[[], object]:
+    from app.handlers.messages import MessageProcessor
+
+    processor = MessageProcessor()
+    updates = _group_updates(messages(BATCH, seed=11))
+    return lambda: [processor.should_respond_in_group(update, None) for update in updates]
+
+
+@benchmark("build_prompt")
+def _build_prompt() -> Callable[[], object]:
+    from app.handlers.messages import MessageProcessor
+
+    processor = MessageProcessor()
+    updates = _group_updates(messages(BATCH, seed=13))
+    history = " ".join(messages(12, seed=17))
+
+    def run() -> None:
+        for update in updates:
+            user_info = processor._extract_user_info(update)
+            message = processor._build_prompt_message(update, user_info, user_info["message"])
+            f"Our Last Chat(used for to remember): {history}\n\nMy new Message: {message}"
+
+    return run
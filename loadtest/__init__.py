@@ -0,0 +1,5 @@
+"""Offline end-to-end load test: the real bot against local stand-ins
+for Telegram, the AI and the translator.
+
+Run with `python -m loadtest`; see loadtest/harness.py.
+"""
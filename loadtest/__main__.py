@@ -0,0 +1,32 @@
+"""python -m loadtest [--users N] [--duration S] [--ai-latency SPEC] ...
+
+Runs the bot against local stand-ins for Telegram, the AI and the
+translator under simulated users, then prints throughput, reply latency
+percentiles and upstream calls per message (see loadtest.harness).
+Latency specs are described in loadtest.fakes.Latency. The bot's own
+settings (ADMISSION_MAX_ACTIVE, FAIR_CAPACITY, ...) come from the
+environment as usual.
+"""
+import argparse
+import json
+import sys
+
+from loadtest.harness import add_config_arguments, config_from_args, format_report, run_load_test
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Offline end-to-end load test")
+    add_config_arguments(parser)
+    parser.add_argument("--output", help="also write the report here as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(config_from_args(args))
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""Local stand-ins for the bot's three upstreams.
+
+Each is a small threaded HTTP server on 127.0.0.1 that answers the way
+the real service does, closely enough for the bot's clients (PTB,
+requests, deep-translator) to parse it:
+
+- `FakeTelegram`: the Bot API methods the bot uses - getMe, getUpdates
+  (long-polled, fed by `push_message`/`push_sticker`/`push_raw`), sendMessage,
+  sendSticker, setMessageReaction, getStickerSet. It notes when each
+  reply arrives, which is what reply latency is measured against.
+- `FakeAI`: the Workers-AI completion endpoint, answering with canned
+  replies that carry REACT: lines like the real model's.
+- `FakeTranslate`: Google Translate's mobile page, echoing the text back.
+
+Every server sleeps for a latency drawn from its `Latency` and fails a
+configurable fraction of calls, and counts calls per endpoint.
+"""
+import html
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.corpus import AI_REPLIES
+
+BOT_ID = 99
+BOT_USERNAME = "SeleneBot"
+STICKER_SET = "SelenePack"
+
+# Methods whose failures the bot has to cope with; getUpdates and the
+# startup calls are never failed, or nothing would reach the bot at all.
+_FALLIBLE_METHODS = {"sendMessage", "sendSticker", "setMessageReaction", "getStickerSet"}
+
+
+class Latency:
+    """A latency distribution, parsed from a spec:
+
+    - "0.2" or "fixed:0.2" - always 0.2s
+    - "uniform:0.1,0.5" - between 0.1s and 0.5s
+    - "exp:0.3" - exponential with a 0.3s mean
+    - "lognormal:1.0,0.5" - median 1.0s, sigma 0.5 (long right tail, like
+      real upstreams)
+    """
+
+    def __init__(self, spec: str) -> None:
+        self.spec = spec
+        kind, _, raw = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        try:
+            params = [float(value) for value in raw.split(",")]
+        except ValueError:
+            raise ValueError(f"Bad latency spec {spec!r}") from None
+        arity = {"fixed": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if arity.get(kind) != len(params) or any(value < 0 for value in params):
+            raise ValueError(f"Bad latency spec {spec!r}; see loadtest.fakes.Latency")
+        self.kind = kind
+        self.params = params
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exp":
+            return rng.expovariate(1 / self.params[0]) if self.params[0] else 0.0
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median else 0.0
+
+    def __repr__(self) -> str:
+        return f"Latency({self.spec!r})"
+
+
+class FakeServer:
+    """A threaded HTTP server that delays and fails calls as configured.
+    Subclasses implement `handle`."""
+
+    error_status = 500
+
+    def __init__(self, latency: Latency, error_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, method: str, path: str, params: Dict[str, Any]) -> Tuple[int, str, str]:
+        """Answer one call: (status, content type, body)."""
+        raise NotImplementedError
+
+    def endpoint(self, path: str, params: Dict[str, Any]) -> str:
+        """The name calls are counted under."""
+        return "call"
+
+    def fallible(self, endpoint: str) -> bool:
+        return True
+
+    def error_response(self, endpoint: str) -> Tuple[int, str, str]:
+        return self.error_status, "application/json", json.dumps({"success": False, "errors": ["injected"]})
+
+    def _draw(self, endpoint: str) -> Tuple[float, bool]:
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency.sample(self._rng)
+            failed = self.fallible(endpoint) and self._rng.random() < self.error_rate
+            if failed:
+                self.errors[endpoint] += 1
+        return delay, failed
+
+    def _serve(self, request: BaseHTTPRequestHandler) -> None:
+        parsed = urlparse(request.path)
+        params = _decode_params(parse_qs(parsed.query))
+        length = int(request.headers.get("Content-Length") or 0)
+        if length:
+            body = request.rfile.read(length).decode("utf-8")
+            if request.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body))
+            else:
+                params.update(_decode_params(parse_qs(body)))
+
+        endpoint = self.endpoint(parsed.path, params)
+        delay, failed = self._draw(endpoint)
+        if delay:
+            time.sleep(delay)
+        status, content_type, text = self.error_response(endpoint) if failed else self.handle(
+            request.command, parsed.path, params
+        )
+        payload = text.encode("utf-8")
+        try:
+            request.send_response(status)
+            request.send_header("Content-Type", content_type)
+            request.send_header("Content-Length", str(len(payload)))
+            request.end_headers()
+            request.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The bot gave up on this call (a getUpdates cut short at shutdown).
+            pass
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                server._serve(self)
+
+            do_POST = do_GET
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+_JSON_VALUE = re.compile(r"-?\d+|[\[{].*", re.DOTALL)
+
+
+def _decode_params(raw: Dict[str, List[str]]) -> Dict[str, Any]:
+    # PTB form-encodes parameters, JSON-encoding every non-string value.
+    params = {}
+    for key, values in raw.items():
+        value = values[-1]
+        if _JSON_VALUE.fullmatch(value):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        params[key] = value
+    return params
+
+
+class FakeTelegram(FakeServer):
+    """The Bot API, for one bot. Injected failures are 429 flood-control
+    answers, the error a busy bot actually gets."""
+
+    def __init__(self, latency: Latency, error_rate: float = 0.0, seed: int = 0) -> None:
+        super().__init__(latency, error_rate, seed)
+        # Called as on_reply(chat_id, replied_to_message_id, reply_message_id,
+        # monotonic arrival time), from a server thread.
+        self.on_reply: Optional[Callable[[int, Optional[int], int, float], None]] = None
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._arrived = threading.Condition()
+        self._closed = False
+        self.bot_username = BOT_USERNAME
+
+    def stop(self) -> None:
+        with self._arrived:
+            self._closed = True
+            self._arrived.notify_all()
+        super().stop()
+
+    def push_message(
+        self, chat: Dict[str, Any], user: Dict[str, Any], text: str, reply_to: Optional[int] = None
+    ) -> int:
+        """Queue a text message for getUpdates; returns its message id.
+        `reply_to` makes it a reply to that message of the bot's."""
+        return self._push(chat, user, {"text": text}, reply_to)
+
+    def push_sticker(self, chat: Dict[str, Any], user: Dict[str, Any], reply_to: Optional[int] = None) -> int:
+        sticker = _sticker(f"user-{user['id']}")
+        sticker["set_name"] = STICKER_SET
+        return self._push(chat, user, {"sticker": sticker}, reply_to)
+
+    def _push(self, chat: Dict[str, Any], user: Dict[str, Any], content: Dict[str, Any], reply_to: Optional[int]) -> int:
+        message = {"chat": chat, "from": user, **content}
+        if reply_to is not None:
+            message["reply_to_message"] = {
+                "message_id": reply_to,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": self.bot_user(),
+                "text": "...",
+            }
+        return self.push_raw(message)
+
+    def push_raw(self, message: Dict[str, Any]) -> int:
+        """Queue a complete message dict (e.g. a captured one), with a
+        fresh message id and date; returns the id."""
+        with self._arrived:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            message = {**message, "message_id": message_id, "date": int(time.time())}
+            self._updates.append({"update_id": self._next_update_id, "message": message})
+            self._next_update_id += 1
+            self._arrived.notify_all()
+        return message_id
+
+    def bot_user(self) -> Dict[str, Any]:
+        return {"id": BOT_ID, "is_bot": True, "first_name": "Selene", "username": self.bot_username}
+
+    def endpoint(self, path: str, params: Dict[str, Any]) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    def fallible(self, endpoint: str) -> bool:
+        return endpoint in _FALLIBLE_METHODS
+
+    def error_response(self, endpoint: str) -> Tuple[int, str, str]:
+        body = {
+            "ok": False,
+            "error_code": 429,
+            "description": "Too Many Requests: retry after 1",
+            "parameters": {"retry_after": 1},
+        }
+        return 429, "application/json", json.dumps(body)
+
+    def handle(self, method: str, path: str, params: Dict[str, Any]) -> Tuple[int, str, str]:
+        name = self.endpoint(path, params)
+        if name == "getUpdates":
+            result: Any = self._get_updates(int(params.get("offset") or 0), float(params.get("timeout") or 0))
+        elif name == "getMe":
+            result = {**self.bot_user(), "can_join_groups": True, "can_read_all_group_messages": True}
+        elif name in ("sendMessage", "sendSticker"):
+            result = self._record_reply(name, params)
+        elif name == "getStickerSet":
+            result = {
+                "name": params.get("name", STICKER_SET),
+                "title": "Selene",
+                "sticker_type": "regular",
+                "stickers": [_sticker(f"pack-{i}") for i in range(20)],
+            }
+        else:
+            # deleteWebhook, setMessageReaction, ...
+            result = True
+        return 200, "application/json", json.dumps({"ok": True, "result": result})
+
+    def _get_updates(self, offset: int, timeout: float) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        with self._arrived:
+            while True:
+                # Confirmed updates are forgotten, as Telegram does.
+                self._updates = [update for update in self._updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self._updates or remaining <= 0 or self._closed:
+                    return list(self._updates[:100])
+                self._arrived.wait(remaining)
+
+    def _record_reply(self, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        arrived = time.monotonic()
+        chat_id = int(params["chat_id"])
+        reply_to = params.get("reply_to_message_id") or (params.get("reply_parameters") or {}).get("message_id")
+        with self._arrived:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+        if self.on_reply is not None:
+            self.on_reply(chat_id, reply_to, message_id, arrived)
+
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": self.bot_user(),
+        }
+        if name == "sendMessage":
+            message["text"] = str(params.get("text", ""))
+        else:
+            message["sticker"] = _sticker(str(params.get("sticker")))
+        return message
+
+
+def _sticker(file_id: str) -> Dict[str, Any]:
+    return {
+        "file_id": file_id,
+        "file_unique_id": file_id,
+        "type": "regular",
+        "width": 512,
+        "height": 512,
+        "is_animated": False,
+        "is_video": False,
+    }
+
+
+class FakeAI(FakeServer):
+    """The Workers-AI completion endpoint (POST <base>/<model>)."""
+
+    def endpoint(self, path: str, params: Dict[str, Any]) -> str:
+        return "completion"
+
+    def handle(self, method: str, path: str, params: Dict[str, Any]) -> Tuple[int, str, str]:
+        with self._lock:
+            reply = self._rng.choice(AI_REPLIES)
+        return 200, "application/json", json.dumps({"success": True, "result": {"response": reply}})
+
+
+class FakeTranslate(FakeServer):
+    """Google Translate's mobile page (GET ?sl=..&tl=..&q=..), which
+    deep-translator scrapes. Echoes the text back as the translation."""
+
+    def endpoint(self, path: str, params: Dict[str, Any]) -> str:
+        return "translate"
+
+    def error_response(self, endpoint: str) -> Tuple[int, str, str]:
+        return self.error_status, "text/html", "<html><body>Server Error</body></html>"
+
+    def handle(self, method: str, path: str, params: Dict[str, Any]) -> Tuple[int, str, str]:
+        text = html.escape(str(params.get("q", "")))
+        return 200, "text/html", f'<html><body><div class="result-container">{text}</div></body></html>'
@@ -0,0 +1,273 @@
+"""Drives the real PrincessSeleneBot against the local stand-ins.
+
+The bot runs exactly as in production - PTB long-polling getUpdates,
+the dispatcher, admission, the pipeline, worker threads for the blocking
+AI and translator clients, the outbound queue - only its upstream URLs
+point at the servers in loadtest.fakes.
+
+Simulated users are closed-loop: each sends a message, waits for the
+reply (or gives up after `reply_timeout`), thinks for an exponentially
+distributed while, and sends the next. Each has a language, and chats
+either privately or in one of a few shared groups, where it addresses
+the bot by name or by replying to one of its messages. Users run on
+their own thread and event loop, so generating load doesn't compete with
+the bot's loop.
+
+Reply latency is measured from the moment a message becomes available to
+getUpdates to the moment the reply reaches the fake Telegram.
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from benchmarks.corpus import CORPORA, MIX
+from loadtest.fakes import FakeAI, FakeServer, FakeTelegram, FakeTranslate, Latency
+
+BOT_TOKEN = "123456:LOADTEST"
+# getUpdates long-poll timeout the bot polls with.
+POLL_TIMEOUT = 10
+# Startup calls, not work caused by messages.
+_NOT_PER_MESSAGE = {"getMe", "deleteWebhook", "getUpdates"}
+
+
+@dataclass
+class LoadTestConfig:
+    users: int = 20
+    duration: float = 30.0
+    # Fraction of users who talk in groups rather than privately, and how
+    # many groups they are spread over.
+    group_share: float = 0.5
+    groups: int = 3
+    # Mean seconds a user waits after a reply before sending again.
+    think_time: float = 3.0
+    # Fraction of messages that are stickers instead of text.
+    sticker_share: float = 0.05
+    reply_timeout: float = 60.0
+    telegram_latency: str = "lognormal:0.04,0.3"
+    telegram_errors: float = 0.0
+    ai_latency: str = "lognormal:1.0,0.5"
+    ai_errors: float = 0.0
+    translate_latency: str = "lognormal:0.15,0.4"
+    translate_errors: float = 0.0
+    seed: int = 1
+
+
+class Simulation:
+    """The simulated users, and what they saw."""
+
+    def __init__(self, telegram: FakeTelegram, config: LoadTestConfig) -> None:
+        self.telegram = telegram
+        self.config = config
+        self.sent = 0
+        self.unanswered = 0
+        self.latencies: List[float] = []
+        self._pending: Dict[Tuple[int, int], "asyncio.Future[Tuple[float, int]]"] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def run(self) -> float:
+        """Run every user to the end of the test; returns the elapsed time."""
+        return asyncio.run(self._run())
+
+    async def _run(self) -> float:
+        self._loop = asyncio.get_running_loop()
+        self.telegram.on_reply = self._on_reply
+        started = time.monotonic()
+        stop_at = started + self.config.duration
+        rng = random.Random(self.config.seed)
+        await asyncio.gather(*(self._user(index, random.Random(rng.random()), stop_at) for index in range(self.config.users)))
+        self.telegram.on_reply = None
+        return time.monotonic() - started
+
+    def _on_reply(self, chat_id: int, reply_to: Optional[int], message_id: int, arrived: float) -> None:
+        self._loop.call_soon_threadsafe(self._resolve, chat_id, reply_to, message_id, arrived)
+
+    def _resolve(self, chat_id: int, reply_to: Optional[int], message_id: int, arrived: float) -> None:
+        future = self._pending.pop((chat_id, reply_to), None)
+        if future is not None and not future.done():
+            future.set_result((arrived, message_id))
+
+    async def _user(self, index: int, rng: random.Random, stop_at: float) -> None:
+        config = self.config
+        user = {"id": 1000 + index, "is_bot": False, "first_name": f"User{index}", "username": f"user{index}"}
+        in_group = rng.random() < config.group_share
+        if in_group:
+            group = rng.randrange(max(config.groups, 1))
+            chat = {"id": -1001000 - group, "type": "supergroup", "title": f"Group {group}"}
+        else:
+            chat = {"id": user["id"], "type": "private", "first_name": user["first_name"]}
+        language = rng.choices(list(MIX), list(MIX.values()))[0]
+        last_reply: Optional[int] = None
+
+        await asyncio.sleep(rng.uniform(0, config.think_time))
+        while time.monotonic() < stop_at:
+            reply_to = last_reply if in_group and last_reply is not None and rng.random() < 0.5 else None
+            if rng.random() < config.sticker_share and (not in_group or reply_to is not None):
+                message_id = self.telegram.push_sticker(chat, user, reply_to)
+            else:
+                text = rng.choice(CORPORA[language])
+                if in_group and reply_to is None:
+                    text = f"Selene, {text}"
+                message_id = self.telegram.push_message(chat, user, text, reply_to)
+            # No await since the push, so the reply can't have been missed.
+            sent_at = time.monotonic()
+            future = self._loop.create_future()
+            self._pending[(chat["id"], message_id)] = future
+            self.sent += 1
+
+            try:
+                arrived, last_reply = await asyncio.wait_for(future, config.reply_timeout)
+                self.latencies.append(arrived - sent_at)
+            except asyncio.TimeoutError:
+                self._pending.pop((chat["id"], message_id), None)
+                self.unanswered += 1
+            await asyncio.sleep(rng.expovariate(1 / config.think_time) if config.think_time else 0)
+
+
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(config: LoadTestConfig, simulation: Simulation, elapsed: float, servers: Dict[str, FakeServer]) -> Dict[str, Any]:
+    latencies = sorted(simulation.latencies)
+    sent = simulation.sent
+    upstream = {}
+    for service, server in servers.items():
+        for endpoint, count in sorted(server.calls.items()):
+            upstream[f"{service}.{endpoint}"] = {
+                "calls": count,
+                "injected_errors": server.errors[endpoint],
+                "per_message": round(count / sent, 3) if sent and endpoint not in _NOT_PER_MESSAGE else None,
+            }
+    return {
+        "config": asdict(config),
+        "elapsed_seconds": round(elapsed, 2),
+        "messages_sent": sent,
+        "replies": len(latencies),
+        "unanswered": simulation.unanswered,
+        "replies_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_seconds": {
+            name: round(value, 3) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 0.5)),
+                ("p95", percentile(latencies, 0.95)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", latencies[-1] if latencies else None),
+            )
+        },
+        "upstream": upstream,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report["latency_seconds"]
+    lines = [
+        f"{report['messages_sent']} messages in {report['elapsed_seconds']}s: "
+        f"{report['replies']} replies, {report['unanswered']} unanswered",
+        f"throughput  {report['replies_per_second']} replies/s",
+        "latency     " + "  ".join(f"{name} {value if value is not None else '-'}s" for name, value in latency.items()),
+        "",
+        f"{'upstream call':<32}{'calls':>8}{'errors':>8}{'per msg':>9}",
+    ]
+    for name, entry in report["upstream"].items():
+        per_message = "-" if entry["per_message"] is None else f"{entry['per_message']:.2f}"
+        lines.append(f"{name:<32}{entry['calls']:>8}{entry['injected_errors']:>8}{per_message:>9}")
+    return "\n".join(lines)
+
+
+def _point_bot_at(telegram: FakeTelegram, ai: FakeAI, translate: FakeTranslate) -> None:
+    # Settings are read once, when app.config is imported.
+    if "app.config" in sys.modules:
+        raise RuntimeError("Run the load test in a fresh interpreter: python -m loadtest")
+    os.environ.update(
+        {
+            "BOT_TOKEN": BOT_TOKEN,
+            "TELEGRAM_API_URL": f"{telegram.url}/bot",
+            "API_BASE_URL": f"{ai.url}/ai/run/",
+            "API_TOKEN": "loadtest",
+            "TRANSLATE_BASE_URL": f"{translate.url}/m",
+            # Never record synthetic traffic as if it were real.
+            "CAPTURE_PATH": "",
+        }
+    )
+    # The bot's per-message INFO lines would drown the report.
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+async def _serve_bot(simulation: Simulation) -> float:
+    from app.main import PrincessSeleneBot
+
+    bot = PrincessSeleneBot(BOT_TOKEN)
+    application = bot.application
+    # langdetect loads its profiles on first use; keep that out of the
+    # first user's latency.
+    bot.message_processor.translator.detect_language_code("warming up")
+    async with application:
+        await bot._on_startup(application)
+        await application.start()
+        await application.updater.start_polling(timeout=POLL_TIMEOUT)
+        try:
+            return await asyncio.to_thread(simulation.run)
+        finally:
+            await application.updater.stop()
+            await application.stop()
+
+
+def run_with_stand_ins(config: LoadTestConfig, make_simulation: Callable[[FakeTelegram], Simulation]) -> Dict[str, Any]:
+    """Start the stand-ins, run the bot against them while the simulation
+    `make_simulation` builds runs, and return the report. Needs a fresh
+    interpreter (see `_point_bot_at`)."""
+    servers = {
+        "telegram": FakeTelegram(Latency(config.telegram_latency), config.telegram_errors, config.seed),
+        "ai": FakeAI(Latency(config.ai_latency), config.ai_errors, config.seed + 1),
+        "translate": FakeTranslate(Latency(config.translate_latency), config.translate_errors, config.seed + 2),
+    }
+    for server in servers.values():
+        server.start()
+    try:
+        _point_bot_at(servers["telegram"], servers["ai"], servers["translate"])
+        simulation = make_simulation(servers["telegram"])
+        elapsed = asyncio.run(_serve_bot(simulation))
+        return summarize(config, simulation, elapsed, servers)
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+def run_load_test(config: LoadTestConfig) -> Dict[str, Any]:
+    """Run the bot under simulated users as `config` describes."""
+    return run_with_stand_ins(config, lambda telegram: Simulation(telegram, config))
+
+
+def latency_spec(value: str) -> str:
+    """argparse type for latency specs: validated, kept as the string."""
+    Latency(value)
+    return value
+
+
+def add_config_arguments(parser: argparse.ArgumentParser, names: Optional[Iterable[str]] = None) -> None:
+    """One --option per LoadTestConfig field (or just `names`)."""
+    defaults = LoadTestConfig()
+    for field in fields(LoadTestConfig):
+        if names is not None and field.name not in names:
+            continue
+        default = getattr(defaults, field.name)
+        parser.add_argument(
+            "--" + field.name.replace("_", "-"),
+            type=latency_spec if field.name.endswith("_latency") else type(default),
+            default=default,
+            help=f"default {default}",
+        )
+
+
+def config_from_args(args: argparse.Namespace) -> LoadTestConfig:
+    return LoadTestConfig(**{field.name: getattr(args, field.name) for field in fields(LoadTestConfig) if hasattr(args, field.name)})
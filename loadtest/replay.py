@@ -0,0 +1,144 @@
+"""python -m loadtest.replay CAPTURE [--speed X] [--ai-latency SPEC] ...
+
+Feeds a traffic capture (see app.services.capture) back into the bot
+against the local stand-ins, keeping the captured arrival times -
+compressed by --speed, so 10 replays an hour in six minutes, and 0 sends
+everything at once. The report is the load test's: throughput, reply
+latency percentiles and upstream calls per message, so two runs on the
+same capture compare a change on the same real workload.
+
+Unlike simulated users, captured group chatter mostly isn't addressed to
+the bot, so many messages are expected to go unanswered; every message
+is waited on for at most --reply-timeout seconds.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loadtest.fakes import BOT_ID, FakeTelegram
+from loadtest.harness import LoadTestConfig, Simulation, add_config_arguments, config_from_args, format_report, run_with_stand_ins
+
+
+class Replay(Simulation):
+    """Sends captured messages on their captured schedule instead of
+    simulating users."""
+
+    def __init__(self, telegram: FakeTelegram, config: LoadTestConfig, path: str, speed: float) -> None:
+        super().__init__(telegram, config)
+        # Only importable once the bot's settings point at the stand-ins.
+        from app.services.capture import read_capture
+
+        self.path = path
+        self.speed = speed
+        self.header, records = read_capture(path)
+        self.records = list(records)
+        if not self.records:
+            raise ValueError(f"{path} holds no messages")
+        username = _bot_username(self.records)
+        if username:
+            # Mentions of the real bot must still mention "this" bot.
+            telegram.bot_username = username
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "messages": len(self.records),
+            "captured_seconds": round(self.records[-1]["t"] - self.records[0]["t"], 1),
+            "redacted": self.header.get("redacted", False),
+            "speed": self.speed,
+        }
+
+    async def _run(self) -> float:
+        self._loop = asyncio.get_running_loop()
+        self.telegram.on_reply = self._on_reply
+        started = time.monotonic()
+        first = self.records[0]["t"]
+        waits = []
+        for record in self.records:
+            if self.speed > 0:
+                delay = started + (record["t"] - first) / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            message = _as_sent_to_fake(record["message"])
+            message_id = self.telegram.push_raw(message)
+            key = (message["chat"]["id"], message_id)
+            future = self._loop.create_future()
+            self._pending[key] = future
+            self.sent += 1
+            waits.append(asyncio.ensure_future(self._wait_for_reply(key, future, time.monotonic())))
+        await asyncio.gather(*waits)
+        self.telegram.on_reply = None
+        return time.monotonic() - started
+
+    async def _wait_for_reply(self, key: Tuple[int, int], future: "asyncio.Future[Tuple[float, int]]", sent_at: float) -> None:
+        try:
+            arrived, _ = await asyncio.wait_for(future, self.config.reply_timeout)
+            self.latencies.append(arrived - sent_at)
+        except asyncio.TimeoutError:
+            self._pending.pop(key, None)
+            self.unanswered += 1
+
+
+def _bot_username(records: List[Dict[str, Any]]) -> Optional[str]:
+    for record in records:
+        replied = record["message"].get("reply_to_message") or {}
+        sender = replied.get("from") or {}
+        if sender.get("is_bot") and sender.get("username"):
+            return sender["username"]
+    return None
+
+
+def _as_sent_to_fake(message: Dict[str, Any]) -> Dict[str, Any]:
+    # Captured bots keep their real id; the stand-in bot has its own.
+    message = dict(message)
+    if message.get("from", {}).get("is_bot"):
+        message["from"] = {**message["from"], "id": BOT_ID}
+    if "reply_to_message" in message:
+        message["reply_to_message"] = _as_sent_to_fake(message["reply_to_message"])
+    return message
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest.replay", description="Replay a traffic capture")
+    parser.add_argument("capture", help="a CAPTURE_PATH file")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression, default 1 (0 = no waiting)")
+    add_config_arguments(
+        parser,
+        [
+            "reply_timeout",
+            "telegram_latency",
+            "telegram_errors",
+            "ai_latency",
+            "ai_errors",
+            "translate_latency",
+            "translate_errors",
+            "seed",
+        ],
+    )
+    parser.add_argument("--output", help="also write the report here as JSON")
+    args = parser.parse_args(argv)
+
+    config = config_from_args(args)
+    replays: List[Replay] = []
+
+    def make_replay(telegram: FakeTelegram) -> Replay:
+        replays.append(Replay(telegram, config, args.capture, args.speed))
+        return replays[0]
+
+    try:
+        report = run_with_stand_ins(config, make_replay)
+    except ValueError as exc:
+        parser.error(str(exc))
+    report["capture"] = replays[0].describe()
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
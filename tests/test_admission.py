@@ -0,0 +1,98 @@
+"""Tests for the bounded admission queue and its load-shedding order."""
+import asyncio
+
+from app.services.admission import AdmissionController, Priority
+
+
+def test_admits_immediately_while_under_capacity():
+    async def scenario():
+        controller = AdmissionController(max_active=2, max_queue=4, max_wait_seconds=5)
+        assert await controller.acquire(Priority.GROUP_KEYWORD) is True
+        assert await controller.acquire(Priority.PRIVATE) is True
+        assert controller.active == 2
+        controller.release()
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_free_slot_goes_to_highest_priority_waiter():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=4, max_wait_seconds=5)
+        await controller.acquire(Priority.PRIVATE)
+
+        keyword = asyncio.create_task(controller.acquire(Priority.GROUP_KEYWORD))
+        private = asyncio.create_task(controller.acquire(Priority.PRIVATE))
+        await asyncio.sleep(0)
+
+        controller.release()
+        assert await private is True
+        assert not keyword.done()
+
+        controller.release()
+        assert await keyword is True
+        controller.release()
+
+    asyncio.run(scenario())
+
+
+def test_queue_overflow_sheds_group_keywords_before_replies_and_private():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=2, max_wait_seconds=5)
+        await controller.acquire(Priority.PRIVATE)
+
+        keyword = asyncio.create_task(controller.acquire(Priority.GROUP_KEYWORD))
+        await asyncio.sleep(0)
+        reply = asyncio.create_task(controller.acquire(Priority.GROUP_REPLY))
+        await asyncio.sleep(0)
+        private = asyncio.create_task(controller.acquire(Priority.PRIVATE))
+        await asyncio.sleep(0)
+
+        # Depth 3 > max_queue 2: the keyword trigger goes first.
+        assert await keyword is False
+        assert not reply.done() and not private.done()
+
+        another_private = asyncio.create_task(controller.acquire(Priority.PRIVATE))
+        await asyncio.sleep(0)
+        assert await reply is False
+
+        controller.release()
+        assert await private is True
+        controller.release()
+        assert await another_private is True
+        controller.release()
+
+        assert controller.shed_counts[Priority.GROUP_KEYWORD] == 1
+        assert controller.shed_counts[Priority.GROUP_REPLY] == 1
+        assert controller.shed_counts[Priority.PRIVATE] == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiting_too_long_gets_shed_even_without_new_traffic():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=10, max_wait_seconds=0.02)
+        await controller.acquire(Priority.PRIVATE)
+        assert await controller.acquire(Priority.GROUP_KEYWORD) is False
+        assert controller.stats()["shed"]["group_keyword"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=4, max_wait_seconds=5)
+        await controller.acquire(Priority.PRIVATE)
+        waiter = asyncio.create_task(controller.acquire(Priority.GROUP_REPLY))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert controller.queued == 0
+
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
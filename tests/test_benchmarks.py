@@ -0,0 +1,56 @@
+import json
+
+from benchmarks.__main__ import main
+from benchmarks.runner import compare, measure
+from benchmarks.suite import BENCHMARKS
+
+
+def _results(items_per_second, peak=100.0, retained=0.0):
+    return {
+        "results": {
+            "extract_reaction": {
+                "items_per_second": items_per_second,
+                "peak_bytes_per_item": peak,
+                "retained_bytes_per_item": retained,
+            }
+        }
+    }
+
+
+def test_every_benchmark_runs():
+    for benchmark in BENCHMARKS.values():
+        result = measure(benchmark, min_time=0.001, repeats=1, allocation_calls=1)
+        assert result["items_per_second"] > 0
+        assert result["peak_bytes_per_item"] >= 0
+
+
+def test_throughput_drop_past_threshold_is_a_regression():
+    assert compare(_results(900), _results(1000), threshold=0.15) == []
+    (regression,) = compare(_results(800), _results(1000), threshold=0.15)
+    assert regression.startswith("extract_reaction") and "-20.0%" in regression
+
+
+def test_allocation_growth_is_a_regression_above_the_noise_floor():
+    # Tiny figures jumping around are noise.
+    assert compare(_results(1000, peak=200), _results(1000, peak=50), threshold=0.15) == []
+    (regression,) = compare(_results(1000, peak=2000), _results(1000, peak=1000), threshold=0.15)
+    assert "peak_bytes_per_item" in regression
+    (regression,) = compare(_results(1000, retained=800), _results(1000, retained=0), threshold=0.15)
+    assert "retained_bytes_per_item" in regression
+
+
+def test_benchmarks_missing_from_the_baseline_are_skipped():
+    assert compare(_results(10), {"results": {}}, threshold=0.15) == []
+
+
+def test_cli_saves_then_compares_against_baseline(tmp_path):
+    output, baseline = tmp_path / "results.json", tmp_path / "baseline.json"
+    args = ["--filter", "extract_reaction", "--min-time", "0.001", "--repeats", "1"]
+    assert main(args + ["--output", str(output), "--baseline", str(baseline), "--save-baseline"]) == 0
+    assert json.loads(baseline.read_text())["results"].keys() == {"extract_reaction"}
+
+    # Pretend the baseline machine was impossibly fast.
+    saved = json.loads(baseline.read_text())
+    saved["results"]["extract_reaction"]["items_per_second"] *= 1000
+    baseline.write_text(json.dumps(saved))
+    assert main(args + ["--output", str(output), "--baseline", str(baseline)]) == 1
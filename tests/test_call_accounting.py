@@ -0,0 +1,121 @@
+"""Tests for per-update upstream call accounting, including the call
+budgets of a whole turn."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+from telegram import Bot, Update
+from telegram.request import HTTPXRequest
+
+from app.handlers.messages import MessageProcessor
+from app.services import translator as translator_module
+from app.services.call_accounting import STICKER_SET, CountingRequest, count_upstream_call, track_upstream_calls
+from app.services.health import AI, TELEGRAM, TRANSLATOR
+from app.services.outbound import OutboundScheduler
+
+
+def test_accounts_follow_tasks_and_threads_and_nest():
+    async def scenario():
+        with track_upstream_calls() as calls:
+            count_upstream_call(AI)
+            await asyncio.gather(
+                asyncio.create_task(asyncio.sleep(0, count_upstream_call(TELEGRAM))),
+                asyncio.to_thread(count_upstream_call, TRANSLATOR),
+            )
+            with track_upstream_calls() as inner:
+                count_upstream_call(TRANSLATOR)
+            assert inner is calls
+        # Counted after the update finished (say, a debounced turn): a
+        # fresh account, not the closed one.
+        with track_upstream_calls() as later:
+            count_upstream_call(AI)
+        return calls, later
+
+    calls, later = asyncio.run(scenario())
+    assert calls.counts == {AI: 1, TELEGRAM: 1, TRANSLATOR: 2}
+    assert later.counts == {AI: 1}
+    count_upstream_call(AI)  # outside any update: ignored
+
+
+def test_queued_sends_count_against_the_update_that_sent_them():
+    class FakeBot:
+        async def send_message(self, chat_id, **kwargs):
+            count_upstream_call(TELEGRAM)
+
+    async def turn(scheduler, chat_id, sends):
+        with track_upstream_calls() as calls:
+            for _ in range(sends):
+                await scheduler.send_message(FakeBot(), chat_id, text="x")
+        return calls
+
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, private_rate=1000, group_rate=1000)
+        return await asyncio.gather(turn(scheduler, 1, 1), turn(scheduler, 2, 3))
+
+    first, second = asyncio.run(scenario())
+    assert first[TELEGRAM] == 1 and second[TELEGRAM] == 3
+
+
+def _message(message_id, text, chat_id=555):
+    return {
+        "message_id": message_id,
+        "date": 1700000000,
+        "chat": {"id": chat_id, "type": "private", "first_name": "Abebe"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Abebe", "username": "abebe"},
+        "text": text,
+    }
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """Runs one private message through the real pipeline, with the AI,
+    the translator and the Bot API answered locally, and returns its
+    call counts."""
+    endpoints = []
+
+    async def bot_api(self, url, method, *args, **kwargs):
+        endpoints.append(url.rsplit("/", 1)[-1])
+        return 200, json.dumps({"ok": True, "result": _message(1000 + len(endpoints), "reply")}).encode()
+
+    def ai_answer(*args, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"success": True, "result": {"response": "I'm fine, thanks!\nREACT: NONE"}}).encode()
+        return response
+
+    monkeypatch.setattr(HTTPXRequest, "do_request", bot_api)
+    monkeypatch.setattr(translator_module._TimedGoogleTranslator, "translate", lambda self, text, **kwargs: text)
+    processor = MessageProcessor()
+    monkeypatch.setattr(processor.ai_client.session, "post", ai_answer)
+    bot = Bot("123:TEST", request=CountingRequest())
+
+    def run(text):
+        update = Update.de_json({"update_id": 1, "message": _message(1, text)}, bot)
+
+        async def scenario():
+            with track_upstream_calls() as calls:
+                await processor.process_message(update, SimpleNamespace(bot=bot), "private")
+            return calls
+
+        calls = asyncio.run(scenario())
+        assert "sendMessage" in endpoints
+        return calls
+
+    return run
+
+
+def test_english_dm_budget(turn):
+    calls = turn("Hey, how are you doing today? I hope work went well.")
+    assert calls[AI] <= 1
+    assert calls[TRANSLATOR] == 0
+    assert calls[TELEGRAM] == 1 and calls[STICKER_SET] == 0
+
+
+def test_amharic_dm_budget(turn):
+    # The message, the history (here just the message) and the reply.
+    calls = turn("ሰላም እንዴት ነሽ ዛሬ")
+    assert calls[AI] <= 1
+    assert calls[TRANSLATOR] == 3
+    assert calls[TELEGRAM] == 1
@@ -0,0 +1,142 @@
+import asyncio
+import gzip
+import json
+import subprocess
+import sys
+from types import SimpleNamespace
+
+from telegram import Update
+
+from app.services.capture import Anonymizer, TrafficRecorder, read_capture
+from app.services.dispatcher import ChatOrderedUpdateProcessor
+
+BOT = SimpleNamespace(id=99, username="SeleneBot")
+
+
+def _message(text, user_id=4242, chat_id=-1001234, reply_to_bot=False):
+    message = {
+        "message_id": 7,
+        "date": 1700000000,
+        "chat": {"id": chat_id, "type": "supergroup", "title": "Secret club"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Abebe", "last_name": "K", "username": "abebe", "language_code": "am"},
+        "text": text,
+        "entities": [{"type": "mention", "offset": 0, "length": 10, "user": {"id": 1, "is_bot": False, "first_name": "x"}}],
+    }
+    if reply_to_bot:
+        message["reply_to_message"] = {
+            "message_id": 6,
+            "date": 1700000000,
+            "chat": message["chat"],
+            "from": {"id": BOT.id, "is_bot": True, "first_name": "Selene", "username": BOT.username},
+            "text": "earlier",
+        }
+    return message
+
+
+def _update(update_id, text="hey selene", **kwargs):
+    update = Update.de_json({"update_id": update_id, "message": _message(text, **kwargs)}, None)
+    update.message.set_bot(BOT)
+    update.set_bot(BOT)
+    return update
+
+
+def test_ids_are_hashed_consistently_and_personal_fields_dropped():
+    anonymizer = Anonymizer(b"salt")
+    first = anonymizer.message(_message("hi", reply_to_bot=True))
+    again = anonymizer.message(_message("hello"))
+
+    assert first["from"]["id"] == again["from"]["id"] != 4242
+    assert first["chat"] == {"id": again["chat"]["id"], "type": "supergroup"}
+    assert first["chat"]["id"] < 0
+    assert first["from"]["language_code"] == "am"
+    assert "Abebe" not in json.dumps(first) and "abebe" not in json.dumps(first)
+    assert "Secret club" not in json.dumps(first)
+    assert first["entities"] == [{"type": "mention", "offset": 0, "length": 10}]
+    # Replies to the bot stay replies to the bot.
+    assert first["reply_to_message"]["from"]["id"] == BOT.id
+
+    assert Anonymizer(b"other").message(_message("hi"))["from"]["id"] != first["from"]["id"]
+    # A private chat is the user's id on both sides.
+    private = anonymizer.message(_message("hi", chat_id=4242))
+    assert private["chat"]["id"] == private["from"]["id"]
+
+
+def test_redaction_keeps_shape_triggers_pet_names_and_mentions():
+    anonymizer = Anonymizer(b"salt", redact_text=True)
+    text = "@SeleneBot Hey Selene baby, call 0911 ሰላም እንዴት ነሽ 😂!"
+    redacted = anonymizer.redact(text, -1001234, BOT.username)
+
+    assert redacted == "@SeleneBot Xxx Selene baby, xxxx 0000 ሀሀሀ ሀሀሀሀ ሀሀ 😂!"
+    assert len(redacted.encode("utf-16-le")) == len(text.encode("utf-16-le"))
+    assert anonymizer.message(_message(text))["text"] == anonymizer.redact(text, -1001234)
+
+
+def test_recorder_round_trip_and_truncated_capture(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    recorder = TrafficRecorder(str(path), salt="s", redact_text=True, flush_interval=60)
+    recorder.record(_update(1, "hey selene"))
+    recorder.record(_update(2, "my love, where are you", reply_to_bot=True))
+    recorder.record(SimpleNamespace(update_id=3))  # not an Update: ignored
+    recorder.close()
+
+    header, records = read_capture(str(path))
+    records = list(records)
+    assert header["capture"] == 1 and header["redacted"] is True
+    assert [record["update_id"] for record in records] == [1, 2]
+    assert records[0]["message"]["text"] == "xxx selene"
+    assert records[1]["message"]["text"] == "my love, xxxxx xxx xxx"
+    assert records[0]["t"] <= records[1]["t"]
+
+    # A second process appending to the same file, cut short by a crash.
+    with gzip.open(path, "at", encoding="utf-8") as capture:
+        capture.write(json.dumps({"capture": 1, "started": 0, "redacted": False}) + "\n")
+        capture.write(json.dumps({"t": 1, "update_id": 9, "message": records[0]["message"]}) + "\n")
+    data = path.read_bytes()
+    path.write_bytes(data[:-6])
+    _, records = read_capture(str(path))
+    assert [record["update_id"] for record in records][:2] == [1, 2]
+
+
+def test_dispatcher_reports_received_updates_once():
+    received = []
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_running=2, on_received=lambda u: received.append(u.update_id))
+        await processor.initialize()
+
+        async def handler():
+            return None
+
+        await processor.process_update(_update(5), handler())
+        await processor.process_update(_update(5), handler())
+
+    asyncio.run(scenario())
+    assert received == [5]
+
+
+def test_replay_feeds_a_capture_through_the_bot(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    recorder = TrafficRecorder(str(path), salt="s", flush_interval=60)
+    for update_id, text in enumerate(["hey selene", "selene, tell me a joke", "just chatting"], start=1):
+        recorder.record(_update(update_id, text, user_id=100 + update_id))
+    recorder.record(_update(4, "thanks", user_id=101, reply_to_bot=True))
+    recorder.close()
+
+    output = tmp_path / "report.json"
+    result = subprocess.run(
+        [
+            sys.executable, "-m", "loadtest.replay", str(path),
+            # One group chat: replies go out a few seconds apart.
+            "--speed", "0", "--reply-timeout", "20",
+            "--ai-latency", "0.05", "--translate-latency", "0.01", "--telegram-latency", "0",
+            "--output", str(output),
+        ],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(output.read_text())
+    assert report["capture"]["messages"] == 4
+    # Trigger words and the reply to the bot are answered; plain chatter isn't.
+    assert report["replies"] == 3 and report["unanswered"] == 1
@@ -0,0 +1,120 @@
+"""Tests for per-update deadlines and how the AI client, translator and
+pipeline honor them."""
+import asyncio
+import socket
+import time
+
+import requests
+
+from app.services.ai_client import AIClient, APIConfig
+from app.services.deadline import Deadline
+from app.services.pipeline import ErrorPolicy, Pipeline, Stage
+from app.services.translator import TranslationService
+
+
+class TimingOutSession:
+    """Stands in for requests.Session: records each timeout and times out."""
+
+    def __init__(self):
+        self.timeouts = []
+
+    def post(self, url, json=None, timeout=None):
+        self.timeouts.append(timeout)
+        raise requests.exceptions.Timeout()
+
+
+def _client(session, **config):
+    client = AIClient(APIConfig(token="test", fallback_message="fallback", **config))
+    client.session = session
+    return client
+
+
+def test_deadline_clamps_and_expires():
+    deadline = Deadline.after(0.05)
+    assert deadline.clamp(10) <= 0.05
+    assert deadline.clamp(None) <= 0.05
+    assert not deadline.expired()
+    time.sleep(0.06)
+    assert deadline.expired()
+    assert deadline.clamp(10) == 0
+    # Counted from when the update arrived, not from now.
+    assert Deadline.after(0.05, start=time.monotonic() - 0.06).expired()
+
+
+def test_ai_attempt_timeout_shrinks_to_remaining_budget():
+    session = TimingOutSession()
+    client = _client(session, timeout=30, max_retries=1)
+
+    assert client.get_response("hi", Deadline.after(2)) == "fallback"
+    assert len(session.timeouts) == 1
+    assert session.timeouts[0] <= 2
+
+
+def test_ai_does_not_retry_when_backoff_exceeds_budget():
+    session = TimingOutSession()
+    client = _client(session, timeout=30, max_retries=3, retry_delay=5)
+
+    started = time.monotonic()
+    assert client.get_response("hi", Deadline.after(1)) == "fallback"
+    assert len(session.timeouts) == 1
+    assert time.monotonic() - started < 1
+
+
+def test_ai_makes_no_request_once_expired():
+    session = TimingOutSession()
+    client = _client(session)
+
+    assert client.get_response("hi", Deadline.after(0)) == "fallback"
+    assert session.timeouts == []
+
+
+def test_translator_leaves_text_alone_once_expired():
+    class ExplodingTranslator:
+        def translate(self, text, timeout=None):
+            raise AssertionError("should not be called")
+
+    service = TranslationService()
+    assert service._translate_guarded("hello there", ExplodingTranslator(), "am", Deadline.after(0)) == "hello there"
+
+
+def test_translator_that_never_answers_gives_up_within_the_budget():
+    from app.services.translator import _TimedGoogleTranslator
+
+    # Accepts connections (the kernel does, through the backlog) but never
+    # answers them.
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        translator = _TimedGoogleTranslator("en", "am", f"http://127.0.0.1:{server.getsockname()[1]}/m")
+        started = time.monotonic()
+        result = TranslationService()._translate_chunk("hello there", translator, Deadline.after(0.3))
+
+    assert result == "hello there"
+    assert time.monotonic() - started < 1
+
+
+def test_expired_deadline_skips_stage_to_fallback():
+    ran = []
+
+    async def slow(results):
+        ran.append(True)
+        return "real"
+
+    pipeline = Pipeline(
+        [Stage("slow", slow, timeout=5, on_error=ErrorPolicy.FALLBACK, fallback=lambda r: "fallback")]
+    )
+    outcome = asyncio.run(pipeline.run({}, Deadline.after(0)))
+
+    assert outcome.results["slow"] == "fallback"
+    assert ran == []
+
+
+def test_min_timeout_still_lets_stage_run_past_deadline():
+    async def quick(results):
+        await asyncio.sleep(0.01)
+        return "sent"
+
+    pipeline = Pipeline([Stage("send", quick, timeout=5, min_timeout=1)])
+    outcome = asyncio.run(pipeline.run({}, Deadline.after(0)))
+
+    assert outcome.results["send"] == "sent"
@@ -0,0 +1,57 @@
+"""Tests for merging rapid-fire items into one debounced batch."""
+import asyncio
+
+from app.services.debounce import Debouncer
+
+
+def test_burst_is_merged_into_one_call():
+    calls = []
+
+    async def callback(batch):
+        calls.append(list(batch.items))
+
+    async def scenario():
+        debouncer = Debouncer(0.03, callback)
+        for text in ("hey", "babe", "you there?"):
+            debouncer.submit("user", text)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.06)
+        assert debouncer.pending == 0
+
+    asyncio.run(scenario())
+    assert calls == [["hey", "babe", "you there?"]]
+
+
+def test_keys_are_debounced_independently():
+    calls = []
+
+    async def callback(batch):
+        calls.append(tuple(batch.items))
+
+    async def scenario():
+        debouncer = Debouncer(0.01, callback)
+        debouncer.submit("a", 1)
+        debouncer.submit("b", 2)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert sorted(calls) == [(1,), (2,)]
+
+
+def test_started_batch_is_never_cancelled_by_a_later_item():
+    finished = []
+
+    async def callback(batch):
+        await asyncio.sleep(0.03)
+        finished.append(list(batch.items))
+
+    async def scenario():
+        debouncer = Debouncer(0.01, callback)
+        debouncer.submit("user", "hey")
+        await asyncio.sleep(0.02)  # first batch is now mid-callback
+        debouncer.submit("user", "babe")
+        await asyncio.sleep(0.08)
+
+    asyncio.run(scenario())
+    # The started turn ran to the end; the late item got its own.
+    assert finished == [["hey"], ["babe"]]
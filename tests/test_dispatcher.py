@@ -0,0 +1,225 @@
+"""Tests for per-chat ordered, cross-chat concurrent update processing."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.services.dispatcher import ChatOrderedUpdateProcessor, RecentUpdateIds, update_received_at
+
+
+def _update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+
+async def _run_all(processor, jobs):
+    await processor.initialize()
+    await asyncio.gather(*(processor.process_update(update, coro) for update, coro in jobs))
+
+
+def test_same_chat_updates_run_in_arrival_order():
+    finished = []
+
+    async def handle(update_id, delay):
+        await asyncio.sleep(delay)
+        finished.append(update_id)
+
+    processor = ChatOrderedUpdateProcessor(max_running=4, max_pending=16)
+    # The first update is the slowest - without per-chat ordering it would
+    # finish last.
+    jobs = [(_update(i, 1), handle(i, delay)) for i, delay in ((1, 0.05), (2, 0.01), (3, 0.0))]
+    asyncio.run(_run_all(processor, jobs))
+
+    assert finished == [1, 2, 3]
+
+
+def test_different_chats_run_concurrently():
+    running = 0
+    peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    processor = ChatOrderedUpdateProcessor(max_running=3, max_pending=16)
+    jobs = [(_update(i, chat_id=i), handle()) for i in range(6)]
+    asyncio.run(_run_all(processor, jobs))
+
+    assert peak == 3
+
+
+def test_out_of_order_completion_across_chats_is_not_dropped():
+    """Regression test for the old global `_last_update_id` check: an
+    update from chat B that finishes after a *later* update from chat A
+    must still be handled, not treated as stale."""
+    handled = []
+
+    async def handle(update_id, delay):
+        await asyncio.sleep(delay)
+        handled.append(update_id)
+
+    processor = ChatOrderedUpdateProcessor(max_running=4, max_pending=16)
+    jobs = [(_update(10, 1), handle(10, 0.03)), (_update(11, 2), handle(11, 0.0))]
+    asyncio.run(_run_all(processor, jobs))
+
+    assert sorted(handled) == [10, 11]
+
+
+def test_exact_duplicate_update_id_is_suppressed():
+    handled = []
+
+    async def handle(update_id):
+        handled.append(update_id)
+
+    processor = ChatOrderedUpdateProcessor(max_running=2, max_pending=8)
+    jobs = [(_update(5, 1), handle(5)), (_update(5, 1), handle(5)), (_update(4, 1), handle(4))]
+    asyncio.run(_run_all(processor, jobs))
+
+    assert handled == [5, 4]
+    assert processor.duplicates_dropped == 1
+
+
+def test_chat_bookkeeping_is_released_after_processing():
+    async def handle():
+        await asyncio.sleep(0)
+
+    processor = ChatOrderedUpdateProcessor(max_running=2, max_pending=8)
+    asyncio.run(_run_all(processor, [(_update(i, 1), handle()) for i in range(3)]))
+
+    assert processor.active_chats == 0
+
+
+def test_recent_update_ids_is_bounded():
+    seen = RecentUpdateIds(capacity=2)
+    assert seen.add(1) is True
+    assert seen.add(2) is True
+    assert seen.add(1) is False
+    seen.add(3)  # evicts 1
+    assert len(seen) == 2
+    assert seen.add(1) is True
+    assert list(seen.store()) == [3, 1]
+
+
+def test_a_busy_chat_does_not_hold_other_chats_pending_slots():
+    started = {}
+
+    async def handle(update_id, delay=0.0):
+        started[update_id] = asyncio.get_running_loop().time()
+        await asyncio.sleep(delay)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_running=64, max_pending=8)
+        await processor.initialize()
+        began = asyncio.get_running_loop().time()
+        busy = [asyncio.create_task(processor.process_update(_update(1, -1), handle(1, 0.5)))]
+        busy += [asyncio.create_task(processor.process_update(_update(i, -1), handle(i))) for i in range(2, 11)]
+        await asyncio.sleep(0.01)
+        assert processor.queued == 9
+        await asyncio.wait_for(processor.process_update(_update(99, 5), handle(99)), 0.3)
+        await asyncio.gather(*busy)
+        return began
+
+    began = asyncio.run(scenario())
+    assert started[99] - began < 0.3
+    # The busy chat's updates still ran one after another, in order.
+    assert [update_id for update_id in started if update_id != 99] == list(range(1, 11))
+
+
+def test_overflowing_chat_queue_drops_newest_updates():
+    handled, finished = [], []
+
+    async def handle(update_id):
+        await asyncio.sleep(0.01)
+        handled.append(update_id)
+
+    processor = ChatOrderedUpdateProcessor(
+        max_running=4, max_pending=8, on_finished=lambda u: finished.append(u.update_id), max_queued_per_chat=2
+    )
+    asyncio.run(_run_all(processor, [(_update(i, 1), handle(i)) for i in range(1, 6)]))
+
+    assert handled == [1, 2, 3]
+    assert processor.overflow_dropped == 2
+    # Dropped updates count as done, so the journal doesn't replay them.
+    assert sorted(finished) == [1, 2, 3, 4, 5]
+
+
+def test_follow_up_work_runs_in_chat_order_without_finishing_again():
+    handled, finished = [], []
+
+    async def handle(name, delay=0.0):
+        await asyncio.sleep(delay)
+        handled.append(name)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(
+            max_running=4, max_pending=8, on_finished=lambda u: finished.append(u.update_id)
+        )
+        await processor.initialize()
+        first = asyncio.create_task(processor.process_update(_update(1, 1), handle(1, 0.03)))
+        await asyncio.sleep(0)
+        # Say, a debounced turn for update 1, sent while update 1 is still
+        # running and before update 2 arrives.
+        await asyncio.gather(
+            processor.run_in_chat(_update(1, 1), handle("turn")),
+            processor.process_update(_update(2, 1), handle(2)),
+            first,
+        )
+
+    asyncio.run(scenario())
+    assert handled == [1, "turn", 2]
+    assert finished == [1, 2]
+
+
+def test_updates_no_handler_takes_are_finished_without_waiting_for_their_chat():
+    handled, received, finished = [], [], []
+
+    async def handle(update_id, delay=0.0):
+        await asyncio.sleep(delay)
+        handled.append(update_id)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(
+            max_running=4,
+            max_pending=8,
+            on_finished=lambda u: finished.append(u.update_id),
+            on_received=lambda u: received.append(u.update_id),
+            accepts=lambda u: u.update_id != 2,
+        )
+        await processor.initialize()
+        busy = asyncio.create_task(processor.process_update(_update(1, 1), handle(1, 0.05)))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(processor.process_update(_update(2, 1), handle(2)), 0.01)
+        assert finished == [2] and processor.queued == 0
+        await busy
+        return processor
+
+    processor = asyncio.run(scenario())
+    assert handled == [1]
+    # Still recorded: a traffic capture wants the ignored chatter too.
+    assert received == [1, 2]
+    assert finished == [2, 1]
+    assert processor.ignored == 1
+
+
+def test_handlers_see_when_their_update_arrived_not_when_it_started():
+    arrived = {}
+
+    async def handle(update_id, delay=0.0):
+        arrived[update_id] = update_received_at()
+        await asyncio.sleep(delay)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_running=4, max_pending=8)
+        await processor.initialize()
+        began = time.monotonic()
+        await asyncio.gather(
+            processor.process_update(_update(1, 1), handle(1, 0.05)),
+            processor.process_update(_update(2, 1), handle(2)),
+        )
+        return began
+
+    began = asyncio.run(scenario())
+    # Update 2 waited 50ms behind update 1; that wait was on its clock.
+    assert arrived[2] - began < 0.02
+    assert update_received_at() is None
@@ -0,0 +1,126 @@
+"""Tests for deficit round-robin scheduling of upstream calls."""
+import asyncio
+import threading
+import time
+
+from app.services.fair_scheduler import FairScheduler, FlowKey
+
+
+async def _queue_calls(scheduler, flows, order):
+    """Queue one call per entry in `flows` behind a busy scheduler, then
+    release the blocker and record the order calls are granted in."""
+    blocker = FlowKey("blocker", "blocker")
+    await scheduler.acquire(blocker)
+
+    async def call(flow, tag):
+        await scheduler.acquire(flow)
+        order.append(tag)
+        scheduler.release(flow)
+
+    tasks = [asyncio.create_task(call(flow, tag)) for flow, tag in flows]
+    await asyncio.sleep(0)
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+
+
+def test_flooding_chat_does_not_starve_a_quiet_one():
+    order = []
+    noisy = FlowKey("group", "spammer")
+    quiet = FlowKey("dm", "median-user")
+    flows = [(noisy, f"noisy{i}") for i in range(5)] + [(quiet, "quiet")]
+
+    asyncio.run(_queue_calls(FairScheduler(capacity=1, per_user_limit=5, starvation_seconds=60), flows, order))
+
+    # Round-robin: the quiet chat's single call goes second, not sixth.
+    assert order.index("quiet") == 1
+
+
+def test_weights_give_private_chats_a_larger_share():
+    order = []
+    group = FlowKey("group", "a", weight=1)
+    private = FlowKey("dm", "b", weight=3)
+    flows = [(group, "g")] * 4 + [(private, "p")] * 4
+
+    asyncio.run(_queue_calls(FairScheduler(capacity=1, per_user_limit=10, starvation_seconds=60), flows, order))
+
+    assert order[:4] == ["g", "p", "p", "p"]
+
+
+def test_per_user_cap_limits_concurrent_calls():
+    async def scenario():
+        scheduler = FairScheduler(capacity=4, per_user_limit=2, starvation_seconds=60)
+        running = 0
+        peak = 0
+
+        async def call(chat_id):
+            nonlocal running, peak
+            flow = FlowKey(chat_id, "same-user")
+            await scheduler.acquire(flow)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            scheduler.release(flow)
+
+        # Same user across several chats still can't exceed the cap.
+        await asyncio.gather(*(call(chat_id) for chat_id in range(6)))
+        return peak, scheduler
+
+    peak, scheduler = asyncio.run(scenario())
+    assert peak == 2
+    assert scheduler.in_service == 0
+    assert scheduler.queued == 0
+
+
+def test_run_executes_blocking_function_in_a_thread():
+    scheduler = FairScheduler(capacity=2, per_user_limit=2, starvation_seconds=60)
+    result = asyncio.run(scheduler.run(FlowKey(1, 1), lambda a, b: a + b, 2, 3))
+    assert result == 5
+    assert scheduler.stats()["granted_total"] == 1
+
+
+def test_cancelled_callers_keep_their_slot_until_the_thread_returns():
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def blocking_call():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    async def scenario():
+        scheduler = FairScheduler(capacity=2, per_user_limit=5, starvation_seconds=60)
+        for chat_id in range(5):
+            call = scheduler.run(FlowKey(chat_id, chat_id), blocking_call)
+            # The caller times out, but its thread runs on regardless.
+            try:
+                await asyncio.wait_for(call, 0.01)
+            except asyncio.TimeoutError:
+                pass
+        while scheduler.in_service or scheduler.queued:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.06)
+
+    asyncio.run(scenario())
+    assert peak <= 2
+
+
+def test_long_waits_are_counted_as_starved():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1, per_user_limit=1, starvation_seconds=0.01)
+        first = FlowKey("a", "a")
+        await scheduler.acquire(first)
+        waiting = asyncio.create_task(scheduler.acquire(FlowKey("b", "b")))
+        await asyncio.sleep(0.03)
+        scheduler.release(first)
+        await waiting
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["starved_total"] == 1
+    assert stats["max_wait_seconds"] >= 0.01
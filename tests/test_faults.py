@@ -0,0 +1,124 @@
+"""Tests for fault injection: rule parsing, repeatable draws, and how each
+client sees an injected fault."""
+import asyncio
+import dataclasses
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from telegram.error import NetworkError
+
+from app.health import admin, api
+from app.services import faults
+from app.services.ai_client import AIClient, APIConfig, APIErrorType
+from app.services.faults import FaultInjectingRequest, FaultInjector, FaultRule, parse_fault_rules
+from app.services.health import AI, TELEGRAM, TRANSLATOR
+from app.services.translator import TranslationService
+
+
+@pytest.fixture
+def injector(monkeypatch):
+    injector = FaultInjector(seed="test")
+    monkeypatch.setattr(faults, "_injector", injector)
+    return injector
+
+
+def test_rules_are_validated():
+    rules = parse_fault_rules('{"ai": {"error_rate": 0.2, "status": 429}, "telegram": {"delay_seconds": 1}}')
+    assert rules[AI] == FaultRule(error_rate=0.2, status=429)
+    assert rules[TELEGRAM].delay_seconds == 1.0
+    assert parse_fault_rules("") == {}
+
+    for bad in (
+        '{"ai": {"error_rate": 1.5}}',
+        '{"ai": {"error_rate": 0.6, "drop_rate": 0.6}}',
+        '{"ai": {"status": 200}}',
+        '{"ai": {"eror_rate": 0.1}}',
+        '{"database": {}}',
+        '["ai"]',
+    ):
+        with pytest.raises(ValueError):
+            parse_fault_rules(bad)
+
+
+def test_seeded_draws_repeat_and_follow_the_rates():
+    rule = FaultRule(error_rate=0.2, drop_rate=0.1, empty_rate=0.1, delay_seconds=0.5, delay_rate=0.5)
+
+    def draws():
+        injector = FaultInjector({AI: rule}, seed="same")
+        return [injector.draw(AI) for _ in range(2000)]
+
+    first = draws()
+    assert first == draws()
+    kinds = [fault.kind for fault in first if fault is not None]
+    assert 300 < kinds.count("error") < 500
+    assert 100 < kinds.count("drop") < 300
+    assert 800 < sum(1 for fault in first if fault is not None and fault.delay) < 1200
+    # Dependencies without a rule are never touched.
+    assert FaultInjector({AI: rule}).draw(TRANSLATOR) is None
+
+
+def test_ai_client_sees_real_looking_failures(injector, monkeypatch):
+    client = AIClient(APIConfig(token="test", timeout=0.05, max_retries=1))
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: pytest.fail("should not reach the network"))
+
+    expected = [
+        (FaultRule(error_rate=1, status=429), APIErrorType.RATE_LIMIT_ERROR),
+        (FaultRule(error_rate=1, status=502), APIErrorType.SERVER_ERROR),
+        (FaultRule(drop_rate=1), APIErrorType.NETWORK_ERROR),
+        (FaultRule(empty_rate=1), APIErrorType.INVALID_RESPONSE),
+        (FaultRule(delay_seconds=1), APIErrorType.TIMEOUT_ERROR),
+    ]
+    errors_before = injector.stats()[AI]["error"]
+    for rule, error_type in expected:
+        injector.set_rule(AI, rule)
+        assert client._send_request("hi", None).error_type == error_type
+    assert injector.stats()[AI]["error"] == errors_before + 2
+
+
+def test_translator_falls_back_on_injected_faults(injector):
+    service = TranslationService()
+
+    class Translator:
+        def translate(self, text, timeout=None):
+            return text.upper()
+
+    for rule in (FaultRule(error_rate=1, status=429), FaultRule(drop_rate=1), FaultRule(empty_rate=1)):
+        injector.set_rule(TRANSLATOR, rule)
+        assert service._translate_chunk("selam", Translator()) == "selam"
+    injector.set_rule(TRANSLATOR, None)
+    assert service._translate_chunk("selam", Translator()) == "SELAM"
+
+
+def test_telegram_request_answers_like_the_bot_api(injector):
+    request = FaultInjectingRequest()
+
+    async def scenario():
+        injector.set_rule(TELEGRAM, FaultRule(error_rate=1, status=429))
+        status, body = await request.do_request("https://example.invalid/sendMessage", "POST")
+        injector.set_rule(TELEGRAM, FaultRule(drop_rate=1))
+        with pytest.raises(NetworkError):
+            await request.do_request("https://example.invalid/sendMessage", "POST")
+        return status, json.loads(body)
+
+    status, body = asyncio.run(scenario())
+    assert status == 429
+    assert body["ok"] is False and body["parameters"]["retry_after"] == 1
+
+
+def test_fault_endpoints(injector, monkeypatch):
+    monkeypatch.setattr(admin, "settings", dataclasses.replace(admin.settings, admin_token="t0ken"))
+    client = TestClient(api.app)
+    headers = {"Authorization": "Bearer t0ken"}
+
+    assert client.get("/admin/faults").status_code == 403
+    response = client.put("/admin/faults/ai", json={"error_rate": 0.5, "status": 503}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["rules"][AI]["error_rate"] == 0.5
+    assert client.put("/admin/faults/ai", json={"error_rate": 2}, headers=headers).status_code == 400
+    assert client.put("/admin/faults/database", json={}, headers=headers).status_code == 404
+
+    client.put("/admin/faults/telegram", json={"drop_rate": 0.1}, headers=headers)
+    assert client.delete("/admin/faults/ai", headers=headers).json()["rules"] == {TELEGRAM: injector.rules()[TELEGRAM]}
+    assert client.delete("/admin/faults", headers=headers).json()["rules"] == {}
+    assert set(client.get("/admin/faults", headers=headers).json()["injected"]) == {AI, TRANSLATOR, TELEGRAM}
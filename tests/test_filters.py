@@ -0,0 +1,87 @@
+"""Tests for the pre-dispatch group/sticker filters and trigger matching."""
+from types import SimpleNamespace
+
+from telegram import Update
+
+from app.handlers.filters import (
+    GROUP_TEXT_FOR_BOT,
+    STICKER_FOR_BOT,
+    TriggerMatcher,
+    TriggerMatchers,
+    is_for_bot,
+    parse_chat_keywords,
+)
+
+BOT = SimpleNamespace(id=99, username="SeleneBot")
+
+
+def _update(text=None, chat_type="supergroup", reply_to_bot=False, sticker=False):
+    message = {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": -100 if chat_type != "private" else 5, "type": chat_type},
+        "from": {"id": 5, "is_bot": False, "first_name": "Abebe"},
+    }
+    if text is not None:
+        message["text"] = text
+    if sticker:
+        message["sticker"] = {
+            "file_id": "f",
+            "file_unique_id": "u",
+            "width": 1,
+            "height": 1,
+            "is_animated": False,
+            "is_video": False,
+            "type": "regular",
+        }
+    if reply_to_bot:
+        message["reply_to_message"] = {
+            "message_id": 0,
+            "date": 0,
+            "chat": message["chat"],
+            "from": {"id": BOT.id, "is_bot": True, "first_name": "Selene"},
+            "text": "earlier",
+        }
+    update = Update.de_json({"update_id": 1, "message": message}, None)
+    update.message.set_bot(BOT)
+    return update
+
+
+def test_keywords_match_whole_words_only():
+    matcher = TriggerMatcher(["fun", "how are you"])
+    assert matcher.matches("That was FUN!")
+    assert not matcher.matches("Sad news about the funeral")
+    assert matcher.matches("hey, how   are you?")
+    assert not matcher.matches("somehow are youthful")
+
+
+def test_per_chat_keywords_replace_the_defaults():
+    matchers = TriggerMatchers(["selene"], parse_chat_keywords('{"-100": ["queen"]}'))
+    assert matchers.matches(-100, "long live the queen")
+    assert not matchers.matches(-100, "hi selene")
+    assert matchers.matches(-200, "hi selene")
+
+
+def test_group_noise_is_filtered_before_dispatch():
+    assert not GROUP_TEXT_FOR_BOT.check_update(_update("just chatting among ourselves"))
+    assert GROUP_TEXT_FOR_BOT.check_update(_update("tell us a joke"))
+    assert GROUP_TEXT_FOR_BOT.check_update(_update("hey @selenebot"))
+    assert GROUP_TEXT_FOR_BOT.check_update(_update("no keywords here", reply_to_bot=True))
+    assert not GROUP_TEXT_FOR_BOT.check_update(_update("a joke", chat_type="private"))
+
+
+def test_stickers_only_in_dms_or_as_replies_to_the_bot():
+    assert STICKER_FOR_BOT.check_update(_update(chat_type="private", sticker=True))
+    assert STICKER_FOR_BOT.check_update(_update(sticker=True, reply_to_bot=True))
+    assert not STICKER_FOR_BOT.check_update(_update(sticker=True))
+
+
+def test_dispatch_pre_filter_turns_away_only_group_noise():
+    assert not is_for_bot(_update("just chatting among ourselves"))
+    assert not is_for_bot(_update(sticker=True))
+    assert is_for_bot(_update("tell us a joke"))
+    assert is_for_bot(_update("hey @selenebot"))
+    assert is_for_bot(_update(sticker=True, reply_to_bot=True))
+    assert is_for_bot(_update("/help@SeleneBot"))
+    assert is_for_bot(_update("just chatting", chat_type="private"))
+    assert is_for_bot(SimpleNamespace(message=None))
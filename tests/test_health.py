@@ -0,0 +1,75 @@
+"""Tests for passive dependency health and the idle-only prober."""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.health import api
+from app.services import health
+from app.services.health import AI, TELEGRAM, DependencyHealth, HealthRegistry
+
+
+def test_status_follows_recent_outcomes():
+    dependency = DependencyHealth("ai", window=10)
+    assert dependency.status() == "unknown"
+
+    for _ in range(9):
+        dependency.record(True, 0.1)
+    dependency.record(False, 0.1, "timeout")
+    assert dependency.status() == "degraded"
+
+    dependency.record(True, 0.1)
+    assert dependency.status() == "healthy"
+
+    for _ in range(5):
+        dependency.record(False, 1.0, "timeout")
+    snapshot = dependency.snapshot()
+    assert snapshot["status"] == "unhealthy"
+    assert snapshot["last_error"] == "timeout"
+    assert snapshot["last_success_age_seconds"] is not None
+
+
+def test_prober_only_touches_idle_dependencies():
+    registry = HealthRegistry()
+    probed = []
+    registry.set_probe(AI, lambda: probed.append(AI))
+    registry.set_probe(TELEGRAM, lambda: probed.append(TELEGRAM))
+    registry.record(AI, True, 0.2)
+
+    registry.probe_idle(idle_seconds=60)
+    assert probed == [TELEGRAM]
+
+
+def test_failing_probe_counts_as_failure():
+    registry = HealthRegistry()
+
+    def broken():
+        raise ConnectionError("down")
+
+    registry.set_probe(TELEGRAM, broken)
+    registry.probe_idle(idle_seconds=0)
+    assert registry.dependencies[TELEGRAM].consecutive_failures == 1
+
+
+def test_health_endpoint_reports_without_calling_out(monkeypatch):
+    registry = HealthRegistry()
+    registry.record(AI, True, 0.3)
+    monkeypatch.setattr(health, "_registry", registry)
+
+    body = TestClient(api.app).get("/health").json()
+    assert body["services"]["ai_api"] == "healthy"
+    assert body["services"]["telegram"] == "unknown"
+    assert body["dependencies"][AI]["calls"] == 1
+
+
+def test_work_queue_stats_are_read_off_the_event_loop(monkeypatch):
+    class Queue:
+        def stats(self):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return {"on_loop": False}
+            return {"on_loop": True}
+
+    monkeypatch.setattr(api, "_work_queue", Queue())
+    body = TestClient(api.app).get("/health").json()
+    assert body["work_queue"] == {"on_loop": False}
@@ -0,0 +1,102 @@
+"""Tests for the crash-recovery update journal."""
+import asyncio
+import json
+import time
+
+from telegram import Update
+
+from app.services.dispatcher import ChatOrderedUpdateProcessor
+from app.services.journal import JournaledUpdateQueue, UpdateJournal
+
+
+def _update(update_id, chat_id=1):
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": f"message {update_id}",
+            },
+        },
+        None,
+    )
+
+
+def _journal(path, max_age=600):
+    return UpdateJournal(str(path), max_age_seconds=max_age, fsync_interval=0.01)
+
+
+def test_unfinished_updates_are_replayed_after_restart(tmp_path):
+    path = tmp_path / "updates.journal"
+    journal = _journal(path)
+    for update_id in (1, 2, 3):
+        assert journal.record(_update(update_id))
+    journal.mark_done(_update(2))
+    journal.close()
+
+    reopened = _journal(path)
+    assert [data["update_id"] for data in reopened.take_pending()] == [1, 3]
+    assert reopened.take_pending() == []
+    reopened.close()
+
+
+def test_seen_update_ids_are_ignored(tmp_path):
+    journal = _journal(tmp_path / "updates.journal")
+    assert journal.record(_update(1))
+    assert not journal.record(_update(1))  # still open
+    journal.mark_done(_update(1))
+    assert not journal.record(_update(1))  # recently finished
+    journal.close()
+
+
+def test_old_entries_and_torn_lines_are_skipped(tmp_path):
+    path = tmp_path / "updates.journal"
+    old = {"op": "recv", "id": 1, "ts": time.time() - 3600, "update": _update(1).to_dict()}
+    fresh = {"op": "recv", "id": 2, "ts": time.time(), "update": _update(2).to_dict()}
+    path.write_text(json.dumps(old) + "\n" + json.dumps(fresh) + "\n" + '{"op": "re')
+
+    journal = _journal(path, max_age=60)
+    assert [data["update_id"] for data in journal.take_pending()] == [2]
+    assert journal.stats()["skipped_stale"] == 1
+    journal.close()
+
+    # Startup compaction dropped the stale entry for good.
+    assert [json.loads(line)["id"] for line in path.read_text().splitlines()] == [2]
+
+
+def test_queue_journals_and_replays_updates(tmp_path):
+    path = tmp_path / "updates.journal"
+    journal = _journal(path)
+    journal.record(_update(1))
+    journal.close()
+
+    async def scenario():
+        queue = JournaledUpdateQueue(_journal(path))
+        replayed = queue.replay(None)
+        await queue.put(_update(1))  # redelivered by Telegram as well
+        await queue.put(_update(2))
+        ids = [queue.get_nowait().update_id for _ in range(queue.qsize())]
+        queue.journal.close()
+        return replayed, ids
+
+    replayed, ids = asyncio.run(scenario())
+    assert replayed == 1
+    assert ids == [1, 2]
+
+
+def test_dispatcher_reports_finished_updates():
+    finished = []
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(max_running=2, on_finished=lambda u: finished.append(u.update_id))
+        await processor.initialize()
+
+        async def handler():
+            return None
+
+        await processor.process_update(_update(5), handler())
+
+    asyncio.run(scenario())
+    assert finished == [5]
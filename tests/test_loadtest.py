@@ -0,0 +1,101 @@
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from loadtest.fakes import FakeAI, FakeTelegram, FakeTranslate, Latency
+from loadtest.harness import percentile
+
+
+def test_latency_specs():
+    rng = random.Random(0)
+    assert Latency("0.25").sample(rng) == 0.25
+    assert 0.1 <= Latency("uniform:0.1,0.2").sample(rng) <= 0.2
+    samples = sorted(Latency("lognormal:1.0,0.5").sample(rng) for _ in range(2001))
+    assert 0.9 < samples[1000] < 1.1
+    for bad in ("lognormal:1.0", "gamma:1", "fixed:-1", "fast"):
+        with pytest.raises(ValueError):
+            Latency(bad)
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([3.0], 0.95) == 3.0
+    assert percentile([], 0.5) is None
+
+
+def test_fake_telegram_long_polls_and_reports_replies():
+    telegram = FakeTelegram(Latency("0")).start()
+    replies = []
+    telegram.on_reply = lambda chat_id, reply_to, message_id, arrived: replies.append((chat_id, reply_to))
+    base = f"{telegram.url}/bot123:ABC"
+    try:
+        chat = {"id": 5, "type": "private", "first_name": "A"}
+        threading.Timer(0.2, telegram.push_message, (chat, {"id": 5, "is_bot": False, "first_name": "A"}, "hi")).start()
+        started = time.monotonic()
+        updates = requests.post(f"{base}/getUpdates", data={"offset": "0", "timeout": "5"}).json()["result"]
+        assert 0.1 < time.monotonic() - started < 4
+        assert updates[0]["message"]["text"] == "hi"
+
+        # Confirming with the next offset drops it.
+        offset = str(updates[0]["update_id"] + 1)
+        assert requests.post(f"{base}/getUpdates", data={"offset": offset, "timeout": "0"}).json()["result"] == []
+
+        message_id = updates[0]["message"]["message_id"]
+        sent = requests.post(
+            f"{base}/sendMessage",
+            data={"chat_id": "5", "text": "hello", "reply_parameters": json.dumps({"message_id": message_id})},
+        ).json()
+        assert sent["ok"] and sent["result"]["text"] == "hello"
+        assert replies == [(5, message_id)]
+        assert telegram.calls["sendMessage"] == 1
+    finally:
+        telegram.stop()
+
+
+def test_injected_errors_look_like_the_real_services():
+    telegram = FakeTelegram(Latency("0"), error_rate=1.0).start()
+    ai = FakeAI(Latency("0"), error_rate=1.0).start()
+    translate = FakeTranslate(Latency("0")).start()
+    try:
+        flood = requests.post(f"{telegram.url}/bot1:A/sendMessage", data={"chat_id": "1", "text": "x"})
+        assert flood.status_code == 429 and flood.json()["parameters"]["retry_after"] == 1
+        # Polling is never failed.
+        assert requests.post(f"{telegram.url}/bot1:A/getUpdates", data={"timeout": "0"}).json()["ok"]
+
+        assert requests.post(f"{ai.url}/ai/run/model", json={"messages": []}).status_code == 500
+        assert ai.errors["completion"] == 1
+
+        page = requests.get(f"{translate.url}/m", params={"sl": "am", "tl": "en", "q": "<selam>"}).text
+        assert '<div class="result-container">&lt;selam&gt;</div>' in page
+    finally:
+        for server in (telegram, ai, translate):
+            server.stop()
+
+
+def test_end_to_end_run_answers_every_message(tmp_path):
+    output = tmp_path / "report.json"
+    result = subprocess.run(
+        [
+            sys.executable, "-m", "loadtest",
+            "--users", "4", "--duration", "2", "--think-time", "0.2", "--reply-timeout", "20",
+            "--ai-latency", "0.05", "--translate-latency", "0.01", "--telegram-latency", "0",
+            "--output", str(output),
+        ],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(output.read_text())
+    assert report["messages_sent"] > 0
+    assert report["replies"] == report["messages_sent"]
+    assert report["upstream"]["ai.completion"]["per_message"] > 0
+    assert "p99" in result.stdout
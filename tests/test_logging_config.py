@@ -0,0 +1,82 @@
+"""Tests for queued, contextual, sampled logging."""
+import json
+import logging
+import queue
+import sys
+
+from app.logging_config import (
+    ContextFilter,
+    DroppingQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    TextFormatter,
+    log_context,
+    parse_sampling,
+    record_stage_timing,
+)
+
+
+def _record(name="app.test", level=logging.INFO, message="hello"):
+    return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+
+def test_records_carry_update_context_and_stage_timings():
+    context_filter = ContextFilter()
+    with log_context(update_id=7, chat_id=-100):
+        with log_context(chat_type="group"):
+            record_stage_timing("ai", 1.23456)
+            record = _record()
+            context_filter.filter(record)
+    outside = _record()
+    context_filter.filter(outside)
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "hello"
+    assert entry["update_id"] == 7 and entry["chat_id"] == -100 and entry["chat_type"] == "group"
+    assert entry["stages"] == {"ai": 1.235}
+    assert TextFormatter().format(record).endswith("hello [update_id=7 chat_id=-100 chat_type=group stages=ai:1.235]")
+    assert TextFormatter().format(outside).endswith("hello")
+
+
+def test_sampling_applies_to_children_but_never_to_warnings():
+    sampler = SamplingFilter(parse_sampling('{"uvicorn.access": 0, "app": 1}'))
+
+    assert not sampler.filter(_record("uvicorn.access"))
+    assert not sampler.filter(_record("uvicorn.access.child", logging.DEBUG))
+    assert sampler.filter(_record("uvicorn.access", logging.WARNING))
+    assert sampler.filter(_record("uvicorn.error"))
+    assert sampler.filter(_record("app.services.outbound"))
+    assert sampler.dropped == 2
+
+
+def test_bad_sampling_config_is_rejected():
+    for raw in ('{"app": 2}', '["app"]', '{"app": "half"}'):
+        try:
+            parse_sampling(raw)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {raw}")
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record(message="first"))
+    handler.handle(_record(message="second"))
+
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().getMessage() == "first"
+
+
+def test_tracebacks_survive_the_queue_as_their_own_field():
+    handler = DroppingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, "failed %s", ("turn",), sys.exc_info())
+    handler.handle(record)
+    queued = handler.queue.get_nowait()
+
+    entry = json.loads(JsonFormatter().format(queued))
+    assert entry["message"] == "failed turn"
+    assert entry["exception"].startswith("Traceback") and "ValueError: bad" in entry["exception"]
+    assert TextFormatter().format(queued).endswith("ValueError: bad")
@@ -0,0 +1,66 @@
+"""Tests for the in-process store registry and the admin memory endpoints."""
+import dataclasses
+
+from fastapi.testclient import TestClient
+
+from app.health import admin, api
+from app.services.history import MessageHistory
+from app.services.memory import MemoryRegistry, deep_sizeof, get_memory_registry
+
+
+def test_deep_sizeof_counts_reachable_objects_once():
+    shared = "x" * 1000
+    small, truncated = deep_sizeof({"a": [1, 2]})
+    big, _ = deep_sizeof({"a": [shared, shared], "b": shared})
+    assert not truncated
+    assert big - small >= 1000
+    assert big < small + 2000  # `shared` counted once
+
+    _, truncated = deep_sizeof(list(range(100)), max_objects=10)
+    assert truncated
+
+
+def test_report_and_flush():
+    registry = MemoryRegistry()
+    history = MessageHistory()
+    history.add_message(1, "hello")
+    registry.register("history", history.size, root=lambda: history._histories, flush=history.clear)
+    registry.register("fixed", lambda: {"entries": 3})
+
+    report = registry.report()
+    assert report["history"]["users"] == 1 and report["history"]["approx_bytes"] > 0
+    assert report["fixed"] == {"entries": 3, "flushable": False}
+
+    registry.flush("history")
+    assert history.size() == {"users": 0, "messages": 0}
+    try:
+        registry.flush("fixed")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("flushed a store without a flush")
+
+
+def test_memory_endpoints(monkeypatch):
+    monkeypatch.setattr(admin, "settings", dataclasses.replace(admin.settings, admin_token="t0ken"))
+    client = TestClient(api.app)
+    headers = {"Authorization": "Bearer t0ken"}
+    history = MessageHistory()
+    history.add_message(1, "hello")
+    get_memory_registry().register("test_history", history.size, flush=history.clear)
+
+    assert client.get("/admin/memory").status_code == 403
+    body = client.get("/admin/memory", headers=headers).json()
+    assert body["stores"]["test_history"]["messages"] == 1
+    assert "generations" in body["process"]["gc"]
+
+    assert client.post("/admin/memory/tracemalloc?enabled=true", headers=headers).status_code == 200
+    try:
+        top = client.get("/admin/memory?top=5&sizes=false", headers=headers).json()["top_allocations"]
+        assert top and "bytes" in top[0]
+    finally:
+        client.post("/admin/memory/tracemalloc?enabled=false", headers=headers)
+
+    assert client.post("/admin/memory/stores/test_history/flush", headers=headers).status_code == 200
+    assert history.size()["messages"] == 0
+    assert client.post("/admin/memory/stores/nope/flush", headers=headers).status_code == 404
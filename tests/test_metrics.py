@@ -0,0 +1,80 @@
+"""Tests for the metrics registry and the /metrics endpoint."""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.health import api
+from app.services.metrics import STAGE_SECONDS, Registry
+from app.services.pipeline import Pipeline, Stage
+
+
+def test_counter_and_histogram_render_in_prometheus_format():
+    registry = Registry()
+    calls = registry.counter("calls", "Calls made", ["outcome"])
+    latency = registry.histogram("latency_seconds", "Call latency", buckets=(0.1, 1.0))
+
+    ok = calls.labels("ok")
+    ok.inc()
+    ok.inc()
+    calls.labels('bad "one"').inc()
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+    assert "# TYPE calls counter" in text
+    assert 'calls_total{outcome="ok"} 2' in text
+    assert 'calls_total{outcome="bad \\"one\\""} 1' in text
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 5.55" in text
+    assert "latency_seconds_count 3" in text
+
+
+def test_labels_are_checked_and_children_reused():
+    registry = Registry()
+    calls = registry.counter("calls", "Calls made", ["outcome"])
+    assert calls.labels("ok") is calls.labels("ok")
+    assert registry.counter("calls", "Calls made", ["outcome"]) is calls
+
+    try:
+        calls.labels("ok", "extra")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("wrong label count accepted")
+
+
+def test_callbacks_run_at_scrape_time_and_failures_stay_contained():
+    registry = Registry()
+    depth = {"high": 1, "low": 0}
+    registry.callback("queued", "Queued items", lambda: depth, ["priority"])
+    registry.callback("broken", "Always fails", lambda: 1 / 0)
+
+    depth["low"] = 4
+    text = registry.render()
+    assert 'queued{priority="low"} 4' in text
+    assert "broken unavailable" in text
+
+
+def test_pipeline_records_stage_durations():
+    pipeline = Pipeline([Stage("metrics_test_stage", lambda r: asyncio.sleep(0, "done"))])
+    asyncio.run(pipeline.run({}))
+
+    child = STAGE_SECONDS.labels("metrics_test_stage", "ok")
+    assert child.count == 1
+
+
+def test_metrics_endpoint_serves_text_format():
+    client = TestClient(api.app)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE selene_ai_requests counter" in response.text
+    assert "# TYPE selene_pipeline_stage_seconds histogram" in response.text
+    assert "selene_outbound_queued 0" in response.text
+    assert "# TYPE selene_fair_scheduler_starved counter" in response.text
+    assert "selene_fair_scheduler_starved_total " in response.text
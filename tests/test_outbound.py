@@ -0,0 +1,124 @@
+"""Tests for the rate-limited outbound Telegram send scheduler."""
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from app.services.outbound import OutboundScheduler, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, fail_first_with_retry_after=0):
+        self.calls = []
+        self._retry_after_left = fail_first_with_retry_after
+
+    async def send_message(self, **kwargs):
+        if self._retry_after_left:
+            self._retry_after_left -= 1
+            raise RetryAfter(0)
+        self.calls.append(("message", kwargs["chat_id"], kwargs.get("text")))
+        return kwargs["text"]
+
+    async def set_message_reaction(self, **kwargs):
+        self.calls.append(("reaction", kwargs["chat_id"], kwargs["message_id"]))
+        return True
+
+
+def test_token_bucket_limits_rate_after_burst():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = time.monotonic()
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.wait_time(now) > 0
+    assert bucket.wait_time(now + 0.15) == 0
+
+
+def test_sends_are_returned_to_caller():
+    async def scenario():
+        scheduler = OutboundScheduler()
+        bot = FakeBot()
+        result = await scheduler.send_message(bot, 1, text="hi")
+        return result, bot.calls
+
+    result, calls = asyncio.run(scenario())
+    assert result == "hi"
+    assert calls == [("message", 1, "hi")]
+
+
+def test_per_chat_limit_does_not_hold_up_other_chats():
+    async def scenario():
+        scheduler = OutboundScheduler(private_rate=1, chat_burst=1)
+        bot = FakeBot()
+        started = time.monotonic()
+        await scheduler.send_message(bot, 1, text="first")
+        slow = asyncio.create_task(scheduler.send_message(bot, 1, text="second"))
+        await scheduler.send_message(bot, 2, text="other chat")
+        other_chat_elapsed = time.monotonic() - started
+        slow.cancel()
+        return other_chat_elapsed, bot.calls
+
+    elapsed, calls = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert ("message", 2, "other chat") in calls
+    assert ("message", 1, "second") not in calls
+
+
+def test_replies_go_ahead_of_queued_reactions():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, private_rate=50, chat_burst=1, reaction_max_wait=5)
+        bot = FakeBot()
+        await scheduler.send_message(bot, 1, text="drain burst")
+        reaction = asyncio.create_task(scheduler.set_reaction(bot, 1, 10, "\U0001F525"))
+        reply = asyncio.create_task(scheduler.send_message(bot, 1, text="reply"))
+        await asyncio.gather(reaction, reply)
+        return bot.calls
+
+    calls = asyncio.run(scenario())
+    assert calls[1] == ("message", 1, "reply")
+    assert calls[2] == ("reaction", 1, 10)
+
+
+def test_reactions_are_dropped_under_pressure():
+    async def scenario():
+        scheduler = OutboundScheduler(private_rate=0.5, chat_burst=1, pressure_depth=1)
+        bot = FakeBot()
+        await scheduler.send_message(bot, 1, text="drain burst")
+        waiting_reply = asyncio.create_task(scheduler.send_message(bot, 1, text="queued"))
+        await asyncio.sleep(0)
+        result = await scheduler.set_reaction(bot, 1, 10, "\U0001F525")
+        waiting_reply.cancel()
+        return result, scheduler.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result is None
+    assert stats["dropped_reactions"] == 1
+
+
+def test_retry_after_is_honored_and_reply_retried():
+    async def scenario():
+        scheduler = OutboundScheduler()
+        bot = FakeBot(fail_first_with_retry_after=1)
+        result = await scheduler.send_message(bot, 1, text="eventually")
+        return result, scheduler.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result == "eventually"
+    assert stats["retried"] == 1
+    assert stats["sent"] == 1
+
+
+def test_other_errors_reach_the_caller():
+    class BrokenBot:
+        async def send_message(self, **kwargs):
+            raise ValueError("boom")
+
+    async def scenario():
+        scheduler = OutboundScheduler()
+        try:
+            await scheduler.send_message(BrokenBot(), 1, text="x")
+        except ValueError as exc:
+            return str(exc)
+        return None
+
+    assert asyncio.run(scenario()) == "boom"
+
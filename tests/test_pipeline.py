@@ -0,0 +1,100 @@
+"""Tests for the dependency-driven stage pipeline."""
+import asyncio
+
+import pytest
+
+from app.services.pipeline import ErrorPolicy, Pipeline, Stage, StageError
+
+
+def _sleeper(value, delay=0.0):
+    async def run(results):
+        await asyncio.sleep(delay)
+        return value
+
+    return run
+
+
+def test_results_flow_along_dependencies():
+    async def double(results):
+        return results["source"] * 2
+
+    pipeline = Pipeline([Stage("source", _sleeper(21)), Stage("double", double, depends_on=("source",))])
+    outcome = asyncio.run(pipeline.run({}))
+    assert outcome.results["double"] == 42
+
+
+def test_independent_stages_run_concurrently():
+    pipeline = Pipeline([Stage("a", _sleeper("a", 0.05)), Stage("b", _sleeper("b", 0.05))])
+    outcome = asyncio.run(pipeline.run({}))
+
+    starts = {t.name: t.started_at for t in outcome.timings}
+    assert abs(starts["a"] - starts["b"]) < 0.02
+    assert outcome.total_seconds < 0.09
+
+
+def test_dependent_stage_waits_for_its_dependency():
+    pipeline = Pipeline([Stage("first", _sleeper(1, 0.03)), Stage("second", _sleeper(2), depends_on=("first",))])
+    outcome = asyncio.run(pipeline.run({}))
+
+    timings = {t.name: t for t in outcome.timings}
+    assert timings["second"].started_at >= timings["first"].started_at + timings["first"].duration
+
+
+def test_timeout_uses_fallback():
+    pipeline = Pipeline(
+        [Stage("slow", _sleeper("late", 1), timeout=0.01, on_error=ErrorPolicy.FALLBACK, fallback=lambda r: "fallback")]
+    )
+    outcome = asyncio.run(pipeline.run({}))
+
+    assert outcome.results["slow"] == "fallback"
+    assert outcome.timings[0].status == "timeout"
+    assert pipeline.stats()["slow"]["timeouts"] == 1
+
+
+def test_fallback_may_be_a_coroutine_function():
+    async def fallback(results):
+        return await asyncio.to_thread(str.upper, "fallback")
+
+    pipeline = Pipeline([Stage("slow", _sleeper("late", 1), timeout=0.01, on_error=ErrorPolicy.FALLBACK, fallback=fallback)])
+    assert asyncio.run(pipeline.run({})).results["slow"] == "FALLBACK"
+
+
+def test_ignored_error_continues_with_none():
+    async def broken(results):
+        raise RuntimeError("nope")
+
+    pipeline = Pipeline([Stage("optional", broken, on_error=ErrorPolicy.IGNORE), Stage("other", _sleeper("ok"))])
+    outcome = asyncio.run(pipeline.run({}))
+
+    assert outcome.results["optional"] is None
+    assert outcome.results["other"] == "ok"
+
+
+def test_failing_stage_aborts_and_cancels_the_rest():
+    cancelled = []
+
+    async def broken(results):
+        raise RuntimeError("nope")
+
+    async def long_running(results):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    pipeline = Pipeline([Stage("broken", broken), Stage("long", long_running)])
+    with pytest.raises(StageError) as excinfo:
+        asyncio.run(pipeline.run({}))
+
+    assert excinfo.value.stage == "broken"
+    assert cancelled == [True]
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        Pipeline([Stage("a", _sleeper(1), depends_on=("missing",))])
+    with pytest.raises(ValueError):
+        Pipeline([Stage("a", _sleeper(1), depends_on=("b",)), Stage("b", _sleeper(1), depends_on=("a",))])
+    with pytest.raises(ValueError):
+        Pipeline([Stage("a", _sleeper(1)), Stage("a", _sleeper(2))])
@@ -0,0 +1,71 @@
+"""Tests for the sampling profiler and the admin profile endpoint."""
+import dataclasses
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.health import admin, api
+from app.services.profiler import ProfilerBusy, SamplingProfiler
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_samples_other_threads_into_collapsed_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    worker.start()
+    try:
+        profile = SamplingProfiler(interval=0.005).profile(0.2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profile.samples >= 10
+    spinner = [line for line in profile.collapsed().splitlines() if line.startswith("spinner;")]
+    assert spinner and all("_spin (tests/test_profiler.py" in line for line in spinner)
+    assert int(spinner[0].rsplit(" ", 1)[1]) >= 1
+
+
+def test_only_one_profile_at_a_time():
+    profiler = SamplingProfiler(interval=0.01)
+    thread = threading.Thread(target=profiler.profile, args=(0.3,))
+    thread.start()
+    time.sleep(0.05)
+    try:
+        profiler.profile(0.1)
+    except ProfilerBusy:
+        pass
+    else:
+        raise AssertionError("second profile was allowed to run")
+    finally:
+        thread.join()
+
+
+def _client(monkeypatch, token="t0ken"):
+    monkeypatch.setattr(admin, "settings", dataclasses.replace(admin.settings, admin_token=token))
+    return TestClient(api.app)
+
+
+def test_admin_endpoints_need_the_token(monkeypatch):
+    assert _client(monkeypatch, token="").post("/admin/profile").status_code == 404
+
+    client = _client(monkeypatch)
+    assert client.post("/admin/profile").status_code == 403
+    assert client.post("/admin/profile", headers={"Authorization": "Bearer wrong"}).status_code == 403
+
+
+def test_profile_endpoint(monkeypatch):
+    client = _client(monkeypatch)
+    headers = {"Authorization": "Bearer t0ken"}
+
+    response = client.post("/admin/profile?seconds=0.1", headers=headers)
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    assert response.text.strip()
+
+    top = client.post("/admin/profile?seconds=0.1&format=top", headers=headers).json()
+    assert top["functions"] and top["samples"] > 0
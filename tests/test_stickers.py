@@ -0,0 +1,83 @@
+"""Tests for the sticker pack cache: single-flight, stale-while-revalidate,
+negative caching, LRU bound and random pick with exclusion."""
+import asyncio
+from types import SimpleNamespace
+
+from app.services.stickers import StickerService
+
+
+class FakeBot:
+    def __init__(self, packs, delay=0.0):
+        self.packs = packs
+        self.delay = delay
+        self.calls = []
+
+    async def get_sticker_set(self, set_name):
+        self.calls.append(set_name)
+        await asyncio.sleep(self.delay)
+        if set_name not in self.packs:
+            raise RuntimeError("no such pack")
+        return SimpleNamespace(stickers=[SimpleNamespace(file_id=fid) for fid in self.packs[set_name]])
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        service = StickerService()
+        bot = FakeBot({"cats": ["a", "b"]}, delay=0.02)
+        results = await asyncio.gather(*(service.get_random_sticker(bot, "cats") for _ in range(10)))
+        return results, bot.calls
+
+    results, calls = asyncio.run(scenario())
+    assert calls == ["cats"]
+    assert all(result in ("a", "b") for result in results)
+
+
+def test_stale_pack_is_served_while_refreshing():
+    async def scenario():
+        service = StickerService(fresh_seconds=0, stale_seconds=60)
+        bot = FakeBot({"cats": ["a"]}, delay=0.02)
+        await service.get_random_sticker(bot, "cats")
+        bot.packs["cats"] = ["b"]
+        stale = await service.get_random_sticker(bot, "cats")
+        await asyncio.sleep(0.05)
+        return stale, service.stats()
+
+    stale, stats = asyncio.run(scenario())
+    assert stale == "a"
+    assert stats["stale_hits"] == 1
+    assert stats["fetches"] == 2
+
+
+def test_failed_packs_are_not_refetched_right_away():
+    async def scenario():
+        service = StickerService()
+        bot = FakeBot({})
+        first = await service.get_random_sticker(bot, "missing")
+        second = await service.get_random_sticker(bot, "missing")
+        return first, second, bot.calls
+
+    first, second, calls = asyncio.run(scenario())
+    assert first is None and second is None
+    assert calls == ["missing"]
+
+
+def test_least_recently_used_pack_is_evicted():
+    async def scenario():
+        service = StickerService(max_packs=2)
+        bot = FakeBot({"a": ["1"], "b": ["2"], "c": ["3"]})
+        for name in ("a", "b", "a", "c"):
+            await service.get_random_sticker(bot, name)
+        await service.get_random_sticker(bot, "a")
+        await service.get_random_sticker(bot, "b")
+        return bot.calls
+
+    assert asyncio.run(scenario()) == ["a", "b", "c", "b"]
+
+
+def test_pick_never_returns_the_excluded_sticker():
+    async def scenario():
+        service = StickerService()
+        bot = FakeBot({"cats": ["a", "b", "c"]})
+        return {await service.get_random_sticker(bot, "cats", exclude_file_id="b") for _ in range(200)}
+
+    assert asyncio.run(scenario()) == {"a", "c"}
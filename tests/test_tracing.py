@@ -0,0 +1,116 @@
+"""Tests for per-turn tracing, the slow-trace buffer and OTLP export."""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from fastapi.testclient import TestClient
+
+from app.health import api
+from app.services import tracing
+from app.services.tracing import OTLPExporter, Tracer, otlp_payload, span
+
+
+def _traced_turn(tracer, name, sleep=0.0):
+    async def turn():
+        with tracer.start_trace(name, chat_id=1):
+            with span("stage"):
+                await asyncio.to_thread(_blocking_step, sleep)
+
+    asyncio.run(turn())
+
+
+def _blocking_step(sleep):
+    with span("chunk", chars=3):
+        time.sleep(sleep)
+
+
+def test_spans_follow_the_turn_into_threads():
+    tracer = Tracer(sample_rate=1.0)
+    _traced_turn(tracer, "turn")
+
+    [trace] = tracer.slowest()
+    assert trace["attributes"] == {"chat_id": 1}
+    assert [(s["name"], s["depth"]) for s in trace["spans"]] == [("turn", 0), ("stage", 1), ("chunk", 2)]
+    assert trace["spans"][2]["attributes"] == {"chars": 3}
+
+
+def test_only_the_slowest_traces_are_kept():
+    tracer = Tracer(sample_rate=1.0, keep=2)
+    for name, sleep in (("fast", 0.0), ("slow", 0.05), ("medium", 0.02), ("fastest", 0.0)):
+        _traced_turn(tracer, name, sleep)
+
+    assert [trace["name"] for trace in tracer.slowest()] == ["slow", "medium"]
+    assert tracer.stats()["traced"] == 4
+
+
+def test_unsampled_turns_and_stray_spans_are_noops():
+    tracer = Tracer(sample_rate=0.0)
+    _traced_turn(tracer, "turn")
+    assert tracer.slowest() == []
+
+    with span("outside any trace") as stray:
+        stray.set(ignored=True)
+
+
+def test_errors_mark_the_span():
+    tracer = Tracer(sample_rate=1.0)
+    try:
+        with tracer.start_trace("turn"):
+            with span("ai.attempt"):
+                raise TimeoutError("took too long")
+    except TimeoutError:
+        pass
+
+    [trace] = tracer.slowest()
+    assert trace["status"] == "error"
+    assert trace["spans"][1]["status"] == "error"
+
+
+class _Collector(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        _Collector.received.append(json.loads(body))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_exporter_posts_otlp_json_to_a_collector():
+    server = HTTPServer(("127.0.0.1", 0), _Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tracer = Tracer(sample_rate=1.0)
+        _traced_turn(tracer, "turn")
+        traces = [trace for _, _, trace in tracer._slowest]
+
+        exporter = OTLPExporter(f"http://127.0.0.1:{server.server_port}/v1/traces")
+        exporter.export(traces)
+    finally:
+        server.shutdown()
+
+    assert exporter.stats()["exported"] == 1
+    [payload] = _Collector.received
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert spans == otlp_payload(traces)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, stage, chunk = spans
+    assert "parentSpanId" not in root
+    assert stage["parentSpanId"] == root["spanId"] and chunk["parentSpanId"] == stage["spanId"]
+    assert {"key": "chars", "value": {"intValue": "3"}} in chunk["attributes"]
+
+
+def test_debug_slow_endpoint(monkeypatch):
+    tracer = Tracer(sample_rate=1.0)
+    _traced_turn(tracer, "turn")
+    monkeypatch.setattr(tracing, "_tracer", tracer)
+
+    response = TestClient(api.app).get("/debug/slow")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["traced"] == 1
+    assert body["traces"][0]["name"] == "turn"
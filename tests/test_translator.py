@@ -14,7 +14,7 @@ class RecordingFakeTranslator:
     def __init__(self):
         self.calls = []
 
-    def translate(self, text: str) -> str:
+    def translate(self, text: str, timeout=None) -> str:
         self.calls.append(text)
         return f"[TRANSLATED:{text.upper()}]"
 
@@ -68,7 +68,7 @@ def test_multiple_pet_names_all_rendered_correctly():
 
 def test_translator_failure_on_one_chunk_falls_back_to_original_text():
     class FlakyTranslator:
-        def translate(self, text):
+        def translate(self, text, timeout=None):
             raise RuntimeError("simulated network failure")
 
     service = TranslationService()
@@ -91,7 +91,7 @@ def test_translator_returning_none_does_not_crash_join():
         def __init__(self):
             self.call_count = 0
 
-        def translate(self, text):
+        def translate(self, text, timeout=None):
             self.call_count += 1
             # Simulate Google returning None on, say, the second chunk.
             if self.call_count == 2:
@@ -111,9 +111,46 @@ def test_translator_returning_none_does_not_crash_join():
 
 def test_translator_returning_empty_string_falls_back_to_original_text():
     class EmptyStringTranslator:
-        def translate(self, text):
+        def translate(self, text, timeout=None):
             return ""
 
     service = TranslationService()
     result = service._translate_guarded("Good morning", EmptyStringTranslator(), "am")
     assert result == "Good morning"
+
+
+def test_concurrent_first_detections_see_every_language_profile(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import langdetect.detector_factory
+
+    from app.services import translator
+
+    # A cold process: nothing loaded yet.
+    monkeypatch.setattr(langdetect.detector_factory, "_factory", None)
+    monkeypatch.setattr(translator, "_profiles_loaded", False)
+    detector = translator.ScriptDetector()
+    text = "Hey, how are you doing today? I hope work went well."
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        scripts = list(pool.map(detector.detect_script, [text] * 8))
+    assert scripts == ["English"] * 8
+
+
+def test_translate_base_url_sends_requests_to_the_stand_in(monkeypatch):
+    import dataclasses
+    from types import SimpleNamespace
+
+    import deep_translator.google
+
+    from app.services import translator
+
+    urls = []
+
+    def get(url, params=None, proxies=None, timeout=None):
+        urls.append(url)
+        return SimpleNamespace(status_code=200, text='<div class="t0">ሰላም</div>', close=lambda: None)
+
+    monkeypatch.setattr(deep_translator.google.requests, "get", get)
+    monkeypatch.setattr(translator, "settings", dataclasses.replace(translator.settings, translate_base_url="http://stand-in/m"))
+    assert TranslationService()._translators["en_to_geez"].translate("hello") == "ሰላም"
+    assert urls == ["http://stand-in/m"]
@@ -0,0 +1,41 @@
+"""Tests for the event loop watchdog."""
+import asyncio
+import time
+
+from app.services.watchdog import LoopWatchdog
+
+
+def _blocking_call():
+    time.sleep(0.4)
+
+
+def test_blocking_call_is_caught_with_its_stack():
+    watchdog = LoopWatchdog(threshold=0.15, heartbeat_interval=0.02)
+
+    async def main():
+        watchdog.start()
+        await asyncio.sleep(0.1)
+        _blocking_call()
+        await asyncio.sleep(0.1)
+        watchdog.stop()
+
+    asyncio.run(main())
+
+    assert watchdog.stalls == 1
+    assert watchdog.max_lag >= 0.3
+    assert "_blocking_call" in "".join(watchdog.last_stall["stack"])
+
+
+def test_each_missed_beat_is_reported_once_and_logs_are_rate_limited(caplog):
+    watchdog = LoopWatchdog(threshold=1.0, heartbeat_interval=0.1, log_interval=60)
+    beat = watchdog._last_beat
+
+    assert not watchdog.check(beat + 0.5)
+    assert watchdog.check(beat + 2)
+    assert not watchdog.check(beat + 3)  # same stall, still going
+
+    watchdog._last_beat = beat + 10
+    assert watchdog.check(beat + 12)
+    assert watchdog.stalls == 2
+    assert watchdog.unlogged == 1
+    assert len([r for r in caplog.records if "Event loop blocked" in r.getMessage()]) == 1
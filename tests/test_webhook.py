@@ -0,0 +1,68 @@
+"""Tests for the Telegram webhook route on the health API."""
+import asyncio
+import dataclasses
+
+from fastapi.testclient import TestClient
+from telegram import Bot, Update
+
+from app.core.constants import WEBHOOK_PATH, WEBHOOK_SECRET_HEADER
+from app.health import api
+
+_UPDATE = {
+    "update_id": 42,
+    "message": {
+        "message_id": 7,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Abel"},
+        "text": "hey",
+    },
+}
+
+
+class FakeApplication:
+    def __init__(self):
+        self.bot = Bot("123:TEST")
+        self.update_queue = asyncio.Queue()
+
+
+def _client(monkeypatch, application=None, secret="s3cret"):
+    monkeypatch.setattr(api, "settings", dataclasses.replace(api.settings, webhook_secret=secret))
+    api.attach_telegram_application(application)
+    return TestClient(api.app)
+
+
+def test_valid_update_is_queued(monkeypatch):
+    application = FakeApplication()
+    client = _client(monkeypatch, application)
+
+    response = client.post(WEBHOOK_PATH, json=_UPDATE, headers={WEBHOOK_SECRET_HEADER: "s3cret"})
+
+    assert response.status_code == 200
+    queued = application.update_queue.get_nowait()
+    assert isinstance(queued, Update)
+    assert queued.update_id == 42
+    assert queued.message.text == "hey"
+    api.attach_telegram_application(None)
+
+
+def test_wrong_or_missing_secret_is_rejected(monkeypatch):
+    application = FakeApplication()
+    client = _client(monkeypatch, application)
+
+    assert client.post(WEBHOOK_PATH, json=_UPDATE, headers={WEBHOOK_SECRET_HEADER: "nope"}).status_code == 403
+    assert client.post(WEBHOOK_PATH, json=_UPDATE).status_code == 403
+    assert application.update_queue.empty()
+    api.attach_telegram_application(None)
+
+
+def test_unconfigured_secret_rejects_everything(monkeypatch):
+    client = _client(monkeypatch, FakeApplication(), secret="")
+    assert client.post(WEBHOOK_PATH, json=_UPDATE, headers={WEBHOOK_SECRET_HEADER: ""}).status_code == 403
+    api.attach_telegram_application(None)
+
+
+def test_no_attached_application_asks_telegram_to_retry(monkeypatch):
+    client = _client(monkeypatch, None)
+    response = client.post(WEBHOOK_PATH, json=_UPDATE, headers={WEBHOOK_SECRET_HEADER: "s3cret"})
+    assert response.status_code == 503
@@ -0,0 +1,225 @@
+"""Tests for the SQLite and Redis work queues: claiming, retries, ordering,
+leases, and when consumed updates are acknowledged. The Redis ones run on
+fakeredis, and are skipped without it."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.dispatcher import ChatOrderedUpdateProcessor
+from app.services.work_queue import Job, JobTracker, RedisWorkQueue, SQLiteWorkQueue, consume_updates
+
+
+def _queue(tmp_path, **kwargs):
+    return SQLiteWorkQueue(str(tmp_path / "queue.db"), **kwargs)
+
+
+def test_claimed_job_is_hidden_until_acked(tmp_path):
+    queue = _queue(tmp_path)
+    queue.publish({"update_id": 1}, key="chat-1")
+
+    [job] = queue.claim("node-a")
+    assert job.payload == {"update_id": 1}
+    assert job.attempts == 1
+    assert queue.claim("node-b") == []
+
+    queue.ack(job)
+    assert queue.stats()["in_flight"] == 0
+    assert queue.claim("node-b") == []
+
+
+def test_unacked_job_comes_back_then_goes_dead(tmp_path):
+    queue = _queue(tmp_path, visibility_timeout=0.05, max_attempts=2)
+    queue.publish({"update_id": 1}, key="chat-1")
+
+    assert queue.claim("node-a")[0].attempts == 1
+    time.sleep(0.06)
+    assert queue.claim("node-b")[0].attempts == 2
+    time.sleep(0.06)
+    assert queue.claim("node-b") == []
+    assert queue.stats()["dead"] == 1
+
+
+def test_chat_order_is_kept_across_consumers(tmp_path):
+    queue = _queue(tmp_path)
+    queue.publish({"n": 1}, key="chat-1")
+    queue.publish({"n": 2}, key="chat-1")
+    queue.publish({"n": 3}, key="chat-2")
+
+    claimed = queue.claim("node-a", count=10)
+    assert [job.payload["n"] for job in claimed] == [1, 3]
+
+    queue.ack(claimed[0])
+    assert [job.payload["n"] for job in queue.claim("node-b", count=10)] == [2]
+
+
+def test_duplicates_are_not_published_twice(tmp_path):
+    queue = _queue(tmp_path)
+    assert queue.publish({"update_id": 7}, key="chat-1", dedupe_key="7") is True
+    assert queue.publish({"update_id": 7}, key="chat-1", dedupe_key="7") is False
+    assert len(queue.claim("node-a", count=10)) == 1
+
+
+def test_every_consumer_group_gets_every_job(tmp_path):
+    replies = _queue(tmp_path, group="replies")
+    analytics = _queue(tmp_path, group="analytics")
+    replies.publish({"update_id": 1}, key="chat-1")
+
+    assert len(replies.claim("node-a")) == 1
+    assert len(analytics.claim("node-a")) == 1
+
+
+def test_only_one_leader_until_its_lease_expires(tmp_path):
+    queue = _queue(tmp_path, lease_seconds=0.05)
+    assert queue.acquire_leadership("node-a")
+    assert not queue.acquire_leadership("node-b")
+    assert queue.acquire_leadership("node-a")  # renewal
+
+    time.sleep(0.06)
+    assert queue.acquire_leadership("node-b")
+    assert queue.stats()["leader"] == "node-b"
+
+    queue.release_leadership("node-b")
+    assert queue.acquire_leadership("node-a")
+
+
+@pytest.fixture
+def redis_queue(monkeypatch):
+    """RedisWorkQueue factory on an in-memory fakeredis server."""
+    redis = pytest.importorskip("redis")
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.Redis, "from_url", classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    )
+    return lambda **kwargs: RedisWorkQueue("redis://fake", **kwargs)
+
+
+def test_redis_claimed_job_is_hidden_until_acked(redis_queue):
+    queue = redis_queue()
+    queue.publish({"update_id": 1}, key="chat-1")
+
+    [job] = queue.claim("node-a")
+    assert job.payload == {"update_id": 1}
+    assert job.attempts == 1
+    assert queue.claim("node-b") == []
+    assert queue.stats()["in_flight"] == 1
+
+    queue.ack(job)
+    assert queue.stats()["in_flight"] == 0
+    assert queue.claim("node-b") == []
+
+
+def test_redis_unacked_job_comes_back_then_goes_dead(redis_queue):
+    queue = redis_queue(visibility_timeout=0.05, max_attempts=2)
+    queue.publish({"update_id": 1}, key="chat-1")
+
+    assert queue.claim("node-a")[0].attempts == 1
+    time.sleep(0.06)
+    assert queue.claim("node-b")[0].attempts == 2
+    time.sleep(0.06)
+    assert queue.claim("node-b") == []
+    assert queue.stats()["dead"] == 1
+
+
+def test_redis_duplicates_are_not_published_twice(redis_queue):
+    queue = redis_queue()
+    assert queue.publish({"update_id": 7}, key="chat-1", dedupe_key="7") is True
+    assert queue.publish({"update_id": 7}, key="chat-1", dedupe_key="7") is False
+    assert len(queue.claim("node-a", count=10)) == 1
+
+
+def test_redis_every_consumer_group_gets_every_job(redis_queue):
+    replies = redis_queue(group="replies")
+    analytics = redis_queue(group="analytics")
+    replies.publish({"update_id": 1}, key="chat-1")
+
+    assert len(replies.claim("node-a")) == 1
+    assert len(analytics.claim("node-a")) == 1
+
+
+def test_redis_only_one_leader_until_its_lease_expires(redis_queue):
+    pytest.importorskip("lupa")  # fakeredis runs the renewal script with it
+    queue = redis_queue(lease_seconds=0.05)
+    assert queue.acquire_leadership("node-a")
+    assert not queue.acquire_leadership("node-b")
+    assert queue.acquire_leadership("node-a")  # renewal
+
+    time.sleep(0.06)
+    assert queue.acquire_leadership("node-b")
+    assert queue.stats()["leader"] == "node-b"
+
+    queue.release_leadership("node-b")
+    assert queue.acquire_leadership("node-a")
+
+
+class UnorderedQueue:
+    """Hands out jobs in publish order with no per-chat ordering, like the
+    Redis backend, and records acknowledgements."""
+
+    def __init__(self, payloads):
+        self.jobs = [Job(str(p["update_id"]), p, "chat-1", 1) for p in payloads]
+        self.acked = []
+
+    def claim(self, consumer, count=1):
+        claimed, self.jobs = self.jobs[:count], self.jobs[count:]
+        return claimed
+
+    def ack(self, job):
+        self.acked.append(job.id)
+
+
+def _message_update(update_id):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "hi"},
+    }
+
+
+def _consume(queue, handle):
+    """Consumes `queue` through a real update processor, with `handle`
+    standing in for the Application's handlers."""
+    jobs = JobTracker(queue)
+    processor = ChatOrderedUpdateProcessor(max_running=4, max_pending=8, on_finished=jobs.mark_done, dedupe=False)
+    application = SimpleNamespace(bot=None, update_processor=processor, process_update=lambda u: handle(u, jobs))
+    return jobs, consume_updates(application, queue, jobs, "node-a", 4, asyncio.Event())
+
+
+def test_updates_waiting_behind_their_chat_are_not_acked_before_they_run():
+    queue = UnorderedQueue([_message_update(1), _message_update(2)])
+    started = []
+
+    async def handle(update, jobs):
+        started.append(update.update_id)
+        await asyncio.Event().wait()  # hangs until the node "crashes"
+
+    async def scenario():
+        jobs, consume = _consume(queue, handle)
+        node = asyncio.create_task(consume)
+        await asyncio.sleep(0.05)
+        # Both were claimed and handed over; update 2 waits behind 1.
+        assert started == [1] and len(jobs) == 2
+        node.cancel()
+        await asyncio.gather(node, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert queue.acked == []
+
+
+def test_finished_updates_are_acked_and_failed_ones_left_for_redelivery():
+    queue = UnorderedQueue([_message_update(1), _message_update(2)])
+
+    async def handle(update, jobs):
+        if update.update_id == 1:
+            jobs.mark_failed(update)  # what the bot's error handler does
+
+    async def scenario():
+        _, consume = _consume(queue, handle)
+        node = asyncio.create_task(consume)
+        await asyncio.sleep(0.05)
+        node.cancel()
+        await asyncio.gather(node, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert queue.acked == ["2"]
@@ -0,0 +1,64 @@
+"""Tests for chat-sharded forwarding to worker processes."""
+import time
+
+from telegram import Update
+
+from app.services.worker_pool import WorkerPool, shard_for
+
+
+def _update(update_id, chat_id=None):
+    data = {"update_id": update_id}
+    if chat_id is not None:
+        data["message"] = {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "group" if chat_id < 0 else "private"},
+            "text": "hi",
+        }
+    return Update.de_json(data, None)
+
+
+def _drain_worker(index, queue, dequeued):
+    """Stand-in worker: picks updates up and throws them away."""
+    while queue.get() is not None:
+        with dequeued.get_lock():
+            dequeued.value += 1
+
+
+def _wait_until(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_same_chat_always_lands_on_same_worker():
+    assert shard_for(_update(1, chat_id=42), 4) == shard_for(_update(2, chat_id=42), 4)
+    assert shard_for(_update(3, chat_id=-1001234), 4) == -1001234 % 4
+    assert shard_for(_update(5), 4) == 5 % 4
+
+
+def test_pool_forwards_drains_and_restarts_gracefully():
+    pool = WorkerPool(2, _drain_worker)
+    pool.start()
+    try:
+        for update_id in range(10):
+            pool.forward(_update(update_id, chat_id=update_id))
+
+        assert _wait_until(lambda: all(w["queued"] == 0 for w in pool.stats()))
+        assert [w["forwarded"] for w in pool.stats()] == [5, 5]
+
+        old_pid = pool.stats()[0]["pid"]
+        pool.restart(0)
+        pool.forward(_update(10, chat_id=10))
+
+        worker = pool.stats()[0]
+        assert worker["restarts"] == 1
+        assert worker["pid"] != old_pid
+        assert _wait_until(lambda: pool.stats()[0]["queued"] == 0)
+    finally:
+        pool.stop()
+
+    assert not any(w["alive"] for w in pool.stats())